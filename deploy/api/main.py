@@ -1,4 +1,5 @@
 import os
+from typing import Optional
 import numpy as np
 import pandas as pd
 import uvicorn
@@ -6,30 +7,41 @@ from fastapi import FastAPI
 
 app = FastAPI()
 
+
+def filter_modified_since(df, modified_since):
+    # Devuelve solo los registros modificados después de `modified_since` (extracción incremental)
+    if modified_since is None:
+        return df
+    return df[pd.to_datetime(df['ModifiedDate'], errors='coerce') > pd.to_datetime(modified_since)]
+
 @app.get("/booking")
-def read_booking(limit: int = 1000, offset: int = 0):
+def read_booking(limit: int = 1000, offset: int = 0, modified_since: Optional[str] = None):
     df = pd.read_csv(r'.datasets/booking.csv')
+    df = filter_modified_since(df, modified_since)
     df = df.replace(np.nan, None)
     return {"data": df.iloc[offset:offset + limit].to_dict(orient='records'),
             "total_items": len(df.index)}
 
 @app.get("/booking/new")
-def read_booking(limit: int = 1000, offset: int = 0):
+def read_booking(limit: int = 1000, offset: int = 0, modified_since: Optional[str] = None):
     df = pd.read_csv(r'.datasets/Booking_20240201_20240331.csv')
+    df = filter_modified_since(df, modified_since)
     df = df.replace(np.nan, None)
     return {"data": df.iloc[offset:offset + limit].to_dict(orient='records'),
             "total_items": len(df.index)}
 
 @app.get("/booking/passenger")
-def read_booking_passenger(limit: int = 1000, offset: int = 0):
+def read_booking_passenger(limit: int = 1000, offset: int = 0, modified_since: Optional[str] = None):
     df = pd.read_csv('.datasets/booking_passenger.csv')
+    df = filter_modified_since(df, modified_since)
     df = df.replace(np.nan, None)
     return {"data": df.iloc[offset:offset + limit].to_dict(orient='records'),
             "total_items": len(df.index)}
 
 @app.get("/booking/passenger/new")
-def read_booking_passenger(limit: int = 1000, offset: int = 0):
+def read_booking_passenger(limit: int = 1000, offset: int = 0, modified_since: Optional[str] = None):
     df = pd.read_csv('.datasets/BookingPassenger_20190201_20190331.csv')
+    df = filter_modified_since(df, modified_since)
     df = df.replace(np.nan, None)
     return {"data": df.iloc[offset:offset + limit].to_dict(orient='records'),
             "total_items": len(df.index)}
@@ -1,3 +1,4 @@
 from . import extract
 from . import transform
+from . import gold
 from . import load
\ No newline at end of file
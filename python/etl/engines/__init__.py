@@ -0,0 +1,58 @@
+import os
+import importlib.util
+from functools import lru_cache
+from dotenv import load_dotenv
+
+from etl.engines.base import TransformEngine
+from etl.engines.pandas_engine import PandasEngine
+from utils.utils import log_error
+
+load_dotenv()
+# Motor de la transformación: 'pandas' (por defecto), 'polars' (multihilo, requiere el paquete polars) o 'duckdb'
+# (consultas SQL sobre los archivos bronze, fuera de memoria; requiere el paquete duckdb)
+TRANSFORM_ENGINE = os.getenv("TRANSFORM_ENGINE", "pandas").lower()
+POLARS_AVAILABLE = importlib.util.find_spec("polars") is not None
+DUCKDB_AVAILABLE = importlib.util.find_spec("duckdb") is not None
+
+
+@lru_cache(maxsize=None)
+def get_engine(name: str = TRANSFORM_ENGINE):
+    """
+    Devuelve el motor de la transformación indicado, con el motor pandas si no es válido o no está disponible.
+
+    Args:
+        name (str, optional): 'pandas', 'polars' o 'duckdb'. Por defecto, `TRANSFORM_ENGINE`.
+
+    Returns:
+        TransformEngine: El motor de la transformación.
+    """
+    if name == 'polars':
+        if POLARS_AVAILABLE:
+            from etl.engines.polars_engine import PolarsEngine
+            return PolarsEngine()
+        log_error("Error: TRANSFORM_ENGINE=polars requiere el paquete polars. Se utiliza pandas.")
+
+    # El motor duckdb transforma archivos completos (ver `use_sql_engine`); los DataFrames se transforman con pandas
+    elif name not in ('pandas', 'duckdb'):
+        log_error(f"Error: Motor de transformación {name} no soportado. Se utiliza pandas.")
+
+    return PandasEngine()
+
+
+@lru_cache(maxsize=None)
+def use_sql_engine(name: str = TRANSFORM_ENGINE):
+    """
+    Indica si las fuentes se transforman con el motor SQL de DuckDB (ver `transform_file_sql`).
+
+    Args:
+        name (str, optional): El motor configurado. Por defecto, `TRANSFORM_ENGINE`.
+
+    Returns:
+        bool: True si el motor es 'duckdb' y el paquete duckdb está instalado.
+    """
+    if name != 'duckdb':
+        return False
+    if not DUCKDB_AVAILABLE:
+        log_error("Error: TRANSFORM_ENGINE=duckdb requiere el paquete duckdb. Se utiliza pandas.")
+        return False
+    return True
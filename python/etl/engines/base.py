@@ -0,0 +1,68 @@
+from abc import ABC, abstractmethod
+import pandas as pd
+
+
+class TransformEngine(ABC):
+    """
+    Interfaz de los motores de dataframes de la transformación.
+
+    Un motor implementa las etapas de `transform_methods` (`clean_data`, `filter_data`, `transform_all_sources`,
+    `generate_business_key` y `generate_hash`) sobre su propio tipo de datos (`frame`). La lectura de la capa
+    bronze y la escritura de la capa silver son comunes y trabajan con pandas, por lo que cada motor convierte los
+    datos al entrar (`from_pandas`) y al salir (`to_pandas`). Todos los motores deben producir la misma salida y
+    no se pueden instanciar si no implementan todas las etapas.
+    """
+
+    name = None
+
+    @abstractmethod
+    def from_pandas(self, df: pd.DataFrame):
+        """Convierte un DataFrame de pandas leído de la capa bronze al tipo de datos del motor."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def to_pandas(self, frame):
+        """Convierte los datos transformados a un DataFrame de pandas, con los mismos tipos que el motor pandas."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def clean_data(self, frame, means: dict = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def filter_data(self, frame, file_type: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def transform_all_sources(self, frame, file_type: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def generate_business_key(self, frame, file_type: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def generate_hash(self, frame, file_type: str):
+        raise NotImplementedError
+
+    def transform(self, df: pd.DataFrame, file_type: str, means: dict = None):
+        """
+        Aplica a un DataFrame la cadena de transformaciones de su tipo de archivo: limpieza, filtrado,
+        transformaciones específicas, `business_key` y `hash`.
+
+        Args:
+            df (pd.DataFrame): Los datos leídos de la capa bronze.
+            file_type (str): El tipo de archivo de los datos.
+            means (dict, optional): Medias precalculadas para imputar los nulos (ver `compute_column_means`).
+
+        Returns:
+            pd.DataFrame: Los datos transformados, sin las columnas de auditoría.
+        """
+        frame = self.from_pandas(df)
+        frame = self.clean_data(frame, means)
+        frame = self.filter_data(frame, file_type)
+        frame = self.transform_all_sources(frame, file_type)
+
+        frame = self.generate_business_key(frame, file_type)
+        frame = self.generate_hash(frame, file_type)
+        return self.to_pandas(frame)
@@ -0,0 +1,672 @@
+import os
+import sys
+import tempfile
+from datetime import datetime
+import duckdb
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+
+from etl.transform_methods.filter_data import dtypes_dict, conversion_dict
+from etl.transform_methods.parse_datetime import DATETIME_FORMATS, DATETIME_SENTINEL, parse_datetime_values
+from etl.transform_methods.convert_currency import (currency_exchange_rate, load_currency_rates, round_amounts,
+                                                   use_dated_rates)
+from etl.transform_methods.calculate_age import DOB_SENTINEL_YEAR
+from etl.transform_methods.categorize_channel_type import channel_type_map
+from etl.transform_methods.transform_all_sources import plan_stages, DERIVED_COLUMNS
+from etl.transform_methods.generate_business_key import key_attributes, BUSINESS_KEY_ID, business_key_fingerprint
+from etl.transform_methods.generate_hash import (AUDIT_COLUMNS, FIELD_SEPARATOR, HASH_COLUMNS, get_hash_algorithm,
+                                                 hash_strings)
+from etl.transform_methods.deduplicate import (TRANSFORM_DEDUP, TRANSFORM_DEDUP_INDEX_PATH, VERSION_COLUMNS,
+                                               DedupIndex, latest_versions)
+from query.PostgreSQL.CREATE.schema_registry import (FILE_TYPE_TABLES, SCHEMA_CATEGORY_MAX_RATIO, SCHEMA_DTYPES,
+                                                     SCHEMA_STRING_DTYPE, get_primary_keys, get_table_dtypes)
+from utils.utils import LayerWriter, log_error
+
+load_dotenv()
+# Memoria máxima de DuckDB por fuente (p. ej. '4GB'); por encima, las operaciones se vuelcan a disco
+DUCKDB_MEMORY_LIMIT = os.getenv("DUCKDB_MEMORY_LIMIT")
+# Directorio donde DuckDB vuelca a disco los datos que no caben en memoria
+DUCKDB_TEMP_DIRECTORY = os.getenv("DUCKDB_TEMP_DIRECTORY") or os.path.join(tempfile.gettempdir(), "duckdb_spill")
+# Número de hilos de cada conexión (0 para usar todos los núcleos)
+DUCKDB_THREADS = int(os.getenv("DUCKDB_THREADS") or 0)
+
+# Valores que pandas lee como nulos en un CSV, para leer los archivos bronze igual que `read_layer`
+CSV_NA_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>',
+                 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+CSV_TRUE_VALUES = ['True', 'TRUE', 'true']
+CSV_FALSE_VALUES = ['False', 'FALSE', 'false']
+
+# Caracteres que elimina `str.strip()` de Python (espacios en blanco Unicode)
+WHITESPACE = ''.join(chr(code) for code in range(sys.maxunicode + 1) if chr(code).isspace())
+
+NANOSECONDS_PER_DAY = 86400 * 10 ** 9
+
+
+def is_low_cardinality(distinct: int, rows: int, max_ratio: float = SCHEMA_CATEGORY_MAX_RATIO):
+    """Regla de `is_low_cardinality` a partir del número de valores distintos y de filas de una columna."""
+    return distinct <= max_ratio * max(rows, 1)
+
+
+def quote_identifier(name: str):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def sql_string(value: str):
+    return "'" + value.replace("'", "''") + "'"
+
+
+def sql_double(value: float):
+    """Literal DOUBLE exacto (el texto de `repr` se vuelve a leer sin pérdida)."""
+    return f"CAST({sql_string(repr(float(value)))} AS DOUBLE)"
+
+
+def sql_list(values):
+    return '[' + ', '.join(sql_string(value) for value in values) + ']'
+
+
+def is_number_dtype(dtype):
+    return pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+
+
+def is_text_dtype(dtype):
+    return dtype == object or isinstance(dtype, (pd.StringDtype, pd.CategoricalDtype))
+
+
+def parse_datetime_udf(values: pa.ChunkedArray):
+    """Función de DuckDB: parsea con `parse_datetime_values` las fechas que no encajan en `DATETIME_FORMATS`."""
+    parsed = parse_datetime_values(pd.Series(values.to_pylist(), dtype=object))
+    return pa.array(parsed.astype('datetime64[us]'), type=pa.timestamp('us'))
+
+
+def round_amounts_udf(amounts: pa.ChunkedArray):
+    """Función de DuckDB: redondea los importes convertidos con `round_amounts` (mismo resultado que `round()`)."""
+    rounded = round_amounts(amounts.to_pandas())
+    return pa.array(rounded.to_numpy(), type=pa.float64(), from_pandas=True)
+
+
+def business_key_id_udf(business_key: pa.ChunkedArray):
+    """Función de DuckDB: huella de 64 bits del `business_key` (ver `business_key_fingerprint`)."""
+    fingerprint = business_key_fingerprint(pd.Series(business_key.to_pylist(), dtype=object))
+    return pa.array(fingerprint.to_numpy(), type=pa.int64())
+
+
+def hash_strings_udf(algorithm: str):
+    """Función de DuckDB que hashea cada texto con `hash_strings`, para los algoritmos que DuckDB no incluye."""
+    def udf(values: pa.ChunkedArray):
+        return pa.array(hash_strings(np.array(values.to_pylist(), dtype=object), algorithm), type=pa.string())
+    return udf
+
+
+def connect():
+    """
+    Abre una conexión de DuckDB en memoria configurada para volcar a disco (`DUCKDB_TEMP_DIRECTORY`) lo que supere
+    `DUCKDB_MEMORY_LIMIT`, y registra las funciones de Python que usan las consultas.
+    """
+    os.makedirs(DUCKDB_TEMP_DIRECTORY, exist_ok=True)
+    con = duckdb.connect()
+    con.execute("SET enable_progress_bar = false")
+    con.execute(f"SET temp_directory = {sql_string(DUCKDB_TEMP_DIRECTORY)}")
+    if DUCKDB_MEMORY_LIMIT:
+        con.execute(f"SET memory_limit = {sql_string(DUCKDB_MEMORY_LIMIT)}")
+    if DUCKDB_THREADS > 0:
+        con.execute(f"SET threads = {DUCKDB_THREADS}")
+
+    con.create_function('parse_datetime_mixed', parse_datetime_udf, ['VARCHAR'], 'TIMESTAMP', type='arrow')
+    con.create_function('round_amounts', round_amounts_udf, ['DOUBLE'], 'DOUBLE', type='arrow')
+    con.create_function('business_key_id', business_key_id_udf, ['VARCHAR'], 'BIGINT', type='arrow')
+    return con
+
+
+class SQLTransform:
+    """
+    Transformación de un archivo bronze expresada como una cadena de vistas de DuckDB, una por etapa.
+
+    Cada etapa (`clean_data`, `filter_data`, `transform_all_sources`, `generate_business_key` y `generate_hash`)
+    crea una vista sobre la anterior con las mismas reglas que las funciones de `transform_methods`. Las vistas no
+    se materializan: la consulta final se ejecuta en streaming sobre el archivo de origen y DuckDB vuelca a disco
+    lo que no cabe en memoria. Las estadísticas que necesitan todo el archivo (medias, tipos inferidos) se calculan
+    con consultas de agregación previas.
+
+    Para seguir las mismas reglas que pandas, se mantiene el tipo de pandas que tendría cada columna (`dtypes`).
+    """
+
+    def __init__(self, con, file_path: str, file_type: str):
+        self.con = con
+        self.file_type = file_type
+        self.step = 0
+        self.columns = []
+        self.dtypes = {}
+        self.read(file_path)
+
+    @property
+    def view(self):
+        return f"stage_{self.step}"
+
+    def project(self, expressions: dict, source: str = None, order_by: str = None):
+        """
+        Crea la vista de la siguiente etapa, con las expresiones de `expressions` para las columnas nuevas o que
+        cambian y el resto de columnas sin cambios. Las columnas nuevas se añaden al final, como en pandas.
+        """
+        self.columns += [column for column in expressions if column not in self.columns]
+        select = ', '.join(f"{expressions.get(column, quote_identifier(column))} AS {quote_identifier(column)}"
+                           for column in self.columns)
+        source = source or self.view
+        self.step += 1
+        query = f"CREATE OR REPLACE TEMP VIEW {self.view} AS SELECT {select} FROM {source}"
+        if order_by:
+            query += f" ORDER BY {order_by}"
+        self.con.execute(query)
+
+    def aggregate(self, expressions: dict):
+        """Ejecuta una consulta de agregación sobre la vista actual y devuelve un valor por expresión."""
+        if not expressions:
+            return {}
+        select = ', '.join(f"{expression} AS {quote_identifier(name)}" for name, expression in expressions.items())
+        row = self.con.execute(f"SELECT {select} FROM {self.view}").fetchone()
+        return dict(zip(expressions, row))
+
+    def read(self, file_path: str):
+        """
+        Lee el archivo bronze y asigna a cada columna el tipo que le daría `read_data`: los tipos inferidos por
+        pandas para un CSV (o los del esquema del parquet) y después los de su tabla (ver `apply_schema`).
+        """
+        if file_path.endswith('.parquet'):
+            source = f"read_parquet({sql_string(file_path)})"
+            self.dtypes = pq.read_schema(file_path).empty_table().to_pandas().dtypes.to_dict()
+        else:
+            source = (f"read_csv({sql_string(file_path)}, delim='|', header=true, quote='\"', escape='\"', "
+                      f"all_varchar=true, nullstr={sql_list(CSV_NA_VALUES)})")
+        self.columns = [row[0] for row in self.con.execute(f"DESCRIBE SELECT * FROM {source}").fetchall()]
+        self.con.execute(f"CREATE OR REPLACE TEMP VIEW {self.view} AS SELECT * FROM {source}")
+
+        stats = self.column_stats()
+        if not file_path.endswith('.parquet'):
+            self.dtypes = {column: self.infer_csv_dtype(stats[column]) for column in self.columns}
+        self.apply_schema(stats)
+
+        expressions = {}
+        for column in self.columns:
+            value, dtype = quote_identifier(column), self.dtypes[column]
+            if pd.api.types.is_integer_dtype(dtype):
+                expressions[column] = (f"CAST({value} AS BIGINT)" if stats[column]['source'] == 'int'
+                                       else f"CAST(CAST({value} AS DOUBLE) AS BIGINT)")
+            elif pd.api.types.is_float_dtype(dtype):
+                expressions[column] = f"CAST({value} AS DOUBLE)"
+            elif pd.api.types.is_bool_dtype(dtype):
+                expressions[column] = (f"CASE WHEN CAST({value} AS VARCHAR) IN {tuple(CSV_TRUE_VALUES)} THEN true "
+                                       f"WHEN CAST({value} AS VARCHAR) IN {tuple(CSV_FALSE_VALUES)} THEN false END")
+            elif is_text_dtype(dtype):
+                expressions[column] = f"CAST({value} AS VARCHAR)"
+        self.project(expressions)
+
+    def column_stats(self):
+        """
+        Calcula, en una sola pasada, cuántos valores de cada columna son enteros, números, enteros en decimal o
+        booleanos según las reglas de lectura de pandas.
+        """
+        expressions = {}
+        for index, column in enumerate(self.columns):
+            text = f"CAST({quote_identifier(column)} AS VARCHAR)"
+            number = f"TRY_CAST({text} AS DOUBLE)"
+            expressions[f"{index}_total"] = "count(*)"
+            expressions[f"{index}_values"] = f"count({text})"
+            expressions[f"{index}_ints"] = (f"count(CASE WHEN regexp_full_match({text}, '\\s*[+-]?[0-9]+\\s*') "
+                                            f"AND TRY_CAST(trim({text}) AS BIGINT) IS NOT NULL THEN 1 END)")
+            expressions[f"{index}_numbers"] = f"count({number})"
+            expressions[f"{index}_integral"] = f"count(CASE WHEN isfinite({number}) AND {number} = floor({number}) THEN 1 END)"
+            expressions[f"{index}_distinct"] = f"count(DISTINCT {text})"
+            expressions[f"{index}_bools"] = (f"count(CASE WHEN {text} IN "
+                                             f"{tuple(CSV_TRUE_VALUES + CSV_FALSE_VALUES)} THEN 1 END)")
+        values = self.aggregate(expressions)
+
+        stats = {}
+        for index, column in enumerate(self.columns):
+            column_stats = {name: values[f"{index}_{name}"]
+                            for name in ('total', 'values', 'ints', 'numbers', 'integral', 'distinct', 'bools')}
+            column_stats['source'] = 'int' if column_stats['ints'] == column_stats['values'] else 'other'
+            stats[column] = column_stats
+        return stats
+
+    @staticmethod
+    def infer_csv_dtype(stats: dict):
+        """Tipo que infiere `pd.read_csv` para una columna a partir de sus estadísticas."""
+        if stats['values'] == 0:
+            return np.dtype('float64')
+        if stats['ints'] == stats['values']:
+            return np.dtype('int64' if stats['values'] == stats['total'] else 'float64')
+        if stats['numbers'] == stats['values']:
+            return np.dtype('float64')
+        if stats['bools'] == stats['values'] and stats['values'] == stats['total']:
+            return np.dtype('bool')
+        return np.dtype(object)
+
+    def apply_schema(self, stats: dict):
+        """Aplica a `dtypes` los tipos de la tabla del archivo con las mismas reglas que `apply_schema`."""
+        table = FILE_TYPE_TABLES.get(self.file_type)
+        if not SCHEMA_DTYPES or table is None:
+            return
+
+        for column, dtype in get_table_dtypes(table).items():
+            if column not in self.dtypes:
+                continue
+            source, column_stats = self.dtypes[column], stats[column]
+            # Las columnas numéricas con tipo de texto en la tabla son códigos que se transforman después (ChannelType)
+            if dtype in ('category', SCHEMA_STRING_DTYPE) and pd.api.types.is_numeric_dtype(source):
+                continue
+            if dtype == 'category' and not (isinstance(source, pd.CategoricalDtype)
+                                            or is_low_cardinality(column_stats['distinct'], column_stats['total'])):
+                dtype = SCHEMA_STRING_DTYPE
+            dtype = pd.api.types.pandas_dtype(dtype)
+            if source == dtype:
+                continue
+
+            numeric = is_number_dtype(source) or column_stats['numbers'] == column_stats['values']
+            if pd.api.types.is_integer_dtype(dtype) and not (numeric
+                                                             and column_stats['integral'] == column_stats['values']):
+                log_error(f"Error: No se pudo convertir la columna {column} de {table} a {dtype}")
+            elif pd.api.types.is_float_dtype(dtype) and not numeric:
+                log_error(f"Error: No se pudo convertir la columna {column} de {table} a {dtype}")
+            else:
+                self.dtypes[column] = dtype
+
+    def date_expression(self, column: str):
+        """Expresión de `parse_datetime`: fechas con precisión de segundos y centinelas como nulos."""
+        value = quote_identifier(column)
+        if pd.api.types.is_datetime64_any_dtype(self.dtypes[column]):
+            return f"date_trunc('second', CAST({value} AS TIMESTAMP))"
+
+        text = f"CAST({value} AS VARCHAR)"
+        parsed = f"COALESCE(try_strptime({text}, {sql_list(DATETIME_FORMATS)}), parse_datetime_mixed({text}))"
+        return f"CASE WHEN starts_with({text}, {sql_string(DATETIME_SENTINEL)}) THEN NULL " \
+               f"ELSE date_trunc('second', {parsed}) END"
+
+    def text_expression(self, column: str, canonical: bool = False, dtype=None):
+        """
+        Expresión con el texto de `str()` de cada valor en pandas (`business_key`) o, con `canonical`, el de
+        `canonical_value` (`hash`), con 'NULL' para los nulos.
+        """
+        value, dtype = quote_identifier(column), dtype if dtype is not None else self.dtypes[column]
+        if pd.api.types.is_float_dtype(dtype):
+            value = f"CAST({value} AS DOUBLE)"
+            text = f"CAST({value} AS VARCHAR)"
+            if canonical:
+                text = f"CASE WHEN isfinite({value}) AND {value} = floor({value}) " \
+                       f"THEN CAST(CAST({value} AS HUGEINT) AS VARCHAR) ELSE {text} END"
+        elif pd.api.types.is_bool_dtype(dtype):
+            text = f"CASE WHEN {value} THEN 'True' WHEN NOT {value} THEN 'False' END"
+        elif pd.api.types.is_datetime64_any_dtype(dtype):
+            text = f"strftime({value}, '%Y-%m-%d %H:%M:%S')"
+        elif pd.api.types.is_timedelta64_dtype(dtype):
+            text = self.timedelta_text(value)
+        else:
+            text = f"CAST({value} AS VARCHAR)"
+        return f"COALESCE({text}, 'NULL')"
+
+    @staticmethod
+    def timedelta_text(value: str, even_days: bool = False):
+        """
+        Expresión con el texto de `str(pd.Timedelta)` de una duración en nanosegundos ('0 days 01:30:00',
+        '-1 days +23:00:00'), o solo los días ('3 days') si `even_days`, como escribe pandas las columnas de
+        duraciones en las que todos los valores son días enteros.
+        """
+        days = f"floor({value} / {NANOSECONDS_PER_DAY})"
+        if even_days:
+            return f"CAST(CAST({days} AS BIGINT) AS VARCHAR) || ' days'"
+
+        seconds = f"CAST(({value} - {days} * {NANOSECONDS_PER_DAY}) // 1000000000 AS BIGINT)"
+        return (f"CAST(CAST({days} AS BIGINT) AS VARCHAR) || ' days ' || CASE WHEN {value} < 0 THEN '+' ELSE '' END "
+                f"|| lpad(CAST({seconds} // 3600 AS VARCHAR), 2, '0') || ':' "
+                f"|| lpad(CAST({seconds} % 3600 // 60 AS VARCHAR), 2, '0') || ':' "
+                f"|| lpad(CAST({seconds} % 60 AS VARCHAR), 2, '0')")
+
+    def clean_data(self):
+        """Limpieza de `clean_data`: filas sin valores, espacios en blanco e imputación de nulos con la media."""
+        all_null = ' AND '.join(f"{quote_identifier(column)} IS NULL" for column in self.columns)
+        self.project({}, source=f"{self.view} WHERE NOT ({all_null})")
+
+        number_columns = [column for column in self.columns if is_number_dtype(self.dtypes[column])]
+        # Suma compensada (`fsum`): la media coincide con la de pandas, mientras que `avg` puede variar en el último bit
+        means = self.aggregate({column: f"fsum({quote_identifier(column)}) / count({quote_identifier(column)})"
+                                for column in number_columns})
+
+        expressions = {}
+        for column in self.columns:
+            value, dtype = quote_identifier(column), self.dtypes[column]
+            if is_text_dtype(dtype):
+                expressions[column] = f"trim({value}, {sql_string(WHITESPACE)})"
+            elif column in means and means[column] is not None and not np.isnan(means[column]):
+                if pd.api.types.is_integer_dtype(dtype):
+                    expressions[column] = f"COALESCE({value}, {round(means[column])})"
+                else:
+                    expressions[column] = f"COALESCE({value}, {sql_double(means[column])})"
+        self.project(expressions)
+
+    def filter_data(self):
+        """Conversión de tipos de `filter_data`: fechas, `conversion_dict` y textos sin tipo."""
+        if self.file_type not in dtypes_dict:
+            log_error(f"Error: El tipo de archivo {self.file_type} no está en el diccionario dtypes_dict.")
+            return
+
+        date_columns = [column for column in dtypes_dict[self.file_type] if column in self.columns]
+        self.project({column: self.date_expression(column) for column in date_columns})
+        for column in date_columns:
+            self.dtypes[column] = np.dtype('datetime64[ns]')
+
+        conversion_types = conversion_dict.get(self.file_type, {})
+        expressions = {}
+        for column, target_dtype in conversion_types.items():
+            if column not in self.columns:
+                continue
+            if target_dtype.startswith('string'):
+                text = self.text_expression(column)
+                expressions[column] = f"CASE WHEN {quote_identifier(column)} IS NULL THEN NULL ELSE {text} END"
+                self.dtypes[column] = pd.api.types.pandas_dtype(target_dtype)
+            else:
+                nulls = self.aggregate({column: f"count(*) - count({quote_identifier(column)})"})[column]
+                if nulls:
+                    log_error(f"Error: No se pudo convertir la columna {column} a {target_dtype}.")
+                    continue
+                expressions[column] = f"CAST({quote_identifier(column)} AS BIGINT)"
+                self.dtypes[column] = np.dtype(target_dtype)
+        self.project(expressions)
+
+        # Los textos sin tipo se guardan como `category` si tienen pocos valores distintos, o como `string`
+        text_columns = [column for column in self.columns if column not in date_columns
+                        and column not in conversion_types and self.dtypes[column] == object]
+        counts = self.aggregate({'rows': 'count(*)', **{column: f"count(DISTINCT {quote_identifier(column)})"
+                                                        for column in text_columns}})
+        for column in text_columns:
+            low_cardinality = is_low_cardinality(counts[column], counts['rows'])
+            self.dtypes[column] = pd.CategoricalDtype() if low_cardinality else pd.StringDtype()
+
+    def transform_all_sources(self):
+        """
+        Transformaciones específicas de cada tipo de archivo que planifica `plan_stages`, con la implementación en
+        SQL de cada etapa de `transform_stages`.
+        """
+        stages = {
+            'convert_currency': lambda: self.convert_currency('ForeignAmount', 'ForeignCurrencyCode',
+                                                              load_currency_rates(), 'ChargeDateTime'),
+            'calculate_age': lambda: self.calculate_age('DOB'),
+            'calculate_time_to_modify': lambda: self.calculate_time_to_modify('CreatedDate', 'ModifiedDate'),
+            'assign_passenger_journey_charge': lambda: self.assign_passenger_journey_charge('ChargeAmount'),
+            'categorize_channel_type': lambda: self.categorize_channel_type('ChannelType'),
+        }
+
+        for name in plan_stages(self.file_type, tuple(self.columns)):
+            if name not in stages:
+                raise NotImplementedError(f"La etapa {name} no está implementada en el motor duckdb")
+            stages[name]()
+
+    def calculate_time_to_modify(self, created_column: str, modified_column: str):
+        """'TimeToModify' de `calculate_time_to_modify`, en nanosegundos."""
+        for column in (created_column, modified_column):
+            if not pd.api.types.is_datetime64_any_dtype(self.dtypes[column]):
+                self.project({column: self.date_expression(column)})
+                self.dtypes[column] = np.dtype('datetime64[ns]')
+        self.project({'TimeToModify': f"epoch_ns({quote_identifier(modified_column)}) - "
+                                      f"epoch_ns({quote_identifier(created_column)})"})
+        self.dtypes['TimeToModify'] = np.dtype('timedelta64[ns]')
+
+    def assign_passenger_journey_charge(self, charge_column: str):
+        """'PassengerJourneyCharge' de `assign_passenger_journey_charge`."""
+        self.project({'PassengerJourneyCharge':
+                      f"CASE WHEN {quote_identifier(charge_column)} > 0 THEN 'Charged' ELSE 'Not Charged' END"})
+        self.dtypes['PassengerJourneyCharge'] = pd.CategoricalDtype()
+
+    def categorize_channel_type(self, column: str):
+        """Categorías de canal de `categorize_channel_type`."""
+        codes = f"TRY_CAST(CAST({quote_identifier(column)} AS VARCHAR) AS DOUBLE)"
+        cases = ' '.join(f"WHEN {code} THEN {sql_string(label)}" for code, label in channel_type_map.items())
+        self.project({column: f"CASE {codes} {cases} END"})
+        self.dtypes[column] = pd.CategoricalDtype()
+
+    def convert_currency(self, amount_column: str, currency_column: str, currency_rates: pd.DataFrame = None,
+                         date_column: str = None):
+        """Conversión a EUR de `convert_currency`, con `ASOF JOIN` sobre el histórico de tasas si existe."""
+        amount, currency = quote_identifier(amount_column), f"CAST({quote_identifier(currency_column)} AS VARCHAR)"
+        cases = ' '.join(f"WHEN {sql_string(code)} THEN {sql_double(rate)}"
+                         for code, rate in currency_exchange_rate.items())
+        rate = f"CASE {currency} {cases} END"
+
+        if use_dated_rates(currency_rates, date_column, self.columns):
+            # Las columnas del histórico se renombran para no coincidir con las del archivo (CurrencyCode)
+            self.con.register('currency_rates', currency_rates.rename(columns={
+                'CurrencyCode': '__rate_currency', 'EffectiveDate': '__rate_date', 'Rate': '__rate'}))
+            self.project({'__row': 'row_number() OVER ()'})
+            self.project({'__asof_rate': '"__rate"'},
+                         source=f"{self.view} ASOF LEFT JOIN currency_rates ON {currency} = \"__rate_currency\" "
+                                f"AND {quote_identifier(date_column)} >= \"__rate_date\"",
+                         order_by='"__row"')
+            rate = f"COALESCE(\"__asof_rate\", {rate})"
+
+        rate = f"CASE WHEN {currency} = 'EUR' THEN NULL ELSE {rate} END"
+        self.columns = [column for column in self.columns if column not in ('__row', '__asof_rate')]
+        self.project({amount_column: f"CASE WHEN ({rate}) IS NULL THEN {amount} "
+                                     f"ELSE round_amounts({amount} * ({rate})) END",
+                      currency_column: "'EUR'"})
+        self.dtypes[currency_column] = pd.CategoricalDtype()
+
+    def calculate_age(self, dob_column: str):
+        """Cálculo de 'age' e 'IsAdult' de `calculate_age`."""
+        if dob_column not in self.columns:
+            log_error(f"Error: La columna {dob_column} no está en el DataFrame.")
+            return
+
+        prefix = f"trim(substr({quote_identifier(dob_column)}, 1, 4), {sql_string(WHITESPACE)})"
+        birth_year = (f"CASE WHEN regexp_full_match({prefix}, '[+-]?[0-9]+') THEN CAST({prefix} AS DOUBLE) END"
+                      if is_text_dtype(self.dtypes[dob_column]) else "CAST(NULL AS DOUBLE)")
+        invalid_rows = self.aggregate({'invalid': f"count(*) - count({birth_year})"})['invalid']
+        if invalid_rows:
+            log_error(f"{invalid_rows} filas con {dob_column} nulo o mal formado: se asigna age nulo e IsAdult False.")
+
+        age = f"{datetime.now().year} - CASE WHEN {birth_year} <> {DOB_SENTINEL_YEAR} THEN {birth_year} END"
+        self.project({'age': f"CAST({age} AS DOUBLE)", 'IsAdult': f"COALESCE({age} >= 18, false)"})
+        self.dtypes['age'] = np.dtype('float64')
+        self.dtypes['IsAdult'] = np.dtype('bool')
+
+    def generate_business_key(self):
+        """`business_key` (y `business_key_id`) de `generate_business_key`."""
+        if self.file_type not in key_attributes:
+            log_error(f"Error: El tipo de archivo {self.file_type} no está en el diccionario key_attributes.")
+            return
+
+        attributes = key_attributes[self.file_type]
+        missing_columns = [col for col in attributes if col not in self.columns]
+        if missing_columns:
+            log_error(f"Error: Las siguientes columnas faltan en el DataFrame: {', '.join(missing_columns)}")
+            return
+
+        common_dtype = pd.concat([pd.Series(dtype=self.dtypes[col]) for col in attributes], ignore_index=True).dtype
+        dtype = common_dtype if pd.api.types.is_float_dtype(common_dtype) else None
+        business_key = " || '_' || ".join(self.text_expression(col, dtype=dtype) for col in attributes)
+        self.project({'business_key': business_key})
+        self.dtypes['business_key'] = np.dtype(object)
+
+        if BUSINESS_KEY_ID:
+            self.project({'business_key_id': 'business_key_id("business_key")'})
+            self.dtypes['business_key_id'] = np.dtype('int64')
+
+    def generate_hash(self):
+        """`hash` de `generate_hash`: texto canónico de las columnas unido por `FIELD_SEPARATOR` y hasheado."""
+        if HASH_COLUMNS == 'key':
+            columns = key_attributes.get(self.file_type)
+            if columns is None or any(col not in self.columns for col in columns):
+                log_error(f"Error: Faltan las columnas clave del tipo de archivo {self.file_type} para el hash.")
+                return
+        else:
+            columns = [col for col in self.columns if col not in AUDIT_COLUMNS and col not in DERIVED_COLUMNS]
+
+        row = f" || {sql_string(FIELD_SEPARATOR)} || ".join(self.text_expression(col, canonical=True)
+                                                              for col in columns) or "''"
+        algorithm = get_hash_algorithm()
+        if algorithm not in ('md5', 'sha1'):
+            self.con.create_function('hash_row', hash_strings_udf(algorithm), ['VARCHAR'], 'VARCHAR', type='arrow')
+            algorithm = 'hash_row'
+        self.project({'hash': f"{algorithm}({row})"})
+        self.dtypes['hash'] = np.dtype(object)
+
+    def deduplicate(self, source: str, index: DedupIndex = None):
+        """
+        Última versión de cada clave primaria de `deduplicate` (la clave de `dedup_key`): `QUALIFY` con el orden
+        de `VERSION_COLUMNS` (las fechas como enteros, con los nulos como el valor más antiguo) y, si se indica el
+        índice persistente, sin las filas más antiguas que la versión vista para su clave. Devuelve las versiones
+        de las filas conservadas si hay índice (para actualizarlo), o None.
+        """
+        columns = get_primary_keys().get(source)
+        if not columns:
+            log_error(f"No se puede deduplicar {source}: su tabla no tiene clave primaria.")
+            return None
+        missing = [column for column in columns if column not in self.columns]
+        if missing:
+            log_error(f"No se puede deduplicar {source}: faltan las columnas de la clave primaria {', '.join(missing)}.")
+            return None
+
+        key = " || '_' || ".join(self.text_expression(column) for column in columns)
+        versions = {column: f"COALESCE(epoch_ns(TRY_CAST({quote_identifier(column)} AS TIMESTAMP)), "
+                            f"{np.iinfo(np.int64).min})"
+                    for column in VERSION_COLUMNS if column in self.columns}
+        self.project({'__row': 'row_number() OVER ()', '__key': key})
+
+        view, where = self.view, ''
+        if index is not None and not index.versions.empty:
+            seen = [column for column in versions if column in index.versions.columns]
+            self.con.register('dedup_index', index.versions.reset_index(drop=True)[['key'] + seen]
+                              .rename(columns=lambda column: f"__seen_{column}"))
+            view += ' LEFT JOIN dedup_index ON "__key" = "__seen_key"'
+            if seen:
+                where = (f'WHERE "__seen_key" IS NULL OR ({", ".join(versions[c] for c in seen)}) >= '
+                         f'({", ".join(quote_identifier(f"__seen_{c}") for c in seen)})')
+
+        order = ', '.join([f"{expression} DESC" for expression in versions.values()] + ['"__row" DESC'])
+        self.project({}, source=f'(SELECT * FROM {view} {where} QUALIFY row_number() OVER '
+                                f'(PARTITION BY "__key" ORDER BY {order}) = 1)',
+                     order_by='"__row"')
+        self.columns.remove('__row')
+
+        kept = None
+        if index is not None:
+            select = ', '.join(['"__key" AS "key"'] + [f"{expression} AS {quote_identifier(column)}"
+                                                      for column, expression in versions.items()])
+            kept = self.con.execute(f"SELECT {select} FROM {self.view}").df()
+            kept['key'] = kept['key'].astype(object)
+            kept = kept.assign(row=np.arange(len(kept)))
+        self.columns.remove('__key')
+        return kept
+
+    def add_audit_columns(self, source: str, extract_date: str, proc_type: str):
+        """Columnas de auditoría de `add_audit_columns`."""
+        self.project({'extract_dt': f"CAST({sql_string(extract_date)} AS TIMESTAMP)",
+                      'source': sql_string(str(source)), 'proc_status': sql_string(str(proc_type))})
+        self.dtypes['extract_dt'] = np.dtype('datetime64[ns]')
+        self.dtypes['source'] = pd.CategoricalDtype()
+        self.dtypes['proc_status'] = pd.CategoricalDtype()
+
+    def csv_expressions(self):
+        """
+        Expresiones con el texto que escribe `DataFrame.to_csv` para cada columna: decimales con `repr`, booleanos
+        como 'True'/'False', fechas sin hora si todas son medianoche y duraciones en días si todas son días enteros.
+        """
+        flags = {}
+        for column in self.columns:
+            value, dtype = quote_identifier(column), self.dtypes[column]
+            if pd.api.types.is_datetime64_any_dtype(dtype):
+                flags[column] = f"bool_and({value} = date_trunc('day', {value}))"
+            elif pd.api.types.is_timedelta64_dtype(dtype):
+                flags[column] = f"bool_and({value} % {NANOSECONDS_PER_DAY} = 0)"
+        flags = self.aggregate(flags)
+
+        expressions = {}
+        for column in self.columns:
+            value, dtype = quote_identifier(column), self.dtypes[column]
+            if pd.api.types.is_datetime64_any_dtype(dtype):
+                date_format = '%Y-%m-%d' if flags[column] else '%Y-%m-%d %H:%M:%S'
+                expressions[column] = f"strftime({value}, {sql_string(date_format)})"
+            elif pd.api.types.is_timedelta64_dtype(dtype):
+                expressions[column] = self.timedelta_text(value, even_days=bool(flags[column]))
+            elif pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_float_dtype(dtype):
+                expressions[column] = f"NULLIF({self.text_expression(column)}, 'NULL')"
+            elif is_text_dtype(dtype):
+                # Los textos vacíos se escriben sin comillas, como los nulos
+                expressions[column] = f"NULLIF(CAST({value} AS VARCHAR), '')"
+        return expressions
+
+    def batch_to_pandas(self, batch: pa.RecordBatch):
+        """Convierte un lote del resultado a pandas con los tipos que tendría en el motor pandas."""
+        df = batch.to_pandas()
+        for column in self.columns:
+            dtype = self.dtypes[column]
+            if pd.api.types.is_timedelta64_dtype(dtype):
+                df[column] = pd.to_timedelta(df[column], unit='ns')
+            elif isinstance(dtype, pd.CategoricalDtype):
+                df[column] = df[column].astype('category')
+            elif df[column].dtype != dtype:
+                df[column] = df[column].astype(dtype)
+        return df
+
+    def write(self, file_path: str):
+        """
+        Escribe el resultado en la capa silver: CSV con `COPY`, con el mismo texto que `DataFrame.to_csv`, o parquet
+        por lotes con `LayerWriter`. Devuelve el número de filas escritas.
+        """
+        if file_path.endswith('.parquet'):
+            select = ', '.join(quote_identifier(column) for column in self.columns)
+            reader = self.con.execute(f"SELECT {select} FROM {self.view}").fetch_record_batch()
+            rows = 0
+            with LayerWriter(file_path) as writer:
+                for batch in reader:
+                    rows += writer.write(self.batch_to_pandas(batch))
+            return rows
+
+        expressions = self.csv_expressions()
+        select = ', '.join(f"{expressions.get(column, quote_identifier(column))} AS {quote_identifier(column)}"
+                           for column in self.columns)
+        result = self.con.execute(f"COPY (SELECT {select} FROM {self.view}) TO {sql_string(file_path)} "
+                                  f"(FORMAT CSV, DELIMITER '|', HEADER, QUOTE '\"', ESCAPE '\"')").fetchone()
+        return result[0] if result else None
+
+
+def transform_file_sql(file_path: str, file_type: str, output_path: str, source: str, extract_date: str):
+    """
+    Transforma un archivo bronze con DuckDB, sin cargarlo en memoria, y escribe el resultado en `output_path`.
+
+    La cadena de etapas es la misma que la de los motores de dataframes (ver `SQLTransform`), incluida la
+    deduplicación por clave primaria (`TRANSFORM_DEDUP`), de modo que la capa silver tiene el mismo contenido. Las
+    consultas vuelcan a disco en `DUCKDB_TEMP_DIRECTORY` lo que supera `DUCKDB_MEMORY_LIMIT`, por lo que el tamaño
+    del archivo no está limitado por la memoria del nodo.
+
+    Args:
+        file_path (str): Ruta del archivo bronze (CSV o parquet).
+        file_type (str): El tipo de archivo de los datos.
+        output_path (str): Ruta del archivo silver (CSV o parquet, según su extensión).
+        source (str): Fuente de los datos, para las columnas de auditoría.
+        extract_date (str): Fecha de la transformación, para las columnas de auditoría.
+
+    Returns:
+        int: El número de filas escritas.
+    """
+    con = connect()
+    try:
+        transform = SQLTransform(con, file_path, file_type)
+        transform.clean_data()
+        transform.filter_data()
+        transform.transform_all_sources()
+        transform.generate_business_key()
+        transform.generate_hash()
+
+        index, kept = None, None
+        if TRANSFORM_DEDUP:
+            index = DedupIndex.load(source) if TRANSFORM_DEDUP_INDEX_PATH else None
+            kept = transform.deduplicate(source, index)
+
+        transform.add_audit_columns(source, extract_date, 'transformed')
+        rows = transform.write(output_path)
+        if kept is not None:
+            index.update(latest_versions(kept))
+            index.save(source)
+        return rows
+    finally:
+        con.close()
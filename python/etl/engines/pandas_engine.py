@@ -0,0 +1,37 @@
+import pandas as pd
+
+from etl.engines.base import TransformEngine
+from etl.transform_methods.clean_data import clean_data
+from etl.transform_methods.filter_data import filter_data
+from etl.transform_methods.transform_all_sources import transform_all_sources
+from etl.transform_methods.generate_business_key import generate_business_key
+from etl.transform_methods.generate_hash import generate_hash
+
+
+class PandasEngine(TransformEngine):
+    """
+    Motor de la transformación con pandas: usa directamente las funciones de `transform_methods`.
+    """
+
+    name = 'pandas'
+
+    def from_pandas(self, df: pd.DataFrame):
+        return df
+
+    def to_pandas(self, frame: pd.DataFrame):
+        return frame
+
+    def clean_data(self, frame: pd.DataFrame, means: dict = None):
+        return clean_data(frame, means)
+
+    def filter_data(self, frame: pd.DataFrame, file_type: str):
+        return filter_data(frame, file_type)
+
+    def transform_all_sources(self, frame: pd.DataFrame, file_type: str):
+        return transform_all_sources(frame, file_type)
+
+    def generate_business_key(self, frame: pd.DataFrame, file_type: str):
+        return generate_business_key(frame, file_type)
+
+    def generate_hash(self, frame: pd.DataFrame, file_type: str):
+        return generate_hash(frame, file_type)
@@ -0,0 +1,479 @@
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import polars as pl
+import pyarrow as pa
+
+from etl.engines.base import TransformEngine
+from etl.engines.pandas_engine import PandasEngine
+from etl.transform_methods.filter_data import dtypes_dict, conversion_dict
+from etl.transform_methods.parse_datetime import DATETIME_FORMATS, DATETIME_SENTINEL, parse_datetime_values
+from etl.transform_methods.convert_currency import (currency_exchange_rate, load_currency_rates, round_amounts,
+                                                   use_dated_rates)
+from etl.transform_methods.calculate_age import DOB_SENTINEL_YEAR
+from etl.transform_methods.categorize_channel_type import channel_type_map, CHANNEL_TYPE_DTYPE
+from etl.transform_methods.assign_passenger_journey_charge import CHARGE_STATUS_DTYPE
+from etl.transform_methods.transform_all_sources import plan_stages
+from etl.transform_methods.generate_business_key import key_attributes, BUSINESS_KEY_ID, business_key_fingerprint
+from etl.transform_methods.generate_hash import (FIELD_SEPARATOR, HASH_BATCH_SIZE, get_hash_algorithm,
+                                                 get_hash_columns, hash_strings)
+from query.PostgreSQL.CREATE.schema_registry import SCHEMA_CATEGORY_MAX_RATIO
+from utils.utils import log_error
+
+# Formatos de fecha de `DATETIME_FORMATS` en la sintaxis de polars (fracción de segundo opcional con '%.f')
+POLARS_DATETIME_FORMATS = [date_format.replace('.%f', '%.f') for date_format in DATETIME_FORMATS]
+
+# Tipos enteros y booleanos de Arrow y su tipo de pandas con nulos, para que los nulos no conviertan a decimal
+ARROW_NULLABLE_DTYPES = {
+    pa.int8(): pd.Int8Dtype(),
+    pa.int16(): pd.Int16Dtype(),
+    pa.int32(): pd.Int32Dtype(),
+    pa.int64(): pd.Int64Dtype(),
+    pa.uint8(): pd.UInt8Dtype(),
+    pa.uint16(): pd.UInt16Dtype(),
+    pa.uint32(): pd.UInt32Dtype(),
+    pa.uint64(): pd.UInt64Dtype(),
+    pa.bool_(): pd.BooleanDtype(),
+}
+
+
+class PolarsFrame:
+    """
+    Datos de una fuente en el motor polars: la consulta perezosa (`lf`) y el tipo de pandas que tendrá cada columna
+    en la salida (`dtypes`), el mismo que le da el motor pandas.
+    """
+
+    def __init__(self, lf: pl.LazyFrame, dtypes: dict):
+        self.lf = lf
+        self.dtypes = dtypes
+
+
+def map_unique(series: pl.Series, function):
+    """
+    Aplica una función de Python a cada valor distinto (no nulo) de una serie y expande el resultado a sus filas.
+
+    Args:
+        series (pl.Series): La serie a convertir.
+        function (callable): La función que devuelve el texto de un valor.
+
+    Returns:
+        pl.Series: El texto de cada fila, con nulo en las filas nulas.
+    """
+    uniques = series.drop_nulls().unique()
+    labels = [function(value) for value in uniques.to_list()]
+    return series.replace_strict(uniques, labels, default=None, return_dtype=pl.String)
+
+
+def timedelta_text(series: pl.Series):
+    """
+    Convierte una serie de duraciones al texto de `str(pd.Timedelta)`, por ejemplo '0 days 01:30:00' o
+    '-1 days +23:00:00'. Las duraciones con fracciones de segundo se convierten con pandas.
+    """
+    nanoseconds = series.dt.total_nanoseconds()
+    seconds = nanoseconds // 1_000_000_000
+    days = seconds // 86400
+    remainder = seconds - days * 86400
+
+    def two_digits(value):
+        return value.cast(pl.String).str.zfill(2)
+
+    text = pl.select(
+        pl.concat_str([
+            days.cast(pl.String), pl.lit(' days '), pl.when(days < 0).then(pl.lit('+')).otherwise(pl.lit('')),
+            two_digits(remainder // 3600), pl.lit(':'), two_digits(remainder % 3600 // 60), pl.lit(':'),
+            two_digits(remainder % 60),
+        ])
+    ).to_series()
+
+    fractional = (nanoseconds % 1_000_000_000 != 0).fill_null(False)
+    if fractional.any():
+        fixed = map_unique(nanoseconds.filter(fractional), lambda value: str(pd.Timedelta(value)))
+        text = text.scatter(fractional.arg_true(), fixed)
+    return text
+
+
+def column_text(series: pl.Series, canonical: bool = False):
+    """
+    Convierte una columna a texto con el mismo formato que `str()` de cada valor en pandas, con 'NULL' para los
+    nulos. Se usa para el `business_key` (`str()`) y para el `hash` (formato canónico de `canonical_value`).
+
+    Las fechas ya están redondeadas a segundos (ver `filter_data`), por lo que se escriben sin fracción.
+
+    Args:
+        series (pl.Series): La columna a convertir.
+        canonical (bool, optional): Si es True, los decimales enteros se escriben sin decimales ('5' y no '5.0').
+
+    Returns:
+        pl.Series: El texto de cada fila.
+    """
+    dtype = series.dtype
+    if dtype.is_float():
+        series = series.fill_nan(None)
+        integral = (series.is_finite() & (series == series.floor())).fill_null(False)
+        text = series.cast(pl.String)
+        if canonical:
+            text = pl.select(pl.when(integral).then(series.cast(pl.Int128, strict=False).cast(pl.String))
+                             .otherwise(text)).to_series()
+        # Python escribe en notación científica los valores por debajo de 1e-4 (1e-05 y no 0.00001)
+        small = (~integral & series.is_finite() & (series.abs() < 1e-4)).fill_null(False)
+        if small.any():
+            text = text.scatter(small.arg_true(), map_unique(series.filter(small), str))
+    elif dtype == pl.Boolean:
+        text = pl.select(pl.when(series).then(pl.lit('True')).otherwise(pl.lit('False'))).to_series()
+        text = text.set(series.is_null(), None)
+    elif isinstance(dtype, pl.Datetime):
+        text = series.dt.strftime('%Y-%m-%d %H:%M:%S')
+    elif isinstance(dtype, pl.Duration):
+        text = timedelta_text(series)
+    else:
+        text = series.cast(pl.String)
+
+    return text.fill_null('NULL')
+
+
+def parse_datetime_series(series: pl.Series):
+    """
+    Convierte una columna de fechas a `Datetime('ns')` con precisión de segundos, con el mismo resultado que
+    `parse_datetime`.
+
+    Se prueban los formatos de `DATETIME_FORMATS` en polars; los centinelas `9999-12-31` se convierten en nulos y los
+    valores que no encajan en ningún formato se parsean con `parse_datetime_values` una sola vez por valor distinto.
+
+    Args:
+        series (pl.Series): La columna a convertir.
+
+    Returns:
+        pl.Series: La columna convertida, con nulo para los centinelas y los valores no válidos.
+    """
+    if isinstance(series.dtype, (pl.Datetime, pl.Date)):
+        return series.cast(pl.Datetime('ns')).dt.truncate('1s')
+
+    values = series.cast(pl.String)
+    sentinel = values.str.starts_with(DATETIME_SENTINEL).fill_null(False)
+
+    parsed = pl.Series(series.name, [None] * len(values), dtype=pl.Datetime('ns'))
+    for date_format in POLARS_DATETIME_FORMATS:
+        parsed = parsed.fill_null(values.str.to_datetime(date_format, strict=False, time_unit='ns'))
+    parsed = parsed.set(sentinel, None)
+
+    pending = parsed.is_null() & values.is_not_null() & ~sentinel
+    if pending.any():
+        leftovers = values.filter(pending).unique()
+        fallback = parse_datetime_values(pd.Series(leftovers.to_list(), dtype=object))
+        fallback = pl.Series(fallback.to_numpy(), dtype=pl.Datetime('ns'))
+        parsed = parsed.fill_null(values.replace_strict(leftovers, fallback, default=None,
+                                                        return_dtype=pl.Datetime('ns')))
+
+    return parsed.dt.truncate('1s')
+
+
+def is_number_dtype(dtype):
+    """Indica si un tipo de pandas es numérico (sin contar los booleanos), como `select_dtypes(np.number)`."""
+    return pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+
+
+class PolarsEngine(TransformEngine):
+    """
+    Motor de la transformación con polars: las etapas se ejecutan con expresiones de columnas en el pool de hilos
+    de polars y sobre datos en formato Arrow, de modo que una misma fuente usa varios núcleos.
+
+    Las etapas se encadenan en una consulta perezosa que solo se materializa cuando una etapa necesita los datos
+    (el parseo de fechas, la conversión de divisas, la decisión de qué columnas guardar como categoría y los
+    hashes). La salida tiene los mismos valores y tipos de pandas que la del motor pandas.
+    """
+
+    name = 'polars'
+
+    def transform(self, df: pd.DataFrame, file_type: str, means: dict = None):
+        try:
+            return super().transform(df, file_type, means)
+        except (pl.exceptions.PolarsError, pa.ArrowException, TypeError, ValueError) as e:
+            # Por ejemplo, columnas de tipo object con valores de varios tipos, que no se pueden pasar a Arrow. Las
+            # etapas de `transform_stages` sin implementación en polars (`NotImplementedError`) no se ocultan: la
+            # fuente termina con error
+            log_error(f"Error en el motor polars para {file_type}: {e}. Se transforma con pandas.")
+            return PandasEngine().transform(df, file_type, means)
+
+    def from_pandas(self, df: pd.DataFrame):
+        return PolarsFrame(pl.from_pandas(df).lazy(), df.dtypes.to_dict())
+
+    def to_pandas(self, frame: PolarsFrame):
+        df = frame.lf.collect().to_arrow().to_pandas(types_mapper=ARROW_NULLABLE_DTYPES.get)
+        for column, dtype in frame.dtypes.items():
+            if column in df.columns and df[column].dtype != dtype:
+                df[column] = df[column].astype(dtype)
+        return df
+
+    def clean_data(self, frame: PolarsFrame, means: dict = None):
+        """
+        Limpia los datos igual que `clean_data`: elimina las filas sin ningún valor, quita los espacios en blanco de
+        los textos y de las categorías e imputa los nulos numéricos con la media (redondeada en los enteros).
+        """
+        lf = frame.lf.filter(~pl.all_horizontal(pl.all().is_null()))
+        schema = lf.collect_schema()
+
+        expressions = []
+        for column, dtype in frame.dtypes.items():
+            if dtype == object or isinstance(dtype, pd.StringDtype):
+                # Como `.str.strip()` de pandas, los valores que no son texto se convierten en nulos
+                if schema[column] == pl.String:
+                    expressions.append(pl.col(column).str.strip_chars())
+                else:
+                    expressions.append(pl.lit(None, dtype=pl.String).alias(column))
+            elif isinstance(dtype, pd.CategoricalDtype):
+                expressions.append(pl.col(column).cast(pl.String).str.strip_chars().cast(pl.Categorical))
+                # Las categorías cambian al limpiarlas
+                frame.dtypes[column] = pd.CategoricalDtype()
+            elif is_number_dtype(dtype):
+                integer = pd.api.types.is_integer_dtype(dtype)
+                if means is not None and column in means:
+                    if pd.isna(means[column]):
+                        continue
+                    mean = pl.lit(round(means[column]) if integer else means[column])
+                else:
+                    mean = pl.col(column).mean()
+                    if integer:
+                        mean = mean.round(0, mode='half_to_even')
+                expressions.append(pl.col(column).fill_null(mean.cast(schema[column])))
+
+        frame.lf = lf.with_columns(expressions)
+        return frame
+
+    def filter_data(self, frame: PolarsFrame, file_type: str):
+        """
+        Convierte los tipos de las columnas igual que `filter_data`: fechas (con `parse_datetime_series`), las
+        conversiones de `conversion_dict` y las columnas de texto sin tipo a `category` o `string`.
+        """
+        if file_type not in dtypes_dict:
+            log_error(f"Error: El tipo de archivo {file_type} no está en el diccionario dtypes_dict.")
+            return frame
+
+        df = frame.lf.collect()
+        date_columns = dtypes_dict[file_type]
+        for column in date_columns:
+            if column in df.columns:
+                df = df.with_columns(parse_datetime_series(df[column]))
+                frame.dtypes[column] = np.dtype('datetime64[ns]')
+                if df[column].null_count():
+                    log_error(f"Error: La columna {column} no se pudo convertir a datetime.")
+
+        if file_type not in conversion_dict:
+            log_error(f"Error: El tipo de archivo {file_type} no está en el diccionario conversion_dict.")
+            frame.lf = df.lazy()
+            return frame
+
+        conversion_types = conversion_dict[file_type]
+        for column, target_dtype in conversion_types.items():
+            if column in df.columns:
+                polars_dtype = pl.String if target_dtype.startswith('string') else pl.Int64
+                try:
+                    # Como `astype` de pandas, un entero sin nulos no admite valores nulos
+                    if polars_dtype == pl.Int64 and df[column].null_count():
+                        raise ValueError(f"la columna {column} tiene valores nulos")
+                    df = df.with_columns(pl.col(column).cast(polars_dtype))
+                    frame.dtypes[column] = pd.api.types.pandas_dtype(target_dtype)
+                except (pl.exceptions.PolarsError, ValueError) as e:
+                    log_error(f"Error: No se pudo convertir la columna {column} a {target_dtype}. Error: {e}")
+
+        # Las columnas de texto sin tipo se guardan como categoría si tienen pocos valores distintos
+        text_columns = [column for column in df.columns if column not in date_columns
+                        and column not in conversion_types and frame.dtypes.get(column) == object]
+        if text_columns:
+            distinct = df.select(pl.col(text_columns).drop_nulls().n_unique()).row(0, named=True)
+            max_distinct = SCHEMA_CATEGORY_MAX_RATIO * max(df.height, 1)
+            for column in text_columns:
+                if distinct[column] <= max_distinct:
+                    df = df.with_columns(pl.col(column).cast(pl.Categorical))
+                    frame.dtypes[column] = pd.CategoricalDtype()
+                else:
+                    frame.dtypes[column] = pd.StringDtype()
+
+        log_error(f"Datos filtrados correctamente para el tipo de archivo {file_type} (polars)")
+        frame.lf = df.lazy()
+        return frame
+
+    def transform_all_sources(self, frame: PolarsFrame, file_type: str):
+        """
+        Aplica las transformaciones específicas de cada tipo de archivo que planifica `plan_stages`, con la
+        implementación en polars de cada etapa de `transform_stages`.
+        """
+        stages = {
+            'convert_currency': lambda frame: self.convert_currency(frame, 'ForeignAmount', 'ForeignCurrencyCode',
+                                                                    load_currency_rates(), 'ChargeDateTime'),
+            'calculate_age': lambda frame: self.calculate_age(frame, 'DOB'),
+            'calculate_time_to_modify': lambda frame: self.calculate_time_to_modify(frame, 'CreatedDate',
+                                                                                    'ModifiedDate'),
+            'assign_passenger_journey_charge': lambda frame: self.assign_passenger_journey_charge(frame,
+                                                                                                  'ChargeAmount'),
+            'categorize_channel_type': lambda frame: self.categorize_channel_type(frame, 'ChannelType'),
+        }
+
+        for name in plan_stages(file_type, tuple(frame.lf.collect_schema().names())):
+            if name not in stages:
+                raise NotImplementedError(f"La etapa {name} no está implementada en el motor polars")
+            frame = stages[name](frame)
+        return frame
+
+    def assign_passenger_journey_charge(self, frame: PolarsFrame, charge_column: str):
+        """Asigna 'PassengerJourneyCharge' igual que `assign_passenger_journey_charge`."""
+        charged = (pl.col(charge_column) > 0).fill_null(False)
+        frame.lf = frame.lf.with_columns(
+            pl.when(charged).then(pl.lit('Charged')).otherwise(pl.lit('Not Charged'))
+            .cast(pl.Enum(list(CHARGE_STATUS_DTYPE.categories))).alias('PassengerJourneyCharge'))
+        frame.dtypes['PassengerJourneyCharge'] = CHARGE_STATUS_DTYPE
+        return frame
+
+    def categorize_channel_type(self, frame: PolarsFrame, column: str):
+        """Categoriza los códigos de canal igual que `categorize_channel_type`."""
+        codes = pl.col(column).cast(pl.String).cast(pl.Float64, strict=False)
+        labels = {float(code): label for code, label in channel_type_map.items()}
+        frame.lf = frame.lf.with_columns(
+            codes.replace_strict(labels, default=None, return_dtype=pl.Enum(list(CHANNEL_TYPE_DTYPE.categories)))
+            .alias(column))
+        frame.dtypes[column] = CHANNEL_TYPE_DTYPE
+        return frame
+
+    def convert_currency(self, frame: PolarsFrame, amount_column: str, currency_column: str,
+                         currency_rates: pd.DataFrame = None, date_column: str = None):
+        """
+        Convierte los importes a EUR igual que `convert_currency`, con la tasa vigente en la fecha de cada fila
+        (`join_asof` por moneda) o la de `currency_exchange_rate` si no hay histórico, y redondeando con
+        `round_amounts`.
+        """
+        df = frame.lf.collect().with_row_index('__row')
+        currencies = pl.col(currency_column).cast(pl.String)
+        df = df.with_columns(currencies.replace_strict(currency_exchange_rate, default=None, return_dtype=pl.Float64)
+                             .alias('__rate'))
+
+        if use_dated_rates(currency_rates, date_column, df.columns):
+            rates = pl.from_pandas(currency_rates).with_columns(pl.col('EffectiveDate').cast(pl.Datetime('ns')))
+            left = (df.select('__row', currencies.alias('__currency'),
+                              pl.col(date_column).cast(pl.Datetime('ns')).alias('__date'))
+                    .drop_nulls(['__currency', '__date']).sort('__date'))
+            asof = left.join_asof(rates.sort('EffectiveDate'), left_on='__date', right_on='EffectiveDate',
+                                  by_left='__currency', by_right='CurrencyCode', strategy='backward')
+            df = (df.join(asof.select('__row', pl.col('Rate').alias('__asof_rate')), on='__row', how='left')
+                  .sort('__row')
+                  .with_columns(pl.col('__asof_rate').fill_null(pl.col('__rate')).alias('__rate')))
+
+        # Los importes en EUR no se convierten
+        rate = pl.when(currencies == 'EUR').then(None).otherwise(pl.col('__rate'))
+        df = df.with_columns(rate.alias('__rate'))
+        converted = round_amounts((df[amount_column] * df['__rate']).to_pandas())
+        df = df.with_columns(pl.Series('__converted', converted.to_numpy(), nan_to_null=True))
+
+        frame.lf = df.lazy().with_columns(
+            pl.when(pl.col('__rate').is_null()).then(pl.col(amount_column)).otherwise(pl.col('__converted'))
+            .alias(amount_column),
+            pl.lit('EUR').cast(pl.Categorical).alias(currency_column),
+        ).drop('__row', '__rate', '__asof_rate', '__converted', strict=False)
+        frame.dtypes[currency_column] = pd.CategoricalDtype()
+        return frame
+
+    def calculate_age(self, frame: PolarsFrame, dob_column: str):
+        """
+        Calcula 'age' e 'IsAdult' igual que `calculate_age`, a partir de los cuatro primeros caracteres de la
+        fecha de nacimiento.
+        """
+        if dob_column not in frame.lf.collect_schema().names():
+            log_error(f"Error: La columna {dob_column} no está en el DataFrame.")
+            return frame
+
+        # Solo los valores de texto tienen año; el resto (números, booleanos...) se tratan como mal formados
+        if frame.lf.collect_schema()[dob_column] == pl.String:
+            prefix = pl.col(dob_column).str.slice(0, 4).str.strip_chars()
+        else:
+            prefix = pl.lit(None, dtype=pl.String)
+        birth_year = pl.when(prefix.str.contains(r'^[+-]?\d+$')).then(prefix).cast(pl.Float64, strict=False)
+
+        df = frame.lf.with_columns(birth_year.alias('__birth_year')).collect()
+        invalid_rows = df['__birth_year'].null_count()
+        if invalid_rows:
+            log_error(f"{invalid_rows} filas con {dob_column} nulo o mal formado: se asigna age nulo e IsAdult False.")
+
+        age = datetime.now().year - pl.when(pl.col('__birth_year') != DOB_SENTINEL_YEAR).then(pl.col('__birth_year'))
+        frame.lf = df.lazy().with_columns(age.alias('age')).with_columns(
+            (pl.col('age') >= 18).fill_null(False).alias('IsAdult')).drop('__birth_year')
+        frame.dtypes['age'] = np.dtype('float64')
+        frame.dtypes['IsAdult'] = np.dtype('bool')
+        return frame
+
+    def calculate_time_to_modify(self, frame: PolarsFrame, created_column: str, modified_column: str):
+        """Calcula 'TimeToModify' igual que `calculate_time_to_modify`, parseando las columnas que no son fechas."""
+        schema = frame.lf.collect_schema()
+        pending = [column for column in (created_column, modified_column)
+                   if not isinstance(schema[column], pl.Datetime)]
+        if pending:
+            df = frame.lf.collect()
+            frame.lf = df.with_columns([parse_datetime_series(df[column]) for column in pending]).lazy()
+            for column in pending:
+                frame.dtypes[column] = np.dtype('datetime64[ns]')
+
+        frame.lf = frame.lf.with_columns((pl.col(modified_column).cast(pl.Datetime('ns'))
+                                          - pl.col(created_column).cast(pl.Datetime('ns'))).alias('TimeToModify'))
+        frame.dtypes['TimeToModify'] = np.dtype('timedelta64[ns]')
+        return frame
+
+    def generate_business_key(self, frame: PolarsFrame, file_type: str):
+        """
+        Genera `business_key` (y `business_key_id` si `BUSINESS_KEY_ID` está activo) igual que
+        `generate_business_key`: los valores de las columnas clave como texto, unidos por '_' y con 'NULL' para
+        los nulos.
+        """
+        if file_type not in key_attributes:
+            log_error(f"Error: El tipo de archivo {file_type} no está en el diccionario key_attributes.")
+            return frame
+
+        df = frame.lf.collect()
+        attributes = key_attributes[file_type]
+        missing_columns = [col for col in attributes if col not in df.columns]
+        if missing_columns:
+            log_error(f"Error: Las siguientes columnas faltan en el DataFrame: {', '.join(missing_columns)}")
+            frame.lf = df.lazy()
+            return frame
+
+        # Tipo común de las columnas clave en pandas: si es decimal, los enteros se escriben como decimales
+        common_dtype = pd.concat([pd.Series(dtype=frame.dtypes[col]) for col in attributes], ignore_index=True).dtype
+        key_parts = []
+        for col in attributes:
+            column = df[col].cast(pl.Float64) if pd.api.types.is_float_dtype(common_dtype) else df[col]
+            key_parts.append(column_text(column))
+
+        business_key = pl.select(pl.concat_str(key_parts, separator='_')).to_series().alias('business_key')
+        df = df.with_columns(business_key)
+        frame.dtypes['business_key'] = np.dtype(object)
+
+        if BUSINESS_KEY_ID:
+            fingerprint = business_key_fingerprint(pd.Series(business_key.to_numpy()))
+            df = df.with_columns(pl.Series('business_key_id', fingerprint.to_numpy()))
+            frame.dtypes['business_key_id'] = np.dtype('int64')
+
+        frame.lf = df.lazy()
+        return frame
+
+    def generate_hash(self, frame: PolarsFrame, file_type: str):
+        """
+        Genera la columna `hash` igual que `generate_hash`: las columnas de `HASH_COLUMNS` se serializan en polars
+        con el formato canónico y cada fila se hashea con el algoritmo de `HASH_ALGORITHM`.
+        """
+        df = frame.lf.collect()
+        columns = get_hash_columns(df, file_type)
+        if columns is None:
+            frame.lf = df.lazy()
+            return frame
+
+        algorithm = get_hash_algorithm()
+        hashes = []
+        for start in range(0, df.height, HASH_BATCH_SIZE):
+            batch = df.slice(start, HASH_BATCH_SIZE)
+            if columns:
+                rows = pl.select(pl.concat_str([column_text(batch[col], canonical=True) for col in columns],
+                                                separator=FIELD_SEPARATOR)).to_series()
+            else:
+                rows = pl.Series([''] * batch.height, dtype=pl.String)
+            hashes.append(hash_strings(rows.to_numpy().astype(object), algorithm))
+
+        values = np.concatenate(hashes) if hashes else np.empty(0, dtype=object)
+        frame.lf = df.with_columns(pl.Series('hash', values, dtype=pl.String)).lazy()
+        frame.dtypes['hash'] = np.dtype(object)
+        return frame
@@ -3,8 +3,9 @@ import os.path
 import threading
 from datetime import datetime
 from dotenv import load_dotenv
-from etl.source_extractor.extract_from_api import extract_from_api
-from etl.source_extractor.extract_from_csv import extract_from_csv
+from etl.source_extractor.extract_from_api import ENDPOINTS_CONFIG, extract_from_api, extract_from_api_to_file
+from etl.source_extractor.watermark import load_watermark, save_watermark, max_watermark
+from etl.source_extractor.extract_from_csv import extract_from_csv_to_file
 from etl.source_extractor.extract_from_excel import extract_from_excel
 from utils.utils import set_audit_columns
 
@@ -13,22 +14,40 @@ from utils.utils import log_error
 load_dotenv()
 DESTINATION_PATH = os.getenv("DESTINATION_PATH")
 API_URL = f'http://{os.getenv("API_URL")}:{os.getenv("API_PORT")}'
+# Si es 'true', las fuentes del API se escriben en bronze página a página
+API_STREAMING = os.getenv("API_STREAMING", "false").lower() == "true"
+# Si es 'true', las fuentes del API solo extraen los registros posteriores a la última marca de agua
+API_INCREMENTAL = os.getenv("API_INCREMENTAL", "false").lower() == "true"
+
+# Función común para extraer los datos de un endpoint del API y guardarlos en bronze
+def extract_api_source(endpoint, source, extract_date):
+    since = load_watermark(endpoint) if API_INCREMENTAL else None
+    if since is not None:
+        log_error(f"Extracción incremental de {endpoint} desde {since}")
+
+    if API_STREAMING:
+        result = extract_from_api_to_file(endpoint, source, extract_date, "extracted", DESTINATION_PATH, since=since)
+        if result is not None and API_INCREMENTAL:
+            save_watermark(endpoint, result[1])
+        return
+
+    df = extract_from_api(endpoint, since=since)
+    if df is not None and set_audit_columns(df, source, extract_date, "extracted", DESTINATION_PATH) is not None:
+        if API_INCREMENTAL:
+            watermark_column = ENDPOINTS_CONFIG[endpoint]["watermark_column"]
+            save_watermark(endpoint, max_watermark(df[watermark_column], since))
+
 
 #Función para extraer datos de Booking
 def extract_booking(extract_date):
     log_error("Extrayendo data de Booking...")
-    df_booking = extract_from_api("booking/new")
-    if df_booking is not None:
-        set_audit_columns(df_booking, "Booking", extract_date, "extracted", DESTINATION_PATH)
-
+    extract_api_source("booking/new", "Booking", extract_date)
 
 
 #Función para extraer datos de BookingPassenger
 def extract_booking_passenger(extract_date):
     log_error("Extrayendo data de BookingPassenger...")
-    df_passenger = extract_from_api("booking/passenger/new")
-    if df_passenger is not None:
-        set_audit_columns(df_passenger, "BookingPassenger", extract_date, "extracted", DESTINATION_PATH)
+    extract_api_source("booking/passenger/new", "BookingPassenger", extract_date)
 
 # Función para extraer datos de PassengerJourneySegment
 def extract_passenger_journey_segment(extract_date):
@@ -41,17 +60,15 @@ def extract_passenger_journey_segment(extract_date):
 # Función para extraer datos de PassengerJourneyLeg
 def extract_passenger_journey_leg(extract_date):
     log_error("Extrayendo data de PassengerJourneyLeg...")
-    df_leg = extract_from_csv(os.getenv("PATH_CSV_LEG"))
-    if df_leg is not None:
-        set_audit_columns(df_leg, "PassengerJourneyLeg", extract_date, "extracted", DESTINATION_PATH)
+    extract_from_csv_to_file(os.getenv("PATH_CSV_LEG"), "PassengerJourneyLeg", extract_date, "extracted",
+                             DESTINATION_PATH)
 
 
 # Función para extraer datos de PassengerJourneyCharge
 def extract_passenger_journey_charge(extract_date):
     log_error("Extrayendo data de PassengerJourneyCharge...")
-    df_charge = extract_from_csv(os.getenv("PATH_CSV_CHARGE"))
-    if df_charge is not None:
-        set_audit_columns(df_charge, "PassengerJourneyCharge", extract_date, "extracted", DESTINATION_PATH)
+    extract_from_csv_to_file(os.getenv("PATH_CSV_CHARGE"), "PassengerJourneyCharge", extract_date, "extracted",
+                             DESTINATION_PATH)
 
 
 def extract():
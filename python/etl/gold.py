@@ -0,0 +1,374 @@
+import os.path
+import shutil
+from datetime import datetime
+import pandas as pd
+from dotenv import load_dotenv
+
+from etl.gold_methods.hash_join import HashIndex, HashJoin, GOLD_CHUNKSIZE
+from etl.gold_methods.kpi_aggregates import kpi_sources, kpi_results, source_contributions, KpiState
+from query.PostgreSQL.CREATE.schema_registry import apply_schema, get_primary_keys
+from utils.utils import (log_error, read_layer, iter_layer, write_layer, resolve_layer_path, add_audit_columns,
+                         build_output_path, get_storage_format, LayerWriter, LAYER_EXTENSIONS)
+
+load_dotenv()
+
+# Directorio de la capa gold (si no se configura, la etapa no se ejecuta)
+GOLD_PATH = os.getenv("GOLD_PATH")
+# Columna por la que se particiona la tabla de hechos (un directorio `{columna}={valor}` por valor); vacío: sin particionar
+GOLD_PARTITION_BY = os.getenv("GOLD_PARTITION_BY") or None
+
+FACT_NAME = "PassengerJourneyFact"
+# Columnas de la capa silver que no pasan a la tabla de hechos
+SILVER_ONLY_COLUMNS = ['extract_dt', 'source', 'proc_status', 'business_key', 'hash']
+
+# Archivos de la capa silver de los que se construye la tabla de hechos, con la tabla cuyos tipos se les aplican
+gold_sources = {
+    "Booking": os.getenv('SILVER_BOOKING_NEW'),
+    "BookingPassenger": os.getenv('SILVER_PASSENGER_NEW'),
+    "PassengerJourneySegment": os.getenv('SILVER_SEGMENT'),
+    "PassengerJourneyLeg": os.getenv('SILVER_LEG'),
+    "PassengerJourneyCharge": os.getenv('SILVER_CHARGE'),
+}
+
+# Tabla de hechos con una fila por segmento de pasajero (`PassengerJourneySegment`), a la que se unen, en orden,
+# las demás fuentes por su clave (`on`). De cada fuente se indican las columnas que se añaden y su nombre en la
+# tabla de hechos (`columns`) o, para las fuentes con varias filas por segmento, sus agregados por clave
+# (`aggregate`, con el formato de `DataFrame.agg`; los segmentos sin filas tienen 0).
+fact_joins = [
+    {
+        'source': 'BookingPassenger',
+        'on': ['PassengerID'],
+        'columns': {'BookingID': 'BookingID', 'PaxType': 'PaxType', 'Gender': 'Gender',
+                    'Nationality': 'Nationality', 'ResidentCountry': 'ResidentCountry', 'Infant': 'Infant',
+                    'age': 'age', 'IsAdult': 'IsAdult', 'TotalCost': 'TotalCost', 'BalanceDue': 'BalanceDue'},
+    },
+    {
+        'source': 'Booking',
+        'on': ['BookingID'],
+        'columns': {'RecordLocator': 'RecordLocator', 'Status': 'BookingStatusCode', 'PriceStatus': 'PriceStatus',
+                    'PaidStatus': 'PaidStatus', 'CurrencyCode': 'BookingCurrencyCode',
+                    'ChannelType': 'BookingChannelType', 'BookingDate': 'BookingDate',
+                    'BookingType': 'BookingType', 'OwningCarrierCode': 'OwningCarrierCode',
+                    'TimeToModify': 'BookingTimeToModify'},
+    },
+    {
+        'source': 'PassengerJourneyLeg',
+        'on': ['PassengerID', 'SegmentID'],
+        'aggregate': {'LegCount': ('InventoryLegID', 'count')},
+    },
+    {
+        'source': 'PassengerJourneyCharge',
+        'on': ['PassengerID', 'SegmentID'],
+        'aggregate': {'ChargeCount': ('ChargeNumber', 'count'), 'TotalChargeAmount': ('ChargeAmount', 'sum'),
+                      'TotalForeignAmount': ('ForeignAmount', 'sum')},
+    },
+]
+
+# Función con la que se combinan los agregados de cada bloque de una fuente (ver `read_dimension`)
+PARTIAL_AGGREGATES = {'count': 'sum', 'sum': 'sum', 'min': 'min', 'max': 'max'}
+
+
+def silver_path(source: str):
+    """Ruta del archivo de la capa silver de una fuente, o None (con el motivo en el log) si no está disponible."""
+    path = gold_sources.get(source)
+    if not path:
+        log_error(f"No se ha configurado el archivo de la capa silver de {source}.")
+        return None
+
+    path = resolve_layer_path(path)
+    if not os.path.exists(path):
+        log_error(f"No existe el archivo de la capa silver de {source}: {path}")
+        return None
+    return path
+
+
+def read_silver(source: str, columns: list = None):
+    """
+    Lee el archivo de la capa silver de una fuente con los tipos de su tabla, como la carga en la base de datos.
+
+    Args:
+        source (str): El nombre de la fuente (y de su tabla).
+        columns (list, optional): Las columnas a conservar. Por defecto, todas.
+
+    Returns:
+        pd.DataFrame or None: Los datos de la fuente, o None si no se ha configurado su archivo o no existe.
+    """
+    path = silver_path(source)
+    if path is None:
+        return None
+
+    df = apply_schema(read_layer(path, na_values=None), source)
+    if columns is not None:
+        df = df[[column for column in columns if column in df.columns]]
+    return df
+
+
+def aggregate_source(df: pd.DataFrame, on: list, aggregate: dict):
+    """
+    Agrega las filas de una fuente por su clave, de modo que su unión con la tabla de hechos sea de una fila.
+
+    Args:
+        df (pd.DataFrame): Los datos de la fuente.
+        on (list): Las columnas clave.
+        aggregate (dict): Los agregados a calcular (`{nombre: (columna, función)}`).
+
+    Returns:
+        pd.DataFrame: Una fila por clave, con las columnas clave y los agregados.
+    """
+    return df.groupby(on, sort=False, observed=True).agg(**aggregate).reset_index()
+
+
+def iter_silver(path: str, source: str, columns: list = None, chunksize: int = GOLD_CHUNKSIZE):
+    """
+    Lee por bloques el archivo de la capa silver de una fuente (ver `silver_path`) con los tipos de su tabla. Los
+    códigos se leen como texto y no como `category`, para que todos los bloques tengan los mismos tipos.
+
+    Args:
+        path (str): La ruta del archivo.
+        source (str): El nombre de la fuente (y de su tabla).
+        columns (list, optional): Las columnas a conservar. Por defecto, todas.
+        chunksize (int, optional): Filas por bloque. Por defecto, `GOLD_CHUNKSIZE`.
+
+    Yields:
+        pd.DataFrame: Cada bloque de filas del archivo.
+    """
+    kwargs = {'na_values': None}
+    if columns is not None:
+        kwargs['usecols'] = lambda column: column in columns
+    for chunk in iter_layer(path, chunksize, **kwargs):
+        chunk = apply_schema(chunk, source, categories=False)
+        if columns is not None:
+            chunk = chunk[[column for column in columns if column in chunk.columns]]
+        yield chunk
+
+
+def read_fact_keys(path: str, chunksize: int = GOLD_CHUNKSIZE):
+    """
+    Lee por bloques las claves de unión (ver `fact_joins`) de los segmentos de pasajero, sin repetidos.
+
+    Returns:
+        pd.DataFrame or None: Las combinaciones distintas de las claves presentes en el archivo, o None si el
+                              archivo no tiene filas.
+    """
+    key_columns = list(dict.fromkeys(column for join in fact_joins for column in join['on']))
+    parts = [chunk.drop_duplicates()
+             for chunk in iter_silver(path, 'PassengerJourneySegment', key_columns, chunksize)]
+    if not parts:
+        return None
+    return pd.concat(parts, ignore_index=True).drop_duplicates(ignore_index=True)
+
+
+def read_dimension(join: dict, keys: pd.DataFrame, chunksize: int = GOLD_CHUNKSIZE):
+    """
+    Lee por bloques la fuente de una unión de la tabla de hechos (ver `fact_joins`) con solo las columnas que se
+    unen y las filas cuya clave aparece en la tabla de hechos (un semi join con el índice hash de `keys`), de modo
+    que el lado que se mantiene en memoria nunca es mayor que el más pequeño de los dos. Las fuentes con agregados
+    se agregan bloque a bloque y después se combinan (ver `PARTIAL_AGGREGATES`).
+
+    Args:
+        join (dict): La unión (ver `fact_joins`).
+        keys (pd.DataFrame): Las claves de la tabla de hechos.
+        chunksize (int, optional): Filas por bloque. Por defecto, `GOLD_CHUNKSIZE`.
+
+    Returns:
+        pd.DataFrame or None: Las filas de la fuente a unir (una por clave si la unión es de agregados), o None si
+                              no está su archivo.
+    """
+    path = silver_path(join['source'])
+    if path is None:
+        return None
+
+    on, aggregate = join['on'], join.get('aggregate')
+    if aggregate is not None:
+        columns = on + [column for column, _ in aggregate.values()]
+    else:
+        columns = on + list(join['columns'])
+
+    index = HashIndex(keys.drop_duplicates(on), on)
+    parts = []
+    for chunk in iter_silver(path, join['source'], columns, chunksize):
+        chunk = chunk[index.contains(chunk)]
+        parts.append(aggregate_source(chunk, on, aggregate) if aggregate is not None else chunk)
+    if not parts:
+        return None
+
+    df = pd.concat(parts, ignore_index=True)
+    if aggregate is not None and len(parts) > 1:
+        df = aggregate_source(df, on, {name: (name, PARTIAL_AGGREGATES[function])
+                                       for name, (_, function) in aggregate.items()})
+    return df
+
+
+def build_fact(chunksize: int = GOLD_CHUNKSIZE):
+    """
+    Construye la tabla de hechos de los segmentos de pasajero uniendo a cada segmento las demás fuentes de la
+    capa silver (ver `fact_joins`). Cada unión es un hash join (ver `HashJoin`): el índice se construye sobre las
+    filas de la fuente cuya clave aparece en los segmentos (ver `read_dimension`) y el archivo de los segmentos se
+    recorre por bloques de `chunksize` filas, de modo que la tabla de hechos se produce bloque a bloque.
+
+    Args:
+        chunksize (int, optional): Filas por bloque de los archivos. Por defecto, `GOLD_CHUNKSIZE`.
+
+    Returns:
+        generator or None: Los bloques de la tabla de hechos, o None si falta el archivo de los segmentos o no
+                           tiene filas.
+    """
+    path = silver_path('PassengerJourneySegment')
+    if path is None:
+        return None
+
+    # Las claves de la tabla de hechos, a las que se añaden las de cada unión que usan las siguientes (BookingID)
+    keys = read_fact_keys(path, chunksize)
+    if keys is None:
+        log_error(f"El archivo de los segmentos no tiene filas: {path}")
+        return None
+    joins = []
+    for join in fact_joins:
+        if not all(column in keys.columns for column in join['on']):
+            log_error(f"La tabla de hechos no tiene la clave {join['on']} de {join['source']}.")
+            continue
+        df = read_dimension(join, keys, chunksize)
+        if df is None:
+            log_error(f"La tabla de hechos se construye sin las columnas de {join['source']}.")
+            continue
+
+        if 'aggregate' in join:
+            columns = {name: name for name in join['aggregate']}
+        else:
+            columns = {column: name for column, name in join['columns'].items() if column in df.columns}
+            key_columns = {column: name for column, name in columns.items()
+                           if name not in keys.columns and any(name in other['on'] for other in fact_joins)}
+            if key_columns:
+                keys = HashJoin(df, join['on'], key_columns).join(keys)
+        joins.append((join, HashJoin(df, join['on'], columns), df))
+
+    def fact_chunks():
+        for fact in iter_silver(path, 'PassengerJourneySegment', chunksize=chunksize):
+            fact = fact.drop(columns=[column for column in SILVER_ONLY_COLUMNS if column in fact.columns])
+            for join, hash_join, df in joins:
+                fact = hash_join.join(fact)
+                for name in join.get('aggregate', {}):
+                    fact[name] = fact[name].fillna(0).astype(df[name].dtype)
+            yield fact
+
+    return fact_chunks()
+
+
+def partition_value(value):
+    """Nombre del directorio de una partición (`NULL` para los nulos, sin separadores de ruta)."""
+    if pd.isna(value):
+        return 'NULL'
+    if isinstance(value, (pd.Timestamp, datetime)):
+        value = value.strftime('%Y-%m-%d')
+    return str(value).replace('/', '_').replace(os.sep, '_')
+
+
+def write_fact(chunks, path: str, partition_by: str = GOLD_PARTITION_BY):
+    """
+    Escribe la tabla de hechos en la capa gold bloque a bloque: en un único archivo o, si se indica `partition_by`,
+    en un directorio con un subdirectorio `{columna}={valor}` por cada valor de la columna, con un archivo
+    `part-{n}` por cada bloque que tiene filas de esa partición. Se escribe con un nombre temporal y se renombra,
+    de modo que una ejecución interrumpida nunca deja la tabla a medias.
+
+    Args:
+        chunks: Los bloques de la tabla de hechos (ver `build_fact`).
+        path (str): La ruta del archivo de salida (ver `build_output_path`).
+        partition_by (str, optional): La columna por la que se particiona. Por defecto, `GOLD_PARTITION_BY`.
+
+    Returns:
+        tuple: La ruta del archivo o directorio escrito y el número de filas.
+    """
+    rows = 0
+    if partition_by is None:
+        root, extension = os.path.splitext(path)
+        tmp_path = f"{root}.part{extension}"
+        with LayerWriter(tmp_path) as writer:
+            for df in chunks:
+                rows += writer.write(df)
+        os.replace(tmp_path, path)
+        return path, rows
+
+    extension = LAYER_EXTENSIONS[get_storage_format()]
+    directory = os.path.splitext(path)[0]
+    tmp_directory = f"{directory}.part"
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+
+    for part, df in enumerate(chunks):
+        if partition_by not in df.columns:
+            raise KeyError(f"La tabla de hechos no tiene la columna de partición {partition_by}")
+        for value, partition in df.groupby(partition_by, sort=True, dropna=False, observed=True):
+            partition_directory = os.path.join(tmp_directory, f"{partition_by}={partition_value(value)}")
+            os.makedirs(partition_directory, exist_ok=True)
+            write_layer(partition.drop(columns=[partition_by]),
+                        os.path.join(partition_directory, f"part-{part}{extension}"))
+        rows += len(df)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_directory, directory)
+    return directory, rows
+
+
+def update_kpis():
+    """
+    Actualiza los KPIs de `script_opt_kpi.sql` (tasa de cancelación, tiempo medio hasta la modificación, reservas
+    pagadas por canal e histograma de edades) y publica sus tablas en `GOLD_PATH` (ver `kpi_results`).
+
+    Los KPIs se mantienen como agregados parciales (recuentos y sumas) por día (ver `kpi_partials`). Cada archivo
+    de la capa silver es un lote (con `API_INCREMENTAL`, solo las filas que han cambiado): se suman las
+    contribuciones de sus filas y se resta la contribución anterior de las claves que vuelven a aparecer (ver
+    `KpiState.fold`). Las filas que no están en el lote no se restan, y el coste de la actualización depende del
+    tamaño del lote y no del de las tablas.
+    """
+    state = KpiState.load()
+
+    for source, spec in kpi_sources.items():
+        df = read_silver(source, spec['columns'] + get_primary_keys().get(source, []))
+        if df is None:
+            log_error(f"Los KPIs de {source} no se actualizan.")
+            continue
+
+        try:
+            batch = source_contributions(source, df)
+        except KeyError as e:
+            log_error(f"Falta la columna {e} en {source}: sus KPIs no se actualizan.")
+            continue
+
+        added, retracted = state.fold(source, batch)
+        log_error(f"KPIs de {source}: {added} filas sumadas y {retracted} restadas")
+
+    state.save()
+
+    extension = LAYER_EXTENSIONS[get_storage_format()]
+    for name, result in kpi_results.items():
+        path = os.path.join(GOLD_PATH, f"{name}{extension}")
+        tmp_path = os.path.join(GOLD_PATH, f"{name}.part{extension}")
+        write_layer(result(state.partials), tmp_path)
+        os.replace(tmp_path, path)
+
+
+def gold():
+    """
+    Construye la capa gold: la tabla de hechos de los segmentos de pasajero (`PassengerJourneyFact`), con los
+    datos del pasajero, de su reserva, de sus tramos y de sus cargos (ver `build_fact`), y la escribe en
+    `GOLD_PATH` con las columnas de auditoría. Después actualiza los KPIs (ver `update_kpis`).
+    """
+    if not GOLD_PATH:
+        log_error("No se ha configurado GOLD_PATH: no se construye la capa gold.")
+        return
+
+    try:
+        os.makedirs(GOLD_PATH, exist_ok=True)
+        chunks = build_fact()
+        if chunks is None:
+            log_error("No se ha podido construir la tabla de hechos.")
+        else:
+            extract_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            chunks = (add_audit_columns(fact, FACT_NAME, extract_date, 'gold') for fact in chunks)
+            path, rows = write_fact(chunks, build_output_path(FACT_NAME, 'gold', GOLD_PATH))
+            log_error(f"Tabla de hechos {FACT_NAME} guardada en {path} ({rows} filas)")
+
+        update_kpis()
+
+    except Exception as e:
+        log_error(f"Error al construir la capa gold: {e}")
+        raise
@@ -0,0 +1,183 @@
+import os.path
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+# Número de filas del lado grande de un join que se procesan a la vez contra el índice del lado pequeño
+GOLD_CHUNKSIZE = int(os.getenv("GOLD_CHUNKSIZE", 100000))
+
+
+def join_keys(df: pd.DataFrame, on: list):
+    """
+    Normaliza las columnas clave de un join para que ambos lados se comparen con el mismo tipo: los enteros como
+    `Int64` (una columna puede ser `Int32` en una fuente e `int64` en otra) y el resto como texto.
+
+    Args:
+        df (pd.DataFrame): Uno de los lados del join.
+        on (list): Las columnas clave.
+
+    Returns:
+        tuple: Las claves (`pd.Index` o `pd.MultiIndex`) y una máscara con las filas sin ningún nulo en la clave.
+    """
+    arrays = []
+    for column in on:
+        values = df[column]
+        if pd.api.types.is_integer_dtype(values) or pd.api.types.is_float_dtype(values):
+            values = values.astype('Float64').astype('Int64') if pd.api.types.is_float_dtype(values) \
+                else values.astype('Int64')
+        else:
+            values = values.astype(object)
+        arrays.append(values.to_numpy())
+
+    valid = ~df[on].isna().any(axis=1).to_numpy()
+    keys = pd.Index(arrays[0]) if len(arrays) == 1 else pd.MultiIndex.from_arrays(arrays)
+    return keys, valid
+
+
+class HashIndex:
+    """
+    Índice hash de las claves de un lado de un join: una tabla hash con los valores distintos de la clave
+    (`pd.Index`) y, para cada uno, sus filas contiguas en un array ordenado por clave. Las filas con nulos en la
+    clave no se indexan, como en SQL.
+    """
+
+    def __init__(self, df: pd.DataFrame, on: list):
+        keys, valid = join_keys(df, on)
+        rows = np.flatnonzero(valid)
+        if len(rows):
+            codes, uniques = pd.factorize(keys[rows], sort=False)
+        else:
+            codes, uniques = np.array([], dtype=np.intp), keys[:0]
+
+        self.keys = uniques if isinstance(uniques, pd.Index) else pd.Index(uniques)
+        self.on = on
+        order = np.argsort(codes, kind='stable')
+        self.rows = rows[order]
+        # Con un elemento más al final (0) para las claves sin coincidencias (código -1)
+        self.counts = np.append(np.bincount(codes, minlength=len(self.keys)), 0)
+        self.starts = np.cumsum(self.counts) - self.counts
+
+    def lookup(self, df: pd.DataFrame, keep_unmatched: bool = False):
+        """
+        Busca en el índice las claves de un bloque del otro lado del join.
+
+        Args:
+            df (pd.DataFrame): El bloque a buscar.
+            keep_unmatched (bool, optional): Si es True, las filas sin coincidencias se devuelven una vez con
+                                             posición -1 en el índice (join externo).
+
+        Returns:
+            tuple: Las posiciones de cada par de filas coincidentes: en `df` y en el lado indexado.
+        """
+        keys, valid = join_keys(df, self.on)
+        codes = np.where(valid, self.keys.get_indexer(keys), -1)
+        matched = codes >= 0
+
+        counts = np.where(matched, self.counts[codes], 1 if keep_unmatched else 0)
+        probe_rows = np.repeat(np.arange(len(df)), counts)
+
+        # Para cada fila, sus coincidencias son `counts` filas consecutivas a partir de `starts` en `rows`
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        positions = np.repeat(self.starts[codes], counts) + offsets
+        found = np.repeat(matched, counts)
+        build_rows = np.full(len(positions), -1)
+        build_rows[found] = self.rows[positions[found]]
+        return probe_rows, build_rows
+
+    def contains(self, df: pd.DataFrame):
+        """Indica las filas de `df` cuya clave está en el índice (un semi join)."""
+        keys, valid = join_keys(df, self.on)
+        return valid & (self.keys.get_indexer(keys) >= 0)
+
+
+def hash_join_indexer(left: pd.DataFrame, right: pd.DataFrame, on: list, how: str = 'left',
+                      chunksize: int = GOLD_CHUNKSIZE):
+    """
+    Calcula las parejas de filas de un join por igualdad de claves con un índice hash sobre el lado más pequeño,
+    recorriendo el lado más grande por bloques de `chunksize` filas.
+
+    Args:
+        left (pd.DataFrame): El lado izquierdo del join.
+        right (pd.DataFrame): El lado derecho del join.
+        on (list): Las columnas clave, presentes en ambos lados.
+        how (str, optional): 'left' (todas las filas de `left`) o 'inner'. Por defecto, 'left'.
+        chunksize (int, optional): Filas por bloque del lado grande. Por defecto, `GOLD_CHUNKSIZE`.
+
+    Returns:
+        tuple: Las posiciones de cada pareja en `left` y en `right` (-1 en `right` para las filas de `left` sin
+               coincidencias), en el orden de las filas de `left`.
+    """
+    if how not in ('left', 'inner'):
+        raise ValueError(f"Tipo de join {how} no soportado")
+
+    chunksize = max(1, chunksize)
+    left_parts, right_parts = [], []
+
+    if len(right) <= len(left):
+        # Índice sobre la derecha: cada bloque de la izquierda produce sus parejas ya en orden
+        index = HashIndex(right, on)
+        for start in range(0, len(left), chunksize):
+            probe_rows, build_rows = index.lookup(left.iloc[start:start + chunksize], keep_unmatched=how == 'left')
+            left_parts.append(probe_rows + start)
+            right_parts.append(build_rows)
+    else:
+        # Índice sobre la izquierda: las parejas se ordenan al final por fila de la izquierda
+        index = HashIndex(left, on)
+        matched = np.zeros(len(left), dtype=bool)
+        for start in range(0, len(right), chunksize):
+            probe_rows, build_rows = index.lookup(right.iloc[start:start + chunksize])
+            left_parts.append(build_rows)
+            right_parts.append(probe_rows + start)
+            matched[build_rows] = True
+
+        if how == 'left':
+            unmatched = np.flatnonzero(~matched)
+            left_parts.append(unmatched)
+            right_parts.append(np.full(len(unmatched), -1))
+
+    left_rows = np.concatenate(left_parts) if left_parts else np.array([], dtype=int)
+    right_rows = np.concatenate(right_parts) if right_parts else np.array([], dtype=int)
+    order = np.argsort(left_rows, kind='stable')
+    return left_rows[order], right_rows[order]
+
+
+class HashJoin:
+    """
+    Unión por igualdad de claves de un lado grande, que se recorre por bloques, con un lado pequeño en memoria
+    (`right`), sobre el que el índice hash (ver `HashIndex`) se construye una sola vez. Cada bloque del lado grande
+    se une al leerse (ver `join`), de modo que nunca está entero en memoria.
+
+    Args:
+        right (pd.DataFrame): El lado pequeño del join.
+        on (list): Las columnas clave, presentes en ambos lados.
+        columns (dict): Las columnas de `right` a añadir y su nombre en el resultado.
+        how (str, optional): 'left' (todas las filas del lado grande) o 'inner'. Por defecto, 'left'.
+    """
+
+    def __init__(self, right: pd.DataFrame, on: list, columns: dict, how: str = 'left'):
+        if how not in ('left', 'inner'):
+            raise ValueError(f"Tipo de join {how} no soportado")
+        self.index = HashIndex(right, on)
+        self.right = right[list(columns)].reset_index(drop=True)
+        self.columns = columns
+        self.how = how
+
+    def join(self, df: pd.DataFrame):
+        """
+        Une a un bloque del lado grande las columnas de `right` cuya clave coincide, sin copiar más columnas de
+        `right` que las pedidas.
+
+        Args:
+            df (pd.DataFrame): El bloque del lado grande.
+
+        Returns:
+            pd.DataFrame: Las filas del bloque (repetidas si tienen varias coincidencias), en su orden, con las
+                          columnas de `right`, nulas en las filas sin coincidencias.
+        """
+        left_rows, right_rows = self.index.lookup(df, keep_unmatched=self.how == 'left')
+        result = df.take(left_rows).reset_index(drop=True)
+        joined = self.right.reindex(right_rows).reset_index(drop=True)
+        for column, name in self.columns.items():
+            result[name] = joined[column]
+        return result
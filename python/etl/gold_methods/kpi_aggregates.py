@@ -0,0 +1,324 @@
+import os.path
+import shutil
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from etl.transform_methods.generate_business_key import join_key_columns, business_key_fingerprint
+from query.PostgreSQL.CREATE.schema_registry import get_primary_keys
+from utils.utils import log_error, read_layer, write_layer, get_storage_format, LAYER_EXTENSIONS
+
+load_dotenv()
+
+GOLD_PATH = os.getenv("GOLD_PATH")
+# Directorio con los agregados parciales de los KPIs y la última contribución de cada clave de la capa silver
+GOLD_KPI_STATE_PATH = os.getenv("GOLD_KPI_STATE_PATH") or os.path.join(GOLD_PATH or '.', "_kpi_state")
+# Número de archivos entre los que se reparten las contribuciones de cada fuente (por la huella de su clave)
+GOLD_KPI_STATE_BUCKETS = int(os.getenv("GOLD_KPI_STATE_BUCKETS", "64"))
+
+
+def to_datetime(values: pd.Series):
+    return pd.to_datetime(values, format='ISO8601', errors='coerce')
+
+
+def to_day(dates: pd.Series):
+    """Día (`YYYY-MM-DD`) de cada fecha: la partición de los agregados parciales."""
+    return dates.dt.strftime('%Y-%m-%d').astype('string')
+
+
+def booking_contributions(df: pd.DataFrame):
+    """
+    Contribución de cada reserva a los KPIs de `script_opt_kpi.sql`: la tasa de cancelación (`Status = 4`), el
+    tiempo medio hasta la modificación (en microsegundos, para que las sumas sean exactas al restar) y las reservas
+    pagadas (`PaidStatus = 1`) por tipo de canal.
+    """
+    elapsed = to_datetime(df['ModifiedDate']) - to_datetime(df['CreatedDate'])
+    return pd.DataFrame({
+        'day': to_day(to_datetime(df['CreatedDate'])),
+        'ChannelType': df['ChannelType'],
+        'bookings': 1,
+        'cancelled': (df['Status'] == 4).fillna(False).astype('int64'),
+        'modified': elapsed.notna().astype('int64'),
+        'modify_us': (elapsed // pd.Timedelta(microseconds=1)).fillna(0).astype('int64'),
+        'paid': (df['PaidStatus'] == 1).fillna(False).astype('int64'),
+    }, index=df.index)
+
+
+def passenger_contributions(df: pd.DataFrame):
+    """Contribución de cada pasajero al histograma de edades de `script_opt_kpi.sql`."""
+    return pd.DataFrame({
+        'day': to_day(to_datetime(df['CreatedDate'])),
+        'age': df['age'],
+        'passengers': 1,
+    }, index=df.index)
+
+
+# Fuentes de la capa silver de los KPIs: las columnas que se leen, la contribución de cada fila y los tipos de las
+# columnas por las que se agrupa (los mismos al calcularlas y al leerlas del estado)
+kpi_sources = {
+    'Booking': {
+        'columns': ['Status', 'PaidStatus', 'ChannelType', 'CreatedDate', 'ModifiedDate'],
+        'contributions': booking_contributions,
+        'keys': {'day': 'string', 'ChannelType': 'Int64'},
+    },
+    'BookingPassenger': {
+        'columns': ['age', 'CreatedDate'],
+        'contributions': passenger_contributions,
+        'keys': {'day': 'string', 'age': 'Int64'},
+    },
+}
+
+# Agregados parciales de los KPIs por día: sumas de las contribuciones de las filas de una fuente por las columnas
+# `by`. La primera medida es el número de filas: los grupos que se quedan sin filas se eliminan.
+kpi_partials = {
+    'booking_daily': {
+        'source': 'Booking',
+        'by': ['day'],
+        'measures': ['bookings', 'cancelled', 'modified', 'modify_us'],
+    },
+    'paid_by_channel': {
+        'source': 'Booking',
+        'by': ['day', 'ChannelType'],
+        'measures': ['bookings', 'paid'],
+    },
+    'age_histogram': {
+        'source': 'BookingPassenger',
+        'by': ['day', 'age'],
+        'measures': ['passengers'],
+    },
+}
+
+
+def ratio(numerator, denominator):
+    return np.where(denominator > 0, numerator / np.maximum(denominator, 1), np.nan)
+
+
+def booking_daily_kpis(partials: dict):
+    df = partials['booking_daily'].copy()
+    df['tasa_cancelacion'] = ratio(df['cancelled'], df['bookings'])
+    df['tiempo_promedio_horas'] = ratio(df['modify_us'], df['modified']) / 3.6e9
+    return df
+
+
+def summary_kpis(partials: dict):
+    totals = partials['booking_daily'][kpi_partials['booking_daily']['measures']].sum()
+    return pd.DataFrame({
+        'tasa_cancelacion': [ratio(totals['cancelled'], totals['bookings']).item()],
+        'tiempo_promedio_horas': [ratio(totals['modify_us'], totals['modified']).item() / 3.6e9],
+    })
+
+
+def paid_by_channel_kpis(partials: dict):
+    df = partials['paid_by_channel'].groupby('ChannelType', dropna=False, sort=True)['paid'].sum()
+    return df.rename('ingresos').reset_index()
+
+
+def age_histogram_kpis(partials: dict):
+    df = partials['age_histogram'].groupby('age', dropna=False, sort=True)['passengers'].sum()
+    return df.rename('cantidad_pasajeros').reset_index()
+
+
+# Tablas publicadas en la capa gold, calculadas a partir de los agregados parciales
+kpi_results = {
+    'kpi_booking_daily': booking_daily_kpis,
+    'kpi_summary': summary_kpis,
+    'kpi_paid_by_channel': paid_by_channel_kpis,
+    'kpi_age_histogram': age_histogram_kpis,
+}
+
+
+def source_contributions(source: str, df: pd.DataFrame):
+    """
+    Calcula la contribución de cada fila de una fuente de la capa silver, identificada por la clave primaria de su
+    tabla (`key`, ver `join_key_columns`). Si una clave aparece varias veces, cuenta solo su última fila.
+
+    Args:
+        source (str): El nombre de la fuente (ver `kpi_sources`).
+        df (pd.DataFrame): Los datos de la fuente.
+
+    Returns:
+        pd.DataFrame: La columna `key`, el archivo del estado de la clave (`bucket`), las columnas por las que se
+                      agrupa y las medidas de cada fila.
+
+    Raises:
+        KeyError: Si faltan columnas de la fuente o de su clave primaria.
+    """
+    spec = kpi_sources[source]
+    contributions = spec['contributions'](df)
+    for column, dtype in spec['keys'].items():
+        contributions[column] = contributions[column].astype(dtype)
+
+    key = join_key_columns(df, get_primary_keys()[source])
+    contributions.insert(0, 'key', key.astype('string'))
+    contributions.insert(1, 'bucket', np.mod(business_key_fingerprint(key).to_numpy(), GOLD_KPI_STATE_BUCKETS))
+    return contributions[~key.duplicated(keep='last').to_numpy()].reset_index(drop=True)
+
+
+def fold_partial(partial: pd.DataFrame, added: pd.DataFrame, retracted: pd.DataFrame, by: list, measures: list):
+    """
+    Actualiza un agregado parcial con las contribuciones sumadas y restadas, sin recorrer el resto de filas.
+
+    Args:
+        partial (pd.DataFrame): El agregado parcial (columnas `by` y `measures`).
+        added (pd.DataFrame): Las contribuciones a sumar.
+        retracted (pd.DataFrame): Las contribuciones a restar.
+        by (list): Las columnas por las que se agrupa.
+        measures (list): Las medidas (la primera, el número de filas).
+
+    Returns:
+        pd.DataFrame: El agregado parcial actualizado, sin los grupos que se han quedado sin filas.
+    """
+    negated = retracted[by + measures].copy()
+    negated[measures] = -negated[measures]
+    delta = pd.concat([added[by + measures], negated], ignore_index=True)
+    if delta.empty:
+        return partial
+
+    delta = delta.groupby(by, dropna=False, sort=False)[measures].sum().reset_index()
+    folded = pd.concat([partial, delta], ignore_index=True)
+    folded = folded.groupby(by, dropna=False, sort=True)[measures].sum().reset_index()
+    return folded[folded[measures[0]] != 0].reset_index(drop=True)
+
+
+def state_file(name: str, directory: str = GOLD_KPI_STATE_PATH):
+    return os.path.join(directory, f"{name}{LAYER_EXTENSIONS[get_storage_format()]}")
+
+
+def contributions_directory(source: str):
+    """Directorio de las contribuciones de una fuente, con el número de archivos (si cambia, no se reutiliza)."""
+    return f"{source}_{GOLD_KPI_STATE_BUCKETS}"
+
+
+def bucket_name(source: str, bucket: int):
+    return os.path.join(contributions_directory(source), f"{bucket:04d}")
+
+
+def read_state_table(name: str, template: pd.DataFrame):
+    """Lee una tabla del estado con las columnas y los tipos de `template` (un DataFrame vacío)."""
+    text_columns = [column for column, dtype in template.dtypes.items() if dtype == 'string']
+    df = read_layer(state_file(name), dtype={column: str for column in text_columns}, keep_default_na=False,
+                    na_values=[''])
+    if list(df.columns) != list(template.columns):
+        raise KeyError(f"las columnas de {name} no coinciden")
+    return df.astype(template.dtypes.to_dict())
+
+
+def empty_kpi_state():
+    """Estado de los KPIs sin ninguna fila: DataFrames vacíos con las columnas y los tipos de cada tabla."""
+    contributions = {}
+    for source, spec in kpi_sources.items():
+        measures = dict.fromkeys(m for p in kpi_partials.values() if p['source'] == source for m in p['measures'])
+        dtypes = {'key': 'string', **spec['keys'], **{measure: 'int64' for measure in measures}}
+        contributions[source] = pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in dtypes.items()})
+
+    partials = {name: contributions[spec['source']][spec['by'] + spec['measures']].copy()
+                for name, spec in kpi_partials.items()}
+    return contributions, partials
+
+
+class KpiState:
+    """
+    Estado de los KPIs entre ejecuciones: los agregados parciales y la última contribución de cada clave de las
+    fuentes, repartida en `GOLD_KPI_STATE_BUCKETS` archivos por la huella de la clave. Cada ejecución solo lee y
+    reescribe los archivos de las claves de su lote, por lo que su coste depende del tamaño del lote y no del de
+    las tablas.
+    """
+
+    def __init__(self, partials: dict = None, stored: bool = False):
+        self.templates, empty_partials = empty_kpi_state()
+        self.partials = partials if partials is not None else empty_partials
+        # Si hay un estado guardado del que copiar las contribuciones que no cambian
+        self.stored = stored
+        self.buckets = {}
+
+    @classmethod
+    def load(cls):
+        """
+        Carga los agregados parciales de la última ejecución (las contribuciones se leen al plegar cada lote).
+
+        Returns:
+            KpiState: El estado guardado, o uno vacío si no hay estado o no se puede leer (en ese caso, los agregados
+                      se calculan de nuevo con las filas de esta ejecución).
+        """
+        contributions, empty_partials = empty_kpi_state()
+        directories = [os.path.join(GOLD_KPI_STATE_PATH, contributions_directory(source)) for source in contributions]
+        if not all(os.path.exists(state_file(name)) for name in empty_partials) or \
+                not all(os.path.isdir(directory) for directory in directories):
+            return cls()
+
+        try:
+            return cls({name: read_state_table(name, template) for name, template in empty_partials.items()},
+                       stored=True)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log_error(f"Error al leer el estado de los KPIs: {e}. Se calculan de nuevo con las filas de este lote.")
+            return cls()
+
+    def read_bucket(self, source: str, bucket: int):
+        name = bucket_name(source, bucket)
+        if not self.stored or not os.path.exists(state_file(name)):
+            return self.templates[source]
+        return read_state_table(name, self.templates[source])
+
+    def fold(self, source: str, batch: pd.DataFrame):
+        """
+        Pliega un lote de contribuciones de una fuente en los agregados parciales: se suman las de todas sus filas y
+        se resta la contribución anterior solo de las claves que vuelven a aparecer. Las claves que no están en el
+        lote no cambian (no se tratan como eliminadas).
+
+        Args:
+            source (str): El nombre de la fuente (ver `kpi_sources`).
+            batch (pd.DataFrame): Las contribuciones del lote (ver `source_contributions`).
+
+        Returns:
+            tuple: El número de filas sumadas y el de filas restadas.
+        """
+        retracted = []
+        for bucket, rows in batch.groupby('bucket', sort=True):
+            rows = rows.drop(columns='bucket')
+            stored = self.read_bucket(source, bucket)
+            previous = stored['key'].isin(rows['key']).to_numpy()
+            retracted.append(stored[previous])
+            self.buckets[(source, bucket)] = pd.concat([stored[~previous], rows], ignore_index=True)
+
+        retracted = pd.concat(retracted, ignore_index=True) if retracted else self.templates[source]
+        for name, partial in kpi_partials.items():
+            if partial['source'] == source:
+                self.partials[name] = fold_partial(self.partials[name], batch, retracted, partial['by'],
+                                                   partial['measures'])
+        return len(batch), len(retracted)
+
+    def save(self):
+        """
+        Guarda el estado. Se escribe en un directorio temporal que sustituye al anterior (los archivos de
+        contribuciones que no cambian se enlazan desde él), de modo que una ejecución interrumpida nunca deja las
+        contribuciones y los agregados desalineados (a lo sumo, sin estado).
+        """
+        tmp_directory = f"{GOLD_KPI_STATE_PATH}.part"
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+        os.makedirs(tmp_directory)
+
+        for name, df in self.partials.items():
+            write_layer(df, state_file(name, tmp_directory))
+        for source in self.templates:
+            os.makedirs(os.path.join(tmp_directory, contributions_directory(source)))
+        for (source, bucket), df in self.buckets.items():
+            write_layer(df, state_file(bucket_name(source, bucket), tmp_directory))
+
+        if self.stored:
+            for source in self.templates:
+                directory = os.path.join(GOLD_KPI_STATE_PATH, contributions_directory(source))
+                for file_name in os.listdir(directory):
+                    target = os.path.join(tmp_directory, contributions_directory(source), file_name)
+                    if not os.path.exists(target):
+                        link_or_copy(os.path.join(directory, file_name), target)
+
+        shutil.rmtree(GOLD_KPI_STATE_PATH, ignore_errors=True)
+        os.replace(tmp_directory, GOLD_KPI_STATE_PATH)
+
+
+def link_or_copy(source: str, target: str):
+    """Enlaza `target` al archivo `source` sin copiar sus datos, o lo copia si el sistema de archivos no lo permite."""
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
@@ -1,3 +1,6 @@
+from . import http_session
+from . import rate_control
+from . import watermark
 from . import extract_from_api
 from . import extract_from_csv
 from . import  extract_from_excel
\ No newline at end of file
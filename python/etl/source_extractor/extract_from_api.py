@@ -1,19 +1,30 @@
 # IMPORTS
+import asyncio
 import os.path
 import pandas as pd
 import requests
-import time
 from dotenv import load_dotenv
-from utils.utils import log_error
+from etl.source_extractor.http_session import get_with_retry
+from etl.source_extractor.rate_control import AdaptivePageSize
+from etl.source_extractor.watermark import max_watermark
+from utils.utils import log_error, build_output_path, append_audit_chunk, LayerWriter
+from query.PostgreSQL.CREATE.schema_registry import apply_schema
 
 load_dotenv()
 DESTINATION_PATH = os.getenv("DESTINATION_PATH")
 API_URL = f'http://{os.getenv("API_URL")}:{os.getenv("API_PORT")}'
 
+# Modo de extracción: 'sequential' (página a página) o 'async' (páginas concurrentes)
+API_EXTRACT_MODE = os.getenv("API_EXTRACT_MODE", "sequential")
+API_MAX_CONCURRENCY = int(os.getenv("API_MAX_CONCURRENCY", 8))
+
 ENDPOINTS_CONFIG = {
     "booking/new": {
         "columns": os.getenv("BOOKING_NEW_COLUMNS").split(","),
+        "table": "Booking",
         "process_data": None,
+        "watermark_column": "ModifiedDate",
+        "watermark_param": "modified_since",
         "params": {
             "limit": 1000,
             "offset": 0
@@ -21,7 +32,10 @@ ENDPOINTS_CONFIG = {
     },
     "booking/passenger/new": {
         "columns": os.getenv("BOOKING_PASSENGER_NEW_COLUMNS").split(","),
+        "table": "BookingPassenger",
         "process_data": None,
+        "watermark_column": "ModifiedDate",
+        "watermark_param": "modified_since",
         "params": {
             "limit": 1000,
             "offset": 0
@@ -29,18 +43,276 @@ ENDPOINTS_CONFIG = {
     },
 }
 
-def extract_from_api(endpoint):
+# Tamaño de página adaptativo por endpoint, partiendo del `limit` configurado
+PAGE_SIZE_CONTROLLERS = {
+    endpoint: AdaptivePageSize(config["params"]["limit"]) for endpoint, config in ENDPOINTS_CONFIG.items()
+}
+
+def fetch_page(endpoint, params, limit, offset):
+    """
+    Realiza la solicitud GET de una única página del endpoint y devuelve la respuesta JSON.
+
+    La solicitud usa la sesión HTTP compartida y se reintenta de forma independiente para cada página
+    (ver `get_with_retry`). La latencia y el tamaño de las páginas completas se registran en el controlador de
+    tamaño de página del endpoint.
+
+    Args:
+        endpoint (str): El nombre del endpoint de la API.
+        params (dict): Parámetros base de la solicitud configurados para el endpoint.
+        limit (int): Número máximo de registros de la página.
+        offset (int): Posición del primer registro de la página.
+
+    Returns:
+        dict: El cuerpo de la respuesta con las claves `data` y `total_items`.
+
+    Raises:
+        requests.exceptions.RequestException: Si la solicitud falla tras agotar los reintentos.
+        ValueError: Si la respuesta no es un JSON válido.
+    """
+    page_params = {**params, "limit": limit, "offset": offset}
+    response = get_with_retry(f'{API_URL}/{endpoint}', params=page_params)
+    payload = response.json()
+
+    # Solo las páginas completas son representativas de la latencia y el tamaño de una página de `limit` registros
+    if isinstance(payload.get('data'), list) and len(payload['data']) >= limit:
+        PAGE_SIZE_CONTROLLERS[endpoint].observe(limit, response.elapsed.total_seconds(), len(response.content))
+    return payload
+
+
+def process_page(payload, endpoint_config):
+    """
+    Extrae y procesa los registros de la respuesta de una página según la configuración del endpoint.
+
+    Args:
+        payload (dict): El cuerpo de la respuesta devuelto por `fetch_page`.
+        endpoint_config (dict): La configuración del endpoint en `ENDPOINTS_CONFIG`.
+
+    Returns:
+        list: La lista de registros de la página.
+    """
+    data = payload.get('data', [])
+
+    if endpoint_config["process_data"]:
+        data = endpoint_config["process_data"](data)
+
+    if isinstance(data, dict):
+        return [data]
+    return data
+
+
+async def fetch_pages_async(endpoint, params, limit, offsets, max_concurrency):
+    """
+    Descarga de forma concurrente las páginas indicadas por `offsets`, limitando el número de solicitudes
+    simultáneas con un semáforo.
+
+    Cada solicitud se ejecuta en un hilo del executor por defecto mediante `asyncio.to_thread`, de modo que
+    el tiempo total depende de la latencia del API y no del número de páginas.
+
+    Args:
+        endpoint (str): El nombre del endpoint de la API.
+        params (dict): Parámetros base de la solicitud configurados para el endpoint.
+        limit (int): Número máximo de registros por página.
+        offsets (list): Lista de offsets de las páginas a descargar.
+        max_concurrency (int): Número máximo de solicitudes en curso al mismo tiempo.
+
+    Returns:
+        list: Las respuestas de cada página, en el mismo orden que `offsets`.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def fetch(offset):
+        async with semaphore:
+            return await asyncio.to_thread(fetch_page, endpoint, params, limit, offset)
+
+    # asyncio.gather conserva el orden de las corrutinas, por lo que las páginas quedan ordenadas por offset
+    return await asyncio.gather(*(fetch(offset) for offset in offsets))
+
+
+def page_total(payload):
+    """Devuelve el `total_items` de la respuesta de una página como entero, o None si el API no lo devuelve."""
+    total_items = payload.get('total_items')
+    return None if total_items is None else int(total_items)
+
+
+def iter_pages_sequential(endpoint, endpoint_config, params, limit, offset):
+    """
+    Recorre las páginas del endpoint una a una, devolviendo los registros de cada página en cuanto se reciben. El
+    tamaño de cada página se toma del controlador de tamaño de página del endpoint y el ritmo de solicitudes lo
+    marca el limitador compartido del API.
+
+    Cada página empieza donde termina la anterior (según los registros recibidos, no los pedidos), de modo que no
+    se pierden registros si el API devuelve páginas más pequeñas que `limit`. La extracción termina al alcanzar
+    `total_items`, al recibir una página vacía o, si el API no devuelve `total_items`, al recibir una página
+    incompleta de un tamaño que el API ya ha servido completo en una página anterior; si no, se pide una página
+    más para distinguir el final de un límite del API.
+
+    Args:
+        endpoint (str): El nombre del endpoint de la API.
+        endpoint_config (dict): La configuración del endpoint en `ENDPOINTS_CONFIG`.
+        params (dict): Parámetros base de la solicitud configurados para el endpoint.
+        limit (int): Número máximo de registros de la primera página.
+        offset (int): Offset de la primera página.
+
+    Yields:
+        list: Los registros de cada página, en orden de offset.
+    """
+    controller = PAGE_SIZE_CONTROLLERS[endpoint]
+    # Mayor número de registros que el API ha servido en una página: una página incompleta de ese tamaño es la última
+    served = 0
+    short_page = None
+
+    while True:
+        payload = fetch_page(endpoint, params, limit, offset)
+        data = process_page(payload, endpoint_config)
+        if not data:
+            break
+        yield data
+
+        # Una página incompleta seguida de más registros indica el máximo de registros por página del API
+        if short_page is not None:
+            controller.cap(short_page)
+            short_page = None
+
+        offset += len(data)
+        total_items = page_total(payload)
+        if total_items is not None:
+            if offset >= total_items:
+                break
+            if len(data) < limit:
+                controller.cap(len(data))
+        elif len(data) < limit:
+            if limit <= served:
+                break
+            short_page = len(data)
+        served = max(served, len(data))
+
+        limit = controller.limit
+
+
+def fetch_window(endpoint, endpoint_config, params, limit, offsets, total_items):
+    """
+    Descarga de forma concurrente las páginas de `offsets` (ver `fetch_pages_async`) y devuelve los registros de
+    las páginas hasta la primera incompleta que no es la última: en ese caso, el API limita el número de registros
+    por página y las páginas siguientes de la ventana no empiezan donde termina esa, por lo que se descartan.
+
+    Returns:
+        tuple: Los registros de cada página conservada y el offset siguiente a la última.
+    """
+    payloads = asyncio.run(fetch_pages_async(endpoint, params, limit, offsets, API_MAX_CONCURRENCY))
+    pages = []
+    for offset, payload in zip(offsets, payloads):
+        data = process_page(payload, endpoint_config)
+        pages.append(data)
+        next_offset = offset + len(data)
+        if len(data) < min(limit, total_items - offset):
+            if data:
+                PAGE_SIZE_CONTROLLERS[endpoint].cap(len(data))
+            else:
+                # Una página vacía antes de `total_items`: el total ha cambiado durante la extracción
+                next_offset = total_items
+            break
+    return pages, next_offset
+
+
+def iter_pages_async(endpoint, endpoint_config, params, limit, offset, window=None):
+    """
+    Descarga la primera página para conocer `total_items` y después obtiene el resto de páginas de forma
+    concurrente, hasta `API_MAX_CONCURRENCY` solicitudes simultáneas, devolviéndolas en orden de offset.
+
+    Si se indica `window`, las páginas restantes se descargan en bloques de `window` páginas y cada bloque se
+    devuelve antes de pedir el siguiente, lo que acota la memoria a `window` páginas. Si no se indica, todas
+    las páginas se descargan en un único bloque. El tamaño de página de cada bloque se toma del controlador
+    de tamaño de página del endpoint, ajustado con las páginas ya descargadas. Si el API devuelve menos registros
+    de los pedidos en una página que no es la última, el bloque siguiente empieza donde termina esa página, con el
+    tamaño de página limitado a lo que devuelve el API (ver `fetch_window`).
+
+    Si el API no devuelve `total_items`, se continúa con la extracción secuencial.
+
+    Args:
+        endpoint (str): El nombre del endpoint de la API.
+        endpoint_config (dict): La configuración del endpoint en `ENDPOINTS_CONFIG`.
+        params (dict): Parámetros base de la solicitud configurados para el endpoint.
+        limit (int): Número máximo de registros de la primera página.
+        offset (int): Offset de la primera página.
+        window (int, optional): Número de páginas descargadas por bloque.
+
+    Yields:
+        list: Los registros de cada página, en orden de offset.
+    """
+    first_page = fetch_page(endpoint, params, limit, offset)
+    data = process_page(first_page, endpoint_config)
+    yield data
+
+    total_items = page_total(first_page)
+    if total_items is None:
+        log_error(f"El endpoint {endpoint} no devuelve total_items, se continúa en modo secuencial.")
+        if data:
+            yield from iter_pages_sequential(endpoint, endpoint_config, params,
+                                             PAGE_SIZE_CONTROLLERS[endpoint].limit, offset + len(data))
+        return
+
+    if not data:
+        return
+    next_offset = offset + len(data)
+    if len(data) < limit and next_offset < total_items:
+        PAGE_SIZE_CONTROLLERS[endpoint].cap(len(data))
+
+    while next_offset < total_items:
+        limit = PAGE_SIZE_CONTROLLERS[endpoint].limit
+        offsets = list(range(next_offset, total_items, limit))
+        if window:
+            offsets = offsets[:window]
+
+        pages, next_offset = fetch_window(endpoint, endpoint_config, params, limit, offsets, total_items)
+        yield from pages
+
+
+def iter_api_pages(endpoint, mode=None, window=None, since=None):
+    """
+    Devuelve un iterador sobre las páginas del endpoint según el modo de extracción.
+
+    Args:
+        endpoint (str): El nombre del endpoint de la API, configurado en `ENDPOINTS_CONFIG`.
+        mode (str, optional): Modo de extracción, 'sequential' o 'async'. Por defecto se usa `API_EXTRACT_MODE`.
+        window (int, optional): En modo `async`, número de páginas descargadas por bloque.
+        since (str, optional): Marca de agua de la última extracción. Si se indica, se envía en el parámetro
+                               `watermark_param` del endpoint para obtener solo los registros posteriores.
+
+    Returns:
+        generator: Un generador que devuelve la lista de registros de cada página, en orden de offset.
+    """
+    endpoint_config = ENDPOINTS_CONFIG[endpoint]
+
+    params = endpoint_config.get("params", {})
+    limit = params.get("limit", 1000)
+    offset = params.get("offset", 0)
+    mode = mode or API_EXTRACT_MODE
+
+    if since is not None and endpoint_config.get("watermark_param"):
+        params = {**params, endpoint_config["watermark_param"]: since}
+
+    if mode == "async":
+        return iter_pages_async(endpoint, endpoint_config, params, limit, offset, window)
+    return iter_pages_sequential(endpoint, endpoint_config, params, limit, offset)
+
+
+def extract_from_api(endpoint, mode=None, since=None):
     """
      Extrae datos de un API configurado en el archivo de configuración de endpoints, procesando la respuesta
     y devolviendo un DataFrame con los datos extraídos.
 
-    La función realiza una solicitud GET a un endpoint específico de la API, gestionando la paginación
-    y procesando los datos recibidos según la configuración definida en `ENDPOINTS_CONFIG`. Los datos
-    extraídos se devuelven como un DataFrame de pandas con las columnas especificadas para cada endpoint.
+    La función realiza solicitudes GET a un endpoint específico de la API, gestionando la paginación
+    y procesando los datos recibidos según la configuración definida en `ENDPOINTS_CONFIG`. La paginación
+    puede recorrerse de forma secuencial o, en modo `async`, descargando las páginas de forma concurrente a
+    partir del `total_items` devuelto por la primera página. Los datos extraídos se devuelven como un
+    DataFrame de pandas con las columnas especificadas para cada endpoint y los tipos de su tabla destino.
 
     Args:
         endpoint (str): El nombre del endpoint de la API desde el cual se extraerán los datos. Este endpoint
                          debe estar previamente configurado en el diccionario `ENDPOINTS_CONFIG`.
+        mode (str, optional): Modo de extracción, 'sequential' o 'async'. Por defecto se usa `API_EXTRACT_MODE`.
+        since (str, optional): Marca de agua de la última extracción; si se indica, solo se extraen los
+                               registros modificados después de ella.
 
     Returns:
         pd.DataFrame or None: Si los datos se extraen correctamente, se devuelve un DataFrame con los datos
@@ -51,48 +323,94 @@ def extract_from_api(endpoint):
         return None
 
     endpoint_config = ENDPOINTS_CONFIG[endpoint]
-
-    params = endpoint_config.get("params", {})
-    limit = params.get("limit", 1000)
-    offset = params.get("offset", 0)
     all_data = []
 
-    while True:
-        params.update({"limit": limit, "offset": offset})
+    try:
+        for data in iter_api_pages(endpoint, mode, since=since):
+            all_data.extend(data)
 
-        try:
-            response = requests.get(f'{API_URL}/{endpoint}', params=params)
-            response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        log_error(f"Error al hacer la solicitud GET a {API_URL}/{endpoint}: {e}")
+        return None
+    except ValueError:
+        log_error(f"Error: La respuesta no es un JSON válido para {endpoint}.")
+        return None
 
-            data = response.json()
+    if all_data:
+        df = apply_schema(pd.DataFrame(all_data, columns=endpoint_config["columns"]), endpoint_config["table"])
+        log_error(f"Datos extraídos correctamente para el endpoint: {endpoint}")
+        return df
+    else:
+        log_error(f"No se encontraron datos para el endpoint {endpoint}.")
+        return None
 
-            data = data.get('data', [])
 
-            if endpoint_config["process_data"]:
-                data = endpoint_config["process_data"](data)
+def extract_from_api_to_file(endpoint, source, extract_date, proc_type, path, mode=None, since=None):
+    """
+    Extrae los datos de un endpoint en modo streaming, escribiendo cada página en el archivo de bronze en
+    cuanto se recibe, con las columnas de auditoría añadidas página a página.
 
-            if isinstance(data, list):
-                all_data.extend(data)
-            elif isinstance(data, dict):
-                all_data.append(data)
+    A diferencia de `extract_from_api`, no se acumulan los registros en memoria: el pico de memoria es de
+    aproximadamente una página (o `API_MAX_CONCURRENCY` páginas en modo `async`), independientemente del
+    tamaño del endpoint. El archivo se escribe primero con el sufijo `.part` y solo se renombra al final
+    si la extracción termina correctamente, para no dejar un bronze incompleto.
 
-            if len(data) < limit:
-                break
+    Args:
+        endpoint (str): El nombre del endpoint de la API, configurado en `ENDPOINTS_CONFIG`.
+        source (str): Nombre de la fuente, usado para las columnas de auditoría y el nombre del archivo.
+        extract_date (str): Fecha de extracción con formato `%Y-%m-%d %H:%M:%S`.
+        proc_type (str): Tipo de procesamiento para las columnas de auditoría (ej. 'extracted').
+        path (str): Directorio donde se guardará el archivo.
+        mode (str, optional): Modo de extracción, 'sequential' o 'async'. Por defecto se usa `API_EXTRACT_MODE`.
+        since (str, optional): Marca de agua de la última extracción; si se indica, solo se extraen los
+                               registros modificados después de ella.
 
-            offset += limit
-            time.sleep(1)
+    Returns:
+        tuple or None: El número de registros escritos y la nueva marca de agua (el máximo de la columna
+                       `watermark_column` de los registros escritos), o `None` si ocurre un error o no se
+                       encuentran datos.
+    """
+    if endpoint not in ENDPOINTS_CONFIG:
+        log_error(f"Endpoint {endpoint} no está configurado en los endpoints disponibles.")
+        return None
 
-        except requests.exceptions.RequestException as e:
-            log_error(f"Error al hacer la solicitud GET a {API_URL}/{endpoint}: {e}")
-            return None
-        except ValueError:
-            log_error(f"Error: La respuesta no es un JSON válido para {endpoint}.")
-            return None
+    endpoint_config = ENDPOINTS_CONFIG[endpoint]
+    file_path = build_output_path(source, proc_type, path)
+    # La extensión real va al final para que el escritor detecte el formato del archivo
+    root, extension = os.path.splitext(file_path)
+    part_path = f"{root}.part{extension}"
+    watermark_column = endpoint_config.get("watermark_column")
+    total_rows = 0
+    high_water_mark = since
 
-    if all_data:
-        df = pd.DataFrame(all_data, columns=endpoint_config["columns"])
-        log_error(f"Datos extraídos correctamente para el endpoint: {endpoint}")
-        return df
-    else:
+    try:
+        with LayerWriter(part_path) as writer:
+            for data in iter_api_pages(endpoint, mode, window=API_MAX_CONCURRENCY, since=since):
+                if not data:
+                    continue
+                # Sin categorías: cada página tendría las suyas y el archivo no tendría un esquema único
+                df_page = apply_schema(pd.DataFrame(data, columns=endpoint_config["columns"]), endpoint_config["table"],
+                                       categories=False)
+                if watermark_column in df_page.columns:
+                    high_water_mark = max_watermark(df_page[watermark_column], high_water_mark)
+                total_rows += append_audit_chunk(df_page, source, extract_date, proc_type, writer)
+
+    except requests.exceptions.RequestException as e:
+        log_error(f"Error al hacer la solicitud GET a {API_URL}/{endpoint}: {e}")
+        total_rows = 0
+    except ValueError:
+        log_error(f"Error: La respuesta no es un JSON válido para {endpoint}.")
+        total_rows = 0
+    except (TypeError, OSError) as e:
+        log_error(f"Error al escribir el archivo {part_path}: {e}")
+        total_rows = 0
+
+    if total_rows == 0:
+        if os.path.exists(part_path):
+            os.remove(part_path)
         log_error(f"No se encontraron datos para el endpoint {endpoint}.")
-        return None
\ No newline at end of file
+        return None
+
+    os.replace(part_path, file_path)
+    log_error(f"Datos extraídos en streaming para el endpoint {endpoint}: {total_rows} registros en {file_path}")
+    return total_rows, high_water_mark
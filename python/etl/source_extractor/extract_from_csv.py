@@ -2,17 +2,149 @@
 import os.path
 import pandas as pd
 from dotenv import load_dotenv
-from utils.utils import log_error
+from utils.utils import log_error, build_output_path, append_audit_chunk, LayerWriter
+from query.PostgreSQL.CREATE.schema_registry import get_table_dtypes, apply_schema
+from etl.transform_methods.filter_data import dtypes_dict
+from etl.transform_methods.transform_all_sources import transform_stages
 
 load_dotenv()
 DESTINATION_PATH = os.getenv("DESTINATION_PATH")
 API_URL = f'http://{os.getenv("API_URL")}:{os.getenv("API_PORT")}'
 
+# Número de filas por bloque en la lectura y motor de parseo ('c' o 'pyarrow')
+CSV_CHUNKSIZE = int(os.getenv("CSV_CHUNKSIZE", 100000))
+CSV_ENGINE = os.getenv("CSV_ENGINE", "c")
+
 CSV_FILES = {
     "PassengerJourneyLeg_20190201_20190331.csv": ";",
     "PassengerJourneyCharge_20190201_20190331.csv" : ","
 }
 
+# Variable de entorno con las columnas de la tabla destino de cada archivo; solo se leen esas columnas y las que
+# necesita la transformación del archivo (ver `get_extract_columns`)
+CSV_TABLE_COLUMNS = {
+    "PassengerJourneyLeg_20190201_20190331.csv": "TABLES_COLUMNS_PASSENGERJOURNEYLEG",
+    "PassengerJourneyCharge_20190201_20190331.csv": "TABLES_COLUMNS_PASSENGERJOURNEYCHARGE"
+}
+
+# Tabla destino de cada archivo. Los tipos de las columnas se derivan de su definición (ver `get_table_dtypes`);
+# las fechas se leen como texto y se convierten a datetime en la transformación.
+CSV_TABLES = {
+    "PassengerJourneyLeg_20190201_20190331.csv": "PassengerJourneyLeg",
+    "PassengerJourneyCharge_20190201_20190331.csv": "PassengerJourneyCharge"
+}
+
+# Tipo de archivo de cada CSV en la transformación (ver `dtypes_dict` y `transform_stages`)
+CSV_FILE_TYPES = {
+    "PassengerJourneyLeg_20190201_20190331.csv": "leg",
+    "PassengerJourneyCharge_20190201_20190331.csv": "charge"
+}
+
+
+def get_table_columns(base_name):
+    """
+    Devuelve las columnas de la tabla destino de un archivo CSV, leídas de su variable `TABLES_COLUMNS_*`.
+
+    Args:
+        base_name (str): Nombre del archivo CSV.
+
+    Returns:
+        list or None: La lista de columnas, o `None` si el archivo no tiene tabla configurada.
+    """
+    env_name = CSV_TABLE_COLUMNS.get(base_name)
+    if env_name is None or not os.getenv(env_name):
+        return None
+    return [column.strip() for column in os.getenv(env_name).split(',')]
+
+
+def get_extract_columns(base_name, file_columns):
+    """
+    Devuelve las columnas de un archivo CSV que se extraen: las de su tabla destino (`TABLES_COLUMNS_*`) y las que
+    lee su transformación, aunque no se carguen (las fechas de `dtypes_dict` y las columnas de `transform_stages`,
+    p. ej. `ChargeDateTime` para la conversión de divisas).
+
+    Args:
+        base_name (str): Nombre del archivo CSV.
+        file_columns (list): Columnas del archivo, en su orden.
+
+    Returns:
+        list or None: Las columnas a leer, en el orden del archivo, o `None` (todas) si el archivo no tiene tabla
+                      configurada.
+    """
+    table_columns = get_table_columns(base_name)
+    if table_columns is None:
+        return None
+
+    file_type = CSV_FILE_TYPES.get(base_name)
+    columns = set(table_columns) | set(dtypes_dict.get(file_type, {}))
+    for stage in transform_stages.values():
+        if stage['file_types'] is None or file_type in stage['file_types']:
+            columns.update(stage['reads'] + stage['uses'])
+    return [column for column in file_columns if column in columns]
+
+
+def read_csv_chunks(file_path, sep, header=0, null_values="", usecols=None, dtype=None, chunksize=CSV_CHUNKSIZE,
+                    engine=CSV_ENGINE):
+    """
+    Lee un archivo CSV por bloques de `chunksize` filas con los tipos y columnas indicados.
+
+    Con el motor `pyarrow` el archivo se lee en una sola pasada multihilo (este motor no admite lectura por
+    bloques), por lo que se devuelve un único bloque.
+
+    Args:
+        file_path (str): Ruta del archivo CSV.
+        sep (str): Separador de columnas.
+        header (int or str, optional): Fila que debe ser usada como encabezado.
+        null_values (str, optional): Valor que debe ser tratado como `NaN`.
+        usecols (list, optional): Columnas a leer; el resto se descartan durante el parseo.
+        dtype (dict, optional): Tipos de las columnas.
+        chunksize (int, optional): Número de filas por bloque.
+        engine (str, optional): Motor de parseo de pandas, 'c' o 'pyarrow'.
+
+    Yields:
+        pd.DataFrame: Cada bloque de filas del archivo.
+    """
+    if dtype is not None and usecols is not None:
+        dtype = {column: column_type for column, column_type in dtype.items() if column in usecols}
+
+    if engine == "pyarrow":
+        yield pd.read_csv(file_path, sep=sep, header=header, na_values=null_values, usecols=usecols, dtype=dtype,
+                          engine="pyarrow")
+        return
+
+    yield from pd.read_csv(file_path, sep=sep, header=header, na_values=null_values, usecols=usecols, dtype=dtype,
+                           chunksize=chunksize)
+
+
+def csv_read_options(file_path, header=0):
+    """
+    Calcula el separador, las columnas y los tipos con los que se lee un archivo CSV (ver `extract_from_csv`).
+
+    Args:
+        file_path (str): Ruta del archivo CSV.
+        header (int or str, optional): Fila que debe ser usada como encabezado.
+
+    Returns:
+        tuple: El separador, las columnas a leer (o `None`) y los tipos de las columnas (o `None`).
+    """
+    base_name = os.path.basename(file_path)
+
+    if base_name in CSV_FILES:
+        sep = CSV_FILES[base_name]
+    else:
+        log_error(f"Error: No se encontró el separador para el archivo {file_path}")
+        sep = ","
+
+    file_columns = pd.read_csv(file_path, sep=sep, header=header, nrows=0).columns
+    usecols = get_extract_columns(base_name, file_columns)
+
+    # Los códigos se leen como texto y se pasan a `category` al final, ya que cada bloque tendría sus categorías
+    dtype = {column: column_type
+             for column, column_type in get_table_dtypes(CSV_TABLES.get(base_name), categories=False).items()
+             if column in file_columns}
+    return sep, usecols, dtype or None
+
+
 def extract_from_csv(file_path, header=0, null_values=""):
     """
     Extrae datos desde un archivo CSV y los carga en un DataFrame de pandas.
@@ -21,6 +153,11 @@ def extract_from_csv(file_path, header=0, null_values=""):
     en la configuración, se usa la coma como separador por defecto. Además, permite definir valores nulos en el archivo
     mediante el parámetro `null_values` y especificar qué fila debe ser usada como encabezado con el parámetro `header`.
 
+    Si el archivo tiene una tabla destino configurada, solo se leen las columnas de esa tabla (`TABLES_COLUMNS_*`) y
+    las que necesita su transformación (ver `get_extract_columns`), con los tipos de su tabla en el DDL
+    (`CSV_TABLES`), evitando la inferencia de tipos y las columnas `object`. El archivo completo se mantiene en
+    memoria; para extraerlo sin acumularlo, ver `extract_from_csv_to_file`.
+
     Args:
         file_path (str): Ruta del archivo CSV desde el que se extraerán los datos.
         header (int or str, optional): Fila que debe ser usada como encabezado. El valor por defecto es 0 (la primera fila).
@@ -32,16 +169,9 @@ def extract_from_csv(file_path, header=0, null_values=""):
                                se devuelve `None`.
     """
     try:
-
-        base_name = os.path.basename(file_path)
-
-        if base_name in CSV_FILES:
-            sep = CSV_FILES[base_name]
-        else:
-            log_error(f"Error: No se encontró el separador para el archivo {file_path}")
-            sep = ","
-
-        df = pd.read_csv(file_path, sep=sep, header=header, na_values=null_values)
+        sep, usecols, dtype = csv_read_options(file_path, header)
+        chunks = read_csv_chunks(file_path, sep, header=header, null_values=null_values, usecols=usecols, dtype=dtype)
+        df = apply_schema(pd.concat(chunks, ignore_index=True), CSV_TABLES.get(os.path.basename(file_path)))
 
         log_error(f"Datos extraídos correctamente desde el archivo: {file_path}")
         return df
@@ -49,7 +179,60 @@ def extract_from_csv(file_path, header=0, null_values=""):
     except FileNotFoundError:
         log_error(f"Error: No se encontró el archivo {file_path}")
         return None
-    except pd.errors.ParserError as e:
+    except (pd.errors.ParserError, ValueError, TypeError) as e:
         log_error(f"Error al leer el archivo {file_path}: {e}")
         return None
 
+
+def extract_from_csv_to_file(file_path, source, extract_date, proc_type, path, header=0, null_values=""):
+    """
+    Extrae un archivo CSV en modo streaming (ver `extract_from_csv`): cada bloque de `CSV_CHUNKSIZE` filas se
+    escribe en el archivo de bronze en cuanto se lee, con las columnas de auditoría, de modo que el pico de memoria
+    es de un bloque independientemente del tamaño del archivo (con `CSV_ENGINE=pyarrow`, que no lee por bloques,
+    es el archivo completo). El archivo se escribe primero con el sufijo `.part` y solo se renombra al final si la
+    extracción termina correctamente.
+
+    Args:
+        file_path (str): Ruta del archivo CSV.
+        source (str): Nombre de la fuente, usado para las columnas de auditoría y el nombre del archivo.
+        extract_date (str): Fecha de extracción con formato `%Y-%m-%d %H:%M:%S`.
+        proc_type (str): Tipo de procesamiento para las columnas de auditoría (ej. 'extracted').
+        path (str): Directorio donde se guardará el archivo.
+        header (int or str, optional): Fila que debe ser usada como encabezado.
+        null_values (str, optional): Valor que debe ser tratado como `NaN`.
+
+    Returns:
+        int or None: El número de filas escritas, o `None` si ocurre un error o el archivo no tiene filas.
+    """
+    output_path = build_output_path(source, proc_type, path)
+    # La extensión real va al final para que el escritor detecte el formato del archivo
+    root, extension = os.path.splitext(output_path)
+    part_path = f"{root}.part{extension}"
+    table = CSV_TABLES.get(os.path.basename(file_path))
+    total_rows = 0
+
+    try:
+        sep, usecols, dtype = csv_read_options(file_path, header)
+        with LayerWriter(part_path) as writer:
+            for chunk in read_csv_chunks(file_path, sep, header=header, null_values=null_values, usecols=usecols,
+                                         dtype=dtype):
+                # Sin categorías: cada bloque tendría las suyas y el archivo no tendría un esquema único
+                total_rows += append_audit_chunk(apply_schema(chunk, table, categories=False), source,
+                                                 extract_date, proc_type, writer)
+
+    except FileNotFoundError:
+        log_error(f"Error: No se encontró el archivo {file_path}")
+        total_rows = 0
+    except (pd.errors.ParserError, ValueError, TypeError, OSError) as e:
+        log_error(f"Error al leer el archivo {file_path}: {e}")
+        total_rows = 0
+
+    if total_rows == 0:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        log_error(f"No se extrajeron datos del archivo {file_path}")
+        return None
+
+    os.replace(part_path, output_path)
+    log_error(f"Datos extraídos en streaming desde el archivo {file_path}: {total_rows} filas en {output_path}")
+    return total_rows
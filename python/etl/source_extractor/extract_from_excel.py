@@ -1,13 +1,137 @@
 # IMPORTS
+import hashlib
+import json
 import os.path
+import openpyxl
 import pandas as pd
+from pandas.io.parsers import TextParser
+from dotenv import load_dotenv
 from utils.utils import log_error
+from query.PostgreSQL.CREATE.schema_registry import apply_schema
 
+load_dotenv()
+# Directorio donde se guardan las instantáneas columnares (parquet) de los archivos Excel
+EXCEL_CACHE_PATH = os.getenv("EXCEL_CACHE_PATH") or os.path.join(os.getenv("DESTINATION_PATH"), "_cache")
 
 XLS_FILES = {
     "PassengerJourneySegment_20190201_20190331.xlsx": 0
 }
 
+# Tabla destino de cada archivo, cuyos tipos se aplican a los datos leídos (ver `apply_schema`)
+XLS_TABLES = {
+    "PassengerJourneySegment_20190201_20190331.xlsx": "PassengerJourneySegment"
+}
+
+
+def file_sha256(file_path, block_size=1024 * 1024):
+    """
+    Calcula el hash SHA-256 del contenido de un archivo, leyéndolo por bloques.
+
+    Args:
+        file_path (str): Ruta del archivo.
+        block_size (int, optional): Tamaño en bytes de cada bloque leído.
+
+    Returns:
+        str: El hash en hexadecimal.
+    """
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def read_excel_streaming(file_path, sheet_name, null_values=None):
+    """
+    Lee una hoja de un archivo Excel con el lector de solo lectura de openpyxl, que recorre las filas sin
+    cargar los objetos de celda ni los estilos del libro.
+
+    Los valores se convierten igual que en `pd.read_excel` (los números enteros guardados como float pasan a
+    int y el parseo de nulos y tipos lo hace el mismo `TextParser`), por lo que el DataFrame resultante es el
+    mismo que devolvería `pd.read_excel`.
+
+    Args:
+        file_path (str): Ruta del archivo Excel.
+        sheet_name (int or str): Número o nombre de la hoja.
+        null_values (str, optional): Valor que debe ser tratado como `NaN`.
+
+    Returns:
+        pd.DataFrame: Los datos de la hoja.
+    """
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook.worksheets[sheet_name] if isinstance(sheet_name, int) else workbook[sheet_name]
+        rows = [[int(value) if isinstance(value, float) and value.is_integer() else value for value in row]
+                for row in worksheet.iter_rows(values_only=True)]
+    finally:
+        workbook.close()
+
+    # Se descartan las filas vacías del final, como hace pandas
+    while rows and all(value is None for value in rows[-1]):
+        rows.pop()
+
+    return TextParser(rows, header=0, na_values=null_values).read()
+
+
+def read_excel_cached(file_path, sheet_name, null_values=None):
+    """
+    Lee una hoja de un archivo Excel reutilizando una instantánea columnar en parquet si el archivo no ha cambiado.
+
+    La clave de la caché es el tamaño, la fecha de modificación y el hash SHA-256 del archivo, guardados en un
+    manifiesto JSON junto a la instantánea. Si el tamaño y la fecha coinciden se usa la instantánea directamente;
+    si solo coincide el tamaño, se calcula el hash y, si coincide, se reutiliza la instantánea actualizando la
+    fecha del manifiesto. En cualquier otro caso se parsea el libro con `read_excel_streaming` y se regenera
+    la instantánea.
+
+    Args:
+        file_path (str): Ruta del archivo Excel.
+        sheet_name (int or str): Número o nombre de la hoja.
+        null_values (str, optional): Valor que debe ser tratado como `NaN`.
+
+    Returns:
+        pd.DataFrame: Los datos de la hoja.
+    """
+    base_name = os.path.basename(file_path)
+    snapshot_path = os.path.join(EXCEL_CACHE_PATH, f"{base_name}.{sheet_name}.parquet")
+    manifest_path = os.path.join(EXCEL_CACHE_PATH, f"{base_name}.{sheet_name}.json")
+
+    stat = os.stat(file_path)
+    key = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "null_values": null_values}
+
+    manifest = None
+    if os.path.exists(manifest_path) and os.path.exists(snapshot_path):
+        try:
+            with open(manifest_path, "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            log_error(f"Error al leer el manifiesto de caché {manifest_path}: {e}")
+
+    if manifest is not None and manifest["size"] == key["size"] and manifest["null_values"] == key["null_values"]:
+        cache_hit = manifest["mtime"] == key["mtime"]
+        if not cache_hit and manifest["sha256"] == file_sha256(file_path):
+            # Mismo contenido con otra fecha de modificación: se actualiza el manifiesto y se reutiliza la caché
+            cache_hit = True
+            manifest["mtime"] = key["mtime"]
+            with open(manifest_path, "w") as f:
+                json.dump(manifest, f, indent=4)
+
+        if cache_hit:
+            log_error(f"Usando la instantánea en caché de {file_path}: {snapshot_path}")
+            return pd.read_parquet(snapshot_path)
+
+    df = read_excel_streaming(file_path, sheet_name, null_values)
+
+    try:
+        os.makedirs(EXCEL_CACHE_PATH, exist_ok=True)
+        df.to_parquet(snapshot_path, index=False)
+        with open(manifest_path, "w") as f:
+            json.dump({**key, "sha256": file_sha256(file_path)}, f, indent=4)
+        log_error(f"Instantánea de {file_path} guardada en caché: {snapshot_path}")
+    except Exception as e:
+        log_error(f"No se pudo guardar la instantánea en caché de {file_path}: {e}")
+
+    return df
+
 def extract_from_excel(file_path, null_values=None):
     """
     Extrae datos desde un archivo Excel y los carga en un DataFrame de pandas.
@@ -16,6 +140,10 @@ def extract_from_excel(file_path, null_values=None):
     encuentra la hoja en la configuración, se devuelve un error. También permite definir valores nulos en el archivo
     mediante el parámetro `null_values`.
 
+    El libro solo se parsea cuando cambia: el resultado se guarda como instantánea columnar en `EXCEL_CACHE_PATH`
+    y se reutiliza en las siguientes ejecuciones (ver `read_excel_cached`). Las columnas se convierten a los tipos de
+    su tabla destino (`XLS_TABLES`).
+
     Args:
         file_path (str): Ruta del archivo Excel desde el que se extraerán los datos.
         null_values (str, optional): Valor que debe ser tratado como `NaN`. El valor por defecto es `None`.
@@ -36,13 +164,15 @@ def extract_from_excel(file_path, null_values=None):
             return None
 
         # Leer el archivo Excel
-        df = pd.read_excel(file_path, sheet_name=sheet_name, na_values=null_values)
+        df = read_excel_cached(file_path, sheet_name, null_values)
 
         # Verificación de si los datos fueron leídos correctamente
         if df.empty:
             log_error(f"El archivo {file_path} está vacío o no contiene datos válidos.")
             return None
 
+        df = apply_schema(df, XLS_TABLES.get(base_name))
+
         log_error(f"Datos extraídos correctamente desde el archivo Excel: {file_path}")
         return df
 
@@ -0,0 +1,114 @@
+# IMPORTS
+import os.path
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from etl.source_extractor.rate_control import API_RATE_LIMITER
+from utils.utils import log_error
+
+load_dotenv()
+API_POOL_SIZE = int(os.getenv("API_POOL_SIZE", 16))
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", 30))
+API_MAX_RETRIES = int(os.getenv("API_MAX_RETRIES", 5))
+API_BACKOFF_BASE = float(os.getenv("API_BACKOFF_BASE", 0.5))
+API_BACKOFF_MAX = float(os.getenv("API_BACKOFF_MAX", 30))
+
+# Códigos de estado considerados transitorios y que se reintentan
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Devuelve la sesión HTTP compartida por todos los hilos de extracción, creándola la primera vez.
+
+    La sesión mantiene un pool de conexiones keep-alive de tamaño `API_POOL_SIZE`, de forma que las
+    extracciones de `booking/new` y `booking/passenger/new` reutilizan las conexiones TCP en lugar de
+    abrir una nueva por cada página.
+
+    Returns:
+        requests.Session: La sesión compartida.
+    """
+    global _session
+
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                # Los reintentos se gestionan en `get_with_retry`, por página
+                adapter = HTTPAdapter(pool_connections=API_POOL_SIZE, pool_maxsize=API_POOL_SIZE, max_retries=0)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+
+    return _session
+
+
+def backoff_delay(attempt, retry_after=None):
+    """
+    Calcula la espera antes de un reintento con backoff exponencial y jitter completo.
+
+    Args:
+        attempt (int): Número de intento fallido, empezando en 0.
+        retry_after (str, optional): Valor de la cabecera `Retry-After` de la respuesta, si existe.
+
+    Returns:
+        float: Segundos de espera antes del siguiente intento.
+    """
+    if retry_after is not None:
+        try:
+            return min(float(retry_after), API_BACKOFF_MAX)
+        except ValueError:
+            pass
+
+    return random.uniform(0, min(API_BACKOFF_MAX, API_BACKOFF_BASE * 2 ** attempt))
+
+
+def get_with_retry(url, params=None):
+    """
+    Realiza una solicitud GET con la sesión compartida, reintentando los fallos transitorios.
+
+    Los errores de conexión, los timeouts y las respuestas con un código de `RETRY_STATUS_CODES` se reintentan
+    hasta `API_MAX_RETRIES` veces con backoff exponencial y jitter. Así, un error puntual en una página solo
+    cuesta un reintento de esa página y no la re-extracción completa del endpoint. Cada intento consume un
+    token de `API_RATE_LIMITER` para respetar la cuota del API.
+
+    Args:
+        url (str): La URL a solicitar.
+        params (dict, optional): Parámetros de la solicitud.
+
+    Returns:
+        requests.Response: La respuesta correcta del servidor.
+
+    Raises:
+        requests.exceptions.RequestException: Si la solicitud sigue fallando tras agotar los reintentos, o si
+                                              el error no es transitorio (por ejemplo, un 404).
+    """
+    session = get_session()
+
+    for attempt in range(API_MAX_RETRIES + 1):
+        try:
+            API_RATE_LIMITER.acquire()
+            response = session.get(url, params=params, timeout=API_TIMEOUT)
+
+            if response.status_code in RETRY_STATUS_CODES and attempt < API_MAX_RETRIES:
+                delay = backoff_delay(attempt, response.headers.get("Retry-After"))
+                log_error(f"Respuesta {response.status_code} de {url} (offset {(params or {}).get('offset')}), "
+                          f"reintento {attempt + 1}/{API_MAX_RETRIES} en {delay:.2f}s")
+                time.sleep(delay)
+                continue
+
+            response.raise_for_status()
+            return response
+
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            if attempt == API_MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt)
+            log_error(f"Error de conexión con {url}: {e}. Reintento {attempt + 1}/{API_MAX_RETRIES} en {delay:.2f}s")
+            time.sleep(delay)
@@ -0,0 +1,128 @@
+# IMPORTS
+import os.path
+import threading
+import time
+from dotenv import load_dotenv
+from utils.utils import log_error
+
+load_dotenv()
+# Límite de solicitudes por segundo al API (0 desactiva el límite) y ráfaga máxima permitida
+API_RATE_LIMIT = float(os.getenv("API_RATE_LIMIT", 10))
+API_RATE_BURST = int(os.getenv("API_RATE_BURST", 8))
+# Límites del tamaño de página y objetivos de latencia y tamaño de respuesta por página. Por defecto, el tamaño de
+# página no supera el `limit` configurado del endpoint, ya que el API puede limitar el número de registros por página
+API_PAGE_SIZE_MIN = int(os.getenv("API_PAGE_SIZE_MIN", 250))
+API_PAGE_SIZE_MAX = int(os.getenv("API_PAGE_SIZE_MAX")) if os.getenv("API_PAGE_SIZE_MAX") else None
+API_TARGET_LATENCY = float(os.getenv("API_TARGET_LATENCY", 1.0))
+API_MAX_PAGE_BYTES = int(os.getenv("API_MAX_PAGE_BYTES", 8 * 1024 * 1024))
+
+
+class TokenBucket:
+    """
+    Limitador de solicitudes de tipo token bucket, compartido entre hilos.
+
+    El bucket se rellena a razón de `rate` tokens por segundo hasta un máximo de `capacity`. Cada solicitud
+    consume un token; si no hay tokens disponibles, `acquire` espera lo justo hasta que se genere uno. Así se
+    respeta la cuota del API sin imponer una espera fija entre páginas.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Bloquea hasta que haya un token disponible y lo consume."""
+        if self.rate <= 0:
+            return
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+class AdaptivePageSize:
+    """
+    Ajusta en tiempo de ejecución el tamaño de página (`limit`) de un endpoint a partir de la latencia y del
+    tamaño en bytes de las respuestas observadas, dentro de los límites configurados.
+
+    Si una página tarda más de 1.5 veces `target_latency` o supera `max_bytes`, el tamaño se reduce a la mitad;
+    si tarda menos de la mitad de `target_latency` y el doble de su tamaño cabe en `max_bytes`, se duplica. El tamaño
+    máximo es, por defecto, el tamaño inicial, y se reduce si el API devuelve menos registros de los pedidos en una
+    página que no es la última (ver `cap`).
+    """
+
+    def __init__(self, initial, min_size=API_PAGE_SIZE_MIN, max_size=API_PAGE_SIZE_MAX,
+                 target_latency=API_TARGET_LATENCY, max_bytes=API_MAX_PAGE_BYTES):
+        max_size = initial if max_size is None else max_size
+        self.min_size = min(min_size, max_size)
+        self.max_size = max_size
+        self.target_latency = target_latency
+        self.max_bytes = max_bytes
+        self.limit = self._clamp(initial)
+        self.lock = threading.Lock()
+
+    def _clamp(self, limit):
+        return int(min(self.max_size, max(self.min_size, limit)))
+
+    def observe(self, limit, latency, nbytes):
+        """
+        Registra la latencia y el tamaño de una página descargada con `limit` registros y recalcula el tamaño.
+
+        Args:
+            limit (int): El tamaño de página con el que se hizo la solicitud.
+            latency (float): Segundos transcurridos hasta recibir la respuesta.
+            nbytes (int): Tamaño en bytes del cuerpo de la respuesta.
+
+        Returns:
+            int: El nuevo tamaño de página.
+        """
+        with self.lock:
+            if latency > 1.5 * self.target_latency or nbytes > self.max_bytes:
+                new_limit = self._clamp(limit // 2)
+            elif latency < 0.5 * self.target_latency and nbytes * 2 <= self.max_bytes:
+                new_limit = self._clamp(limit * 2)
+            else:
+                new_limit = self.limit
+
+            if new_limit != self.limit:
+                log_error(f"Tamaño de página ajustado de {self.limit} a {new_limit} "
+                          f"(latencia {latency:.2f}s, {nbytes} bytes)")
+                self.limit = new_limit
+
+            return self.limit
+
+    def cap(self, size):
+        """
+        Limita el tamaño de página al máximo de registros por página que devuelve el API, observado en una página
+        incompleta que no era la última.
+
+        Args:
+            size (int): El número de registros recibidos en esa página.
+
+        Returns:
+            int: El nuevo tamaño de página.
+        """
+        with self.lock:
+            if 0 < size < self.max_size:
+                log_error(f"El API devuelve como máximo {size} registros por página: se limita el tamaño de página")
+                self.max_size = size
+                self.min_size = min(self.min_size, size)
+                self.limit = self._clamp(self.limit)
+            return self.limit
+
+
+# Limitador compartido por todas las extracciones del API, ya que la cuota es del API y no de cada endpoint
+API_RATE_LIMITER = TokenBucket(API_RATE_LIMIT, API_RATE_BURST)
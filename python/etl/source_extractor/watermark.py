@@ -0,0 +1,95 @@
+# IMPORTS
+import json
+import os.path
+import threading
+import pandas as pd
+from dotenv import load_dotenv
+from utils.utils import log_error
+
+load_dotenv()
+DESTINATION_PATH = os.getenv("DESTINATION_PATH")
+# Archivo JSON donde se guarda la marca de agua (high-water mark) de cada endpoint
+WATERMARK_PATH = os.getenv("WATERMARK_PATH") or os.path.join(DESTINATION_PATH, "_watermarks.json")
+
+_watermark_lock = threading.Lock()
+
+
+def _read_watermarks():
+    if not os.path.exists(WATERMARK_PATH):
+        return {}
+    with open(WATERMARK_PATH, "r") as f:
+        return json.load(f)
+
+
+def load_watermark(endpoint):
+    """
+    Devuelve la marca de agua guardada para un endpoint.
+
+    Args:
+        endpoint (str): El nombre del endpoint de la API.
+
+    Returns:
+        str or None: El valor máximo de la columna de marca de agua en la última extracción correcta, o `None`
+                     si el endpoint nunca se ha extraído (o el archivo no se puede leer).
+    """
+    try:
+        with _watermark_lock:
+            return _read_watermarks().get(endpoint)
+    except (OSError, ValueError) as e:
+        log_error(f"Error al leer las marcas de agua de {WATERMARK_PATH}: {e}")
+        return None
+
+
+def save_watermark(endpoint, value):
+    """
+    Guarda la marca de agua de un endpoint, sin modificar la del resto de endpoints.
+
+    La escritura se hace sobre un archivo temporal que después se renombra, de modo que una ejecución
+    interrumpida nunca deja el archivo de marcas de agua a medias.
+
+    Args:
+        endpoint (str): El nombre del endpoint de la API.
+        value (str): El nuevo valor de la marca de agua.
+    """
+    try:
+        with _watermark_lock:
+            watermarks = _read_watermarks()
+            watermarks[endpoint] = value
+
+            tmp_path = f"{WATERMARK_PATH}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(watermarks, f, indent=4)
+            os.replace(tmp_path, WATERMARK_PATH)
+
+        log_error(f"Marca de agua de {endpoint} actualizada a {value}")
+    except (OSError, ValueError) as e:
+        log_error(f"Error al guardar la marca de agua de {endpoint} en {WATERMARK_PATH}: {e}")
+
+
+def max_watermark(values, current=None):
+    """
+    Calcula la nueva marca de agua a partir de los valores de la columna de marca de agua de un bloque de datos.
+
+    Args:
+        values (pd.Series or list): Valores de la columna de marca de agua (fechas o identificadores).
+        current (str, optional): Marca de agua acumulada hasta el momento.
+
+    Returns:
+        str or None: El mayor valor entre `values` y `current`, o `current` si `values` no contiene valores válidos.
+    """
+    values = pd.Series(values).dropna()
+    if values.empty:
+        return current
+
+    if pd.api.types.is_numeric_dtype(values):
+        candidate = values.max()
+        if current is not None:
+            candidate = max(candidate, type(candidate)(current))
+        return str(candidate)
+
+    parsed = pd.to_datetime(values, errors='coerce').max()
+    if pd.isnull(parsed):
+        return current
+    if current is not None:
+        parsed = max(parsed, pd.Timestamp(current))
+    return str(parsed)
@@ -1,13 +1,18 @@
 import os.path
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 import threading
-from etl.transform_methods.read_data import read_data
-from etl.transform_methods.clean_data import clean_data
-from etl.transform_methods.filter_data import filter_data
-from etl.transform_methods.transform_all_sources import transform_all_sources
-from etl.transform_methods.generate_business_key import generate_business_key
-from etl.transform_methods.generate_hash import generate_hash
-from utils.utils import set_audit_columns
+import numpy as np
+import pandas as pd
+from etl.transform_methods.read_data import read_data, iter_data, unify_chunk_dtypes
+from etl.transform_methods.clean_data import compute_column_means
+from etl.transform_methods.transform_state import (bronze_row_hashes, column_means, changed_means, rows_with_nulls,
+                                                   load_transform_state, save_transform_state)
+from etl.transform_methods.deduplicate import deduplicate_source, StreamDeduplicator
+from etl.engines import get_engine, use_sql_engine
+from query.PostgreSQL.CREATE.schema_registry import is_low_cardinality
+from utils.utils import set_audit_columns, append_audit_chunk, build_output_path, resolve_layer_path, LayerWriter
 from dotenv import load_dotenv
 
 from utils.utils import log_error
@@ -16,6 +21,17 @@ load_dotenv()
 
 EXTRACT_PATH = os.getenv("DESTINATION_PATH")
 TRANSFORM_PATH = os.getenv("TRANSFORMED_PATH")
+# Backend de ejecución de las fuentes: 'thread' (un hilo por fuente) o 'process' (pool de procesos)
+TRANSFORM_BACKEND = os.getenv("TRANSFORM_BACKEND", "thread")
+TRANSFORM_WORKERS = int(os.getenv("TRANSFORM_WORKERS", os.cpu_count() or 1))
+# Número de filas de cada bloque en la transformación por bloques (0 para transformar cada archivo entero)
+TRANSFORM_CHUNKSIZE = int(os.getenv("TRANSFORM_CHUNKSIZE") or 0)
+# Número de bloques de filas en que se reparte cada fuente grande para transformarla en paralelo (0 o 1: sin reparto)
+TRANSFORM_SHARDS = int(os.getenv("TRANSFORM_SHARDS") or 0)
+# Número mínimo de filas de una fuente para repartirla en bloques
+TRANSFORM_SHARD_MIN_ROWS = int(os.getenv("TRANSFORM_SHARD_MIN_ROWS", 100000))
+# Si es 'true', solo se transforman las filas bronze nuevas o modificadas desde la última transformación
+TRANSFORM_INCREMENTAL = os.getenv("TRANSFORM_INCREMENTAL", "false").lower() == "true"
 
 
 transform_sources = {
@@ -42,6 +58,248 @@ transform_sources = {
 }
 log_error(transform_sources.values())
 
+def transform_chunk(df, file_type, means=None):
+    """
+    Aplica a un DataFrame (un archivo entero o un bloque de filas) la cadena de transformaciones de su tipo de
+    archivo: limpieza, filtrado, transformaciones específicas, `business_key` y `hash`, con el motor de
+    `TRANSFORM_ENGINE` (ver `get_engine`).
+
+    Args:
+        df (pd.DataFrame): Los datos leídos de la capa bronze.
+        file_type (str): El tipo de archivo de los datos.
+        means (dict, optional): Medias precalculadas para imputar los nulos (ver `compute_column_means`).
+
+    Returns:
+        pd.DataFrame: Los datos transformados, sin las columnas de auditoría.
+    """
+    return get_engine().transform(df, file_type, means)
+
+
+def profile_source(info, chunksize=TRANSFORM_CHUNKSIZE):
+    """
+    Primera pasada de la transformación por bloques: recorre el archivo de una fuente para calcular las medias de
+    sus columnas numéricas y los tipos de las columnas cuyo tipo inferido cambia entre bloques.
+
+    Args:
+        info (dict): La información de la fuente (ruta del archivo y tipo de archivo).
+        chunksize (int, optional): Número de filas de cada bloque. Por defecto, `TRANSFORM_CHUNKSIZE`.
+
+    Returns:
+        tuple: Las medias por columna (ver `compute_column_means`) y los tipos de lectura (ver `unify_chunk_dtypes`).
+    """
+    column_dtypes = {}
+
+    def chunks():
+        for chunk in iter_data(info['source'], chunksize, info['file_type']):
+            for column, dtype in chunk.dtypes.items():
+                column_dtypes.setdefault(column, set()).add(dtype)
+            yield chunk
+
+    means = compute_column_means(chunks())
+    return means, unify_chunk_dtypes(column_dtypes)
+
+
+def transform_source_chunked(source, info, results, chunksize=TRANSFORM_CHUNKSIZE):
+    """
+    Transforma una fuente por bloques de `chunksize` filas, sin cargar el archivo entero en memoria, y añade cada
+    bloque transformado al archivo de la capa silver.
+
+    Se hacen dos pasadas sobre el archivo de origen: en la primera (`profile_source`) se calculan las medias de las
+    columnas numéricas y los tipos del archivo completo, y en la segunda cada bloque se lee con esos tipos y pasa
+    por `transform_chunk` con esas medias, de modo que el resultado es el mismo que al transformar el archivo entero. El archivo se escribe con un nombre
+    temporal y se renombra al terminar, para no dejar un archivo a medias si la transformación falla.
+
+    Args:
+        source (str): El nombre de la fuente de datos que está siendo transformada.
+        info (dict): La información de la fuente (ruta del archivo y tipo de archivo).
+        results (dict): Un diccionario para almacenar el estado de la transformación para cada fuente.
+        chunksize (int, optional): Número de filas de cada bloque. Por defecto, `TRANSFORM_CHUNKSIZE`.
+    """
+    file_path = build_output_path(source, 'transformed', TRANSFORM_PATH)
+    root, extension = os.path.splitext(file_path)
+    part_path = f"{root}.part{extension}"
+    try:
+        means, dtypes = profile_source(info, chunksize)
+
+        extract_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        deduplicator = StreamDeduplicator(source)
+        with LayerWriter(part_path) as writer:
+            for chunk in iter_data(info['source'], chunksize, info['file_type'], dtypes):
+                df_hash = deduplicator.filter(transform_chunk(chunk, info['file_type'], means))
+                append_audit_chunk(df_hash, source, extract_date, 'transformed', writer)
+        rows = deduplicator.finish(part_path, chunksize)
+
+        os.replace(part_path, file_path)
+        results[source] = "Transformación completa"
+        log_error(f"Transformación por bloques completa para {source}: {rows} filas guardadas en {file_path}")
+
+    except Exception as e:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        results[source] = f"Error: {str(e)}"
+        log_error(f"Error al transformar {source} por bloques: {str(e)}")
+
+
+def transform_source_sql(source, info, results):
+    """
+    Transforma una fuente con el motor SQL de DuckDB (`TRANSFORM_ENGINE=duckdb`): la cadena de transformaciones
+    se ejecuta como consultas sobre el archivo bronze, sin cargarlo en memoria, y el resultado se escribe
+    directamente en la capa silver. Como en la transformación por bloques, el archivo se escribe con un nombre
+    temporal y se renombra al terminar.
+
+    Args:
+        source (str): El nombre de la fuente de datos que está siendo transformada.
+        info (dict): La información de la fuente (ruta del archivo y tipo de archivo).
+        results (dict): Un diccionario para almacenar el estado de la transformación para cada fuente.
+    """
+    from etl.engines.duckdb_engine import transform_file_sql
+
+    file_path = build_output_path(source, 'transformed', TRANSFORM_PATH)
+    root, extension = os.path.splitext(file_path)
+    part_path = f"{root}.part{extension}"
+    try:
+        source_path = resolve_layer_path(os.path.join(EXTRACT_PATH, info['source']))
+        extract_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        rows = transform_file_sql(source_path, info['file_type'], part_path, source, extract_date)
+
+        os.replace(part_path, file_path)
+        results[source] = "Transformación completa"
+        log_error(f"Transformación con DuckDB completa para {source}: {rows} filas guardadas en {file_path}")
+
+    except Exception as e:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        results[source] = f"Error: {str(e)}"
+        log_error(f"Error al transformar {source} con DuckDB: {str(e)}")
+
+
+def concat_transformed(frames):
+    """
+    Une en un solo DataFrame varias partes de una fuente transformadas por separado (filas reutilizadas de la
+    última transformación o bloques transformados en paralelo).
+
+    Las columnas de texto cuyo tipo depende de los datos de cada parte (`category` o `string`, según su número de
+    valores distintos en `filter_data`, o categorías distintas) se vuelven a tipar con la misma regla sobre la
+    columna completa, de modo que el resultado tiene los mismos tipos que al transformar la fuente entera.
+
+    Args:
+        frames (list): Las partes transformadas, con las mismas columnas.
+
+    Returns:
+        pd.DataFrame: Todas las filas de las partes, en el orden de `frames`.
+    """
+    frames = [frame for frame in frames if not frame.empty] or frames[:1]
+    if len(frames) == 1:
+        return frames[0]
+
+    columns = frames[0].columns
+    df = pd.concat([frame[columns] for frame in frames])
+    for column in columns:
+        dtypes = [frame[column].dtype for frame in frames]
+        if df[column].dtype != object or all(dtype == object for dtype in dtypes):
+            continue
+        if all(isinstance(dtype, pd.CategoricalDtype) for dtype in dtypes):
+            df[column] = df[column].astype('category')
+        elif all(isinstance(dtype, (pd.CategoricalDtype, pd.StringDtype)) for dtype in dtypes):
+            df[column] = df[column].astype('category' if is_low_cardinality(df[column]) else 'string')
+    return df
+
+
+def transform_source_incremental(source, info, results):
+    """
+    Transforma una fuente de forma incremental: solo las filas bronze nuevas o modificadas desde la última
+    transformación pasan por `transform_chunk`, y el resto se toman tal cual del archivo anterior de la capa silver.
+
+    Cada fila bronze se identifica por una huella de su contenido (`bronze_row_hashes`), que se guarda junto a la
+    capa silver (`save_transform_state`). Las medias para imputar los nulos se calculan sobre el archivo completo,
+    como en la transformación normal, y las filas con nulos en una columna cuya media ha cambiado se transforman de
+    nuevo. El resultado es el mismo que el de transformar el archivo entero, y el coste depende del
+    volumen de cambios y no del tamaño del archivo. Si la fuente no tiene estado, se transforman todas las filas.
+
+    Args:
+        source (str): El nombre de la fuente de datos que está siendo transformada.
+        info (dict): La información de la fuente (ruta del archivo y tipo de archivo).
+        results (dict): Un diccionario para almacenar el estado de la transformación para cada fuente.
+    """
+    try:
+        df = read_data(info['source'], info['file_type'])
+        hashes = bronze_row_hashes(df)
+        means = column_means(df)
+
+        reuse = pd.Series(False, index=df.index)
+        previous = load_transform_state(source, info['file_type'])
+        if previous is not None:
+            silver, silver_hashes, previous_means = previous
+            # Posición en la capa silver anterior de cada huella (la primera, si se repite)
+            positions = pd.Series(np.arange(len(silver_hashes)), index=silver_hashes.to_numpy())
+            positions = positions[~positions.index.duplicated()]
+            reuse = hashes.isin(positions.index) & ~rows_with_nulls(df, changed_means(means, previous_means))
+
+        changed = transform_chunk(df[~reuse].copy(), info['file_type'], means)
+        if reuse.any():
+            unchanged = silver.iloc[positions[hashes[reuse]].to_numpy()].set_axis(df.index[reuse])
+            df_hash = concat_transformed([changed, unchanged]).sort_index(kind='stable')
+        else:
+            df_hash = changed
+        df_hash = deduplicate_source(source, df_hash)
+
+        extract_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        if set_audit_columns(df_hash, source, extract_date, 'transformed', TRANSFORM_PATH) is None:
+            raise ValueError(f"No se pudo guardar la transformación de {source}")
+        save_transform_state(source, info['file_type'], build_output_path(source, 'transformed', TRANSFORM_PATH),
+                             df_hash, hashes[df_hash.index], means)
+
+        results[source] = "Transformación completa"
+        log_error(f"Transformación incremental completa para {source}: {len(changed)} filas nuevas o modificadas "
+                  f"transformadas y {int(reuse.sum())} filas sin cambios reutilizadas")
+
+    except Exception as e:
+        results[source] = f"Error: {str(e)}"
+        log_error(f"Error al transformar {source} de forma incremental: {str(e)}")
+
+
+def process_pool(max_workers):
+    """
+    Crea un pool de procesos que se inician con 'spawn' en lugar de 'fork'. Los pools se crean desde los hilos de
+    las fuentes (`TRANSFORM_BACKEND=thread`): un `fork` copiaría los locks (por ejemplo, el del logging) tomados en
+    ese momento por otro hilo y el proceso hijo se quedaría bloqueado esperándolos.
+
+    Args:
+        max_workers (int): Número máximo de procesos del pool.
+
+    Returns:
+        ProcessPoolExecutor: El pool de procesos.
+    """
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def transform_shards(df, file_type, shards=TRANSFORM_SHARDS, max_workers=TRANSFORM_WORKERS):
+    """
+    Transforma un DataFrame repartiendo sus filas en `shards` bloques que se procesan en paralelo en un pool de
+    procesos, y une los resultados (ver `concat_transformed`).
+
+    Las estadísticas globales (las medias para imputar los nulos) se calculan una sola vez sobre todas las filas
+    antes del reparto, de modo que el resultado es el mismo que al transformar el DataFrame entero.
+
+    Args:
+        df (pd.DataFrame): Los datos leídos de la capa bronze.
+        file_type (str): El tipo de archivo de los datos.
+        shards (int, optional): Número de bloques. Por defecto, `TRANSFORM_SHARDS`.
+        max_workers (int, optional): Número máximo de procesos del pool. Por defecto, `TRANSFORM_WORKERS`.
+
+    Returns:
+        pd.DataFrame: Los datos transformados, sin las columnas de auditoría.
+    """
+    means = column_means(df)
+    bounds = np.linspace(0, len(df), shards + 1).astype(int)
+    parts = [df.iloc[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+
+    with process_pool(max(1, min(max_workers, shards))) as executor:
+        transformed = list(executor.map(transform_chunk, parts, [file_type] * len(parts), [means] * len(parts)))
+
+    return concat_transformed(transformed)
+
+
 def transform_source(source, info, results):
     """
      Realiza la transformación de una fuente de datos y almacena el resultado en el diccionario `results`.
@@ -49,7 +307,12 @@ def transform_source(source, info, results):
     Esta función toma una fuente de datos, lee los datos desde el archivo correspondiente, los limpia,
     los filtra, aplica las transformaciones necesarias y genera las columnas de auditoría. También calcula
     el `business_key` y el `hash` para los datos transformados, y luego almacena el estado de la transformación
-    en el diccionario `results`.
+    en el diccionario `results`. Si `TRANSFORM_ENGINE` es 'duckdb', la fuente se transforma con consultas SQL
+    (`transform_source_sql`); si `TRANSFORM_INCREMENTAL` está activo, solo se transforman las filas nuevas o
+    modificadas (`transform_source_incremental`), y si `TRANSFORM_CHUNKSIZE` es mayor que 0, por bloques con
+    `transform_source_chunked`. Las fuentes de al menos `TRANSFORM_SHARD_MIN_ROWS` filas se reparten en
+    `TRANSFORM_SHARDS` bloques que se transforman en paralelo (`transform_shards`). En todos los modos, antes de
+    escribir la capa silver se conserva solo la última versión de cada clave primaria (`deduplicate_source`).
 
     Args:
         source (str): El nombre de la fuente de datos que está siendo transformada.
@@ -60,14 +323,26 @@ def transform_source(source, info, results):
     Returns:
         None: La función no retorna un valor. El estado de la transformación se almacena en el diccionario `results`.
     """
-    try:
-        df = read_data(info['source'])
-        df_cleaned = clean_data(df)
-        df_filtered = filter_data(df_cleaned, info['file_type'])
-        df_transformed = transform_all_sources(df_filtered, info['file_type'])
+    if use_sql_engine():
+        transform_source_sql(source, info, results)
+        return
+
+    if TRANSFORM_INCREMENTAL:
+        transform_source_incremental(source, info, results)
+        return
+
+    if TRANSFORM_CHUNKSIZE > 0:
+        transform_source_chunked(source, info, results)
+        return
 
-        df_business_key = generate_business_key(df_transformed, info['file_type'])
-        df_hash = generate_hash(df_business_key, info['file_type'])
+    try:
+        df = read_data(info['source'], info['file_type'])
+        if TRANSFORM_SHARDS > 1 and len(df) >= TRANSFORM_SHARD_MIN_ROWS:
+            df_hash = transform_shards(df, info['file_type'])
+        else:
+            df_hash = transform_chunk(df, info['file_type'], column_means(df))
+        # Conservar solo la última versión de cada clave primaria
+        df_hash = deduplicate_source(source, df_hash)
 
         # Agregar las columnas de auditoría
         extract_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -79,25 +354,35 @@ def transform_source(source, info, results):
         results[source] = f"Error: {str(e)}"
         log_error(f"Error al transformar {source}: {str(e)}")
 
-def transform():
+def run_transform_source(source, info):
     """
-    Realiza la transformación de todas las fuentes de datos de manera paralela usando hilos.
+    Ejecuta `transform_source` para una fuente en un proceso del pool y devuelve el estado de la transformación.
 
-    Esta función coordina la transformación de varias fuentes de datos en paralelo. Para cada fuente, se
-    crea un hilo que ejecuta la función `transform_source`. Al final, la función espera que todos los hilos
-    terminen y luego imprime los resultados de la transformación para cada fuente.
+    El diccionario de resultados no se comparte entre procesos, por lo que el estado se devuelve como
+    resultado de la tarea.
 
-    El diccionario `results` se usa para almacenar el estado de la transformación de cada fuente de datos.
+    Args:
+        source (str): El nombre de la fuente de datos que está siendo transformada.
+        info (dict): La información de la fuente (ruta del archivo y tipo de archivo).
 
     Returns:
-        None: La función no retorna un valor. Los resultados de la transformación se imprimen al final.
+        str: El estado de la transformación de la fuente.
     """
-    log_error("Transformando los datos...")
-
-    # Diccionario para almacenar los resultados de los hilos
     results = {}
+    transform_source(source, info, results)
+    return results[source]
+
 
-    # Lista de hilos
+def transform_with_threads(results):
+    """
+    Transforma todas las fuentes en paralelo con un hilo por fuente.
+
+    Es adecuado para entradas pequeñas: el trabajo de pandas retiene el GIL, por lo que con archivos grandes
+    las fuentes se ejecutan prácticamente una tras otra.
+
+    Args:
+        results (dict): Un diccionario para almacenar el estado de la transformación para cada fuente.
+    """
     threads = []
 
     # Se crea un hilo para cada fuente de datos
@@ -110,6 +395,57 @@ def transform():
     for thread in threads:
         thread.join()
 
+
+def transform_with_processes(results, max_workers=TRANSFORM_WORKERS):
+    """
+    Transforma todas las fuentes en paralelo con un pool de procesos, de forma que las fuentes se reparten
+    entre los núcleos disponibles sin competir por el GIL.
+
+    Args:
+        results (dict): Un diccionario para almacenar el estado de la transformación para cada fuente.
+        max_workers (int, optional): Número máximo de procesos del pool.
+    """
+    max_workers = max(1, min(max_workers, len(transform_sources)))
+
+    with process_pool(max_workers) as executor:
+        futures = {
+            executor.submit(run_transform_source, source, info): source
+            for source, info in transform_sources.items()
+        }
+
+        for future in as_completed(futures):
+            source = futures[future]
+            try:
+                results[source] = future.result()
+            except Exception as e:
+                results[source] = f"Error: {str(e)}"
+                log_error(f"Error al transformar {source} en el pool de procesos: {str(e)}")
+
+
+def transform():
+    """
+    Realiza la transformación de todas las fuentes de datos de manera paralela.
+
+    Esta función coordina la transformación de varias fuentes de datos en paralelo. Según `TRANSFORM_BACKEND`,
+    cada fuente se transforma en un hilo (`thread`, adecuado para entradas pequeñas) o en un proceso de un pool
+    de `TRANSFORM_WORKERS` procesos (`process`, que reparte las fuentes entre núcleos). Al final, la función
+    espera que todas las fuentes terminen y luego imprime los resultados de la transformación para cada fuente.
+
+    El diccionario `results` se usa para almacenar el estado de la transformación de cada fuente de datos.
+
+    Returns:
+        None: La función no retorna un valor. Los resultados de la transformación se imprimen al final.
+    """
+    log_error("Transformando los datos...")
+
+    # Diccionario para almacenar los resultados de cada fuente
+    results = {}
+
+    if TRANSFORM_BACKEND == "process":
+        transform_with_processes(results)
+    else:
+        transform_with_threads(results)
+
     # Se procesan los resultados
     for source, result in results.items():
         log_error(f"{source}: {result}")
@@ -1,5 +1,9 @@
+import numpy as np
 import pandas as pd
 
+# Valores posibles de 'PassengerJourneyCharge', guardados como categoría
+CHARGE_STATUS_DTYPE = pd.CategoricalDtype(['Charged', 'Not Charged'])
+
 def assign_passenger_journey_charge(df: pd.DataFrame, charge_column: str) -> pd.DataFrame:
     """
     Asigna un valor a la columna 'PassengerJourneyCharge' basado en los valores de una columna de cargos.
@@ -7,6 +11,7 @@ def assign_passenger_journey_charge(df: pd.DataFrame, charge_column: str) -> pd.
     Esta función agrega una nueva columna al DataFrame, llamada 'PassengerJourneyCharge'.
     Los valores de esta columna son determinados por los valores de la columna indicada por `charge_column`.
     Si el valor en `charge_column` es mayor que 0, se asigna 'Charged', de lo contrario se asigna 'Not Charged'.
+    La columna se guarda como categoría (`CHARGE_STATUS_DTYPE`).
 
     Args:
         df (pd.DataFrame): El DataFrame al que se le añadirá la nueva columna 'PassengerJourneyCharge'.
@@ -16,5 +21,7 @@ def assign_passenger_journey_charge(df: pd.DataFrame, charge_column: str) -> pd.
         pd.DataFrame: El DataFrame modificado con la nueva columna 'PassengerJourneyCharge'.
     """
     if charge_column in df.columns:
-        df['PassengerJourneyCharge'] = df[charge_column].apply(lambda x: 'Charged' if x > 0 else 'Not Charged')
+        charged = df[charge_column].gt(0).fillna(False).to_numpy(dtype=bool)
+        df['PassengerJourneyCharge'] = pd.Series(np.where(charged, 'Charged', 'Not Charged'), index=df.index,
+                                                 dtype=CHARGE_STATUS_DTYPE)
     return df
\ No newline at end of file
@@ -3,6 +3,36 @@ import pandas as pd
 
 from utils.utils import log_error
 
+# Año centinela usado en origen para las fechas de nacimiento desconocidas (9999-12-31)
+DOB_SENTINEL_YEAR = 9999
+
+
+def parse_birth_year(dob: pd.Series) -> pd.Series:
+    """
+    Obtiene el año de nacimiento (los cuatro primeros caracteres) de una columna de fechas de nacimiento.
+
+    El parseo se hace sobre los valores únicos de la columna (`pd.factorize`) y el resultado se expande al resto
+    de filas, ya que las fechas de nacimiento se repiten mucho. Los valores nulos, los que no son texto y los que
+    no empiezan por un número devuelven `NaN`.
+
+    Args:
+        dob (pd.Series): La columna de fechas de nacimiento.
+
+    Returns:
+        pd.Series: El año de nacimiento de cada fila como float, con `NaN` si no es válido.
+    """
+    codes, uniques = pd.factorize(dob, use_na_sentinel=True)
+    uniques = pd.Series(uniques, dtype=object)
+
+    # Solo los valores de texto tienen año; el resto (números, booleanos...) se tratan como mal formados
+    prefixes = uniques.where(uniques.map(type) == str).str.slice(0, 4).str.strip()
+    prefixes = prefixes.where(prefixes.str.fullmatch(r'[+-]?\d+', na=False))
+    unique_years = pd.to_numeric(prefixes, errors='coerce').to_numpy(dtype=float)
+
+    # El código -1 corresponde a los nulos
+    years = np.append(unique_years, np.nan)[codes]
+    return pd.Series(years, index=dob.index)
+
 
 def calculate_age(df: pd.DataFrame, dob_column: str):
     """
@@ -12,6 +42,10 @@ def calculate_age(df: pd.DataFrame, dob_column: str):
     el valor correspondiente a la nueva columna 'age'. También asigna un valor booleano a la columna 'IsAdult',
     indicando si la persona es adulta (mayor o igual a 18 años).
 
+    El cálculo es vectorizado: el año se obtiene en bloque con `parse_birth_year` y la edad y 'IsAdult' se calculan
+    con operaciones de columna. El centinela `9999-12-31` y los valores nulos o mal formados dan una edad nula e
+    'IsAdult' igual a False; las filas mal formadas se informan con un único mensaje con su recuento.
+
     Args:
         df (pd.DataFrame): El DataFrame que contiene la columna de fechas de nacimiento.
         dob_column (str): El nombre de la columna en el DataFrame que contiene las fechas de nacimiento.
@@ -27,31 +61,17 @@ def calculate_age(df: pd.DataFrame, dob_column: str):
     # Obtener el año actual
     current_year = pd.to_datetime("today").year
 
-    df['age'] = np.nan
-    df['IsAdult'] = False
-
-    for index, row in df.iterrows():
-        dob = row[dob_column]
-
-        if dob == '9999-12-31':
-            df.at[index, 'age'] = np.nan
-            df.at[index, 'IsAdult'] = False
-        else:
-            try:
-                birth_year = int(dob[:4])  # Tomar solo los primeros 4 caracteres (año)
+    birth_year = parse_birth_year(df[dob_column])
 
-                if birth_year != 9999:
-                    age = current_year - birth_year
-                    df.at[index, 'age'] = int(age)
+    invalid_rows = int(birth_year.isna().sum())
+    if invalid_rows:
+        log_error(f"{invalid_rows} filas con {dob_column} nulo o mal formado: se asigna age nulo e IsAdult False.")
 
-                    if df.at[index, 'age'] >= 18:
-                        df.at[index, 'IsAdult'] = True
-                    else:
-                        df.at[index, 'IsAdult'] = False
-            except Exception as e:
-                log_error(f"Error al procesar el valor {dob} en la fila {index}: {e}")
+    birth_year = birth_year.where(birth_year != DOB_SENTINEL_YEAR)
+    age = current_year - birth_year
 
-    df['IsAdult'] = df['IsAdult'].astype(bool)
-    df['age'] = pd.to_numeric(df['age'], errors='coerce', downcast='integer')
+    # Siempre decimal (DECIMAL en la tabla): el tipo no depende de si hay filas sin edad, p. ej. entre bloques
+    df['age'] = age.astype('float64')
+    df['IsAdult'] = (age >= 18).astype(bool)
 
     return df
@@ -1,4 +1,5 @@
 import pandas as pd
+from etl.transform_methods.parse_datetime import parse_datetime
 
 def calculate_time_to_modify(df: pd.DataFrame, created_column: str, modified_column: str):
     """
@@ -6,7 +7,7 @@ def calculate_time_to_modify(df: pd.DataFrame, created_column: str, modified_col
 
     Esta función toma dos columnas de fechas (creación y modificación) en un DataFrame y calcula la diferencia
     entre las fechas en términos de tiempo (en formato `timedelta`). El resultado se guarda en una nueva columna
-    llamada 'TimeToModify'.
+    llamada 'TimeToModify'. Las columnas que ya son de tipo fecha no se vuelven a parsear.
 
     Args:
         df (pd.DataFrame): El DataFrame que contiene las columnas de fechas de creación y modificación.
@@ -17,10 +18,10 @@ def calculate_time_to_modify(df: pd.DataFrame, created_column: str, modified_col
         pd.DataFrame: El DataFrame original con la nueva columna 'TimeToModify', que contiene la diferencia
                        de tiempo entre la fecha de modificación y la fecha de creación para cada registro.
     """
-    if 'CreatedDate' in df.columns:
-        df['CreatedDate'] = pd.to_datetime(df[created_column], errors='coerce')
-    if 'ModifiedDate' in df.columns:
-        df['ModifiedDate'] = pd.to_datetime(df[modified_column], errors='coerce')
+    # Las columnas ya convertidas por `filter_data` se reutilizan sin volver a parsearlas
+    for column in (created_column, modified_column):
+        if column in df.columns and not pd.api.types.is_datetime64_any_dtype(df[column]):
+            df[column] = parse_datetime(df[column])
 
     df['TimeToModify'] = (df[modified_column] - df[created_column])
 
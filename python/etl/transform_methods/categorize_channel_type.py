@@ -13,13 +13,17 @@ channel_type_map = {
     7: 'NDC'
 }
 
+# Las categorías de 'ChannelType' son las etiquetas del mapa, de modo que la columna se guarda codificada
+CHANNEL_TYPE_DTYPE = pd.CategoricalDtype(list(channel_type_map.values()))
+
 def categorize_channel_type(df: pd.DataFrame, column: str):
     """
     Categoriza los valores de una columna en el DataFrame según un mapa predefinido.
 
     Esta función toma una columna de un DataFrame y mapea sus valores a nuevas categorías basadas
     en un diccionario predefinido (`channel_type_map`). Los valores de la columna se reemplazan con
-    sus correspondientes valores mapeados y luego se convierten en tipo `str`.
+    sus correspondientes valores mapeados y se guardan como categoría (`CHANNEL_TYPE_DTYPE`); los códigos
+    que no están en el mapa quedan como nulos.
 
     Args:
         df (pd.DataFrame): El DataFrame que contiene la columna que se desea categorizar.
@@ -32,8 +36,11 @@ def categorize_channel_type(df: pd.DataFrame, column: str):
         log_error(f"Error: La columna {column} no está presente en el DataFrame.")
         return df
 
-    # Mapear los valores de 'ChannelType' a sus correspondientes valores numéricos
-    df[column] = df[column].map(channel_type_map).astype(str)
+    # Mapear los valores numéricos de 'ChannelType' a sus correspondientes categorías
+    codes = df[column]
+    if not pd.api.types.is_numeric_dtype(codes):
+        codes = pd.to_numeric(codes.astype(object), errors='coerce')
+    df[column] = codes.map(channel_type_map).astype(CHANNEL_TYPE_DTYPE)
 
     log_error(f"Categorías aplicadas correctamente a la columna {column}")
     return df
\ No newline at end of file
@@ -1,3 +1,4 @@
+import math
 import os.path
 import pandas as pd
 import numpy as np
@@ -9,7 +10,92 @@ load_dotenv()
 
 EXTRACT_PATH = os.getenv("DESTINATION_PATH")
 
-def clean_data(df: pd.DataFrame):
+def strip_categories(column: pd.Series):
+    """
+    Elimina los espacios en blanco al inicio y al final de las categorías de una columna categórica.
+
+    Args:
+        column (pd.Series): La columna categórica.
+
+    Returns:
+        pd.Series: La columna con las categorías limpias. Si al limpiarlas dos categorías coinciden, se fusionan.
+    """
+    categories = column.cat.categories
+    if not pd.api.types.is_string_dtype(categories):
+        return column
+
+    stripped = categories.str.strip()
+    if stripped.is_unique:
+        return column.cat.rename_categories(stripped)
+    return column.astype(object).str.strip().astype('category')
+
+
+def number_values(column: pd.Series):
+    """Los valores no nulos de una columna numérica, como lista de `float`."""
+    return column.dropna().to_numpy(dtype=float).tolist()
+
+
+def column_mean(column: pd.Series):
+    """
+    Calcula la media de una columna numérica con una suma exacta (`math.fsum`), de modo que no depende del orden
+    de las filas ni de cómo se reparten en bloques (ver `compute_column_means`).
+
+    Args:
+        column (pd.Series): La columna numérica.
+
+    Returns:
+        float: La media de los valores no nulos (`NaN` si la columna no tiene valores).
+    """
+    values = number_values(column)
+    return math.fsum(values) / len(values) if values else np.nan
+
+
+def exact_sum_terms(values: list):
+    """
+    Descompone la suma exacta de unos valores en términos de coma flotante: el primero es `math.fsum(values)` y
+    cada uno de los siguientes, el redondeo de lo que aún falta. La suma exacta de los términos es la de los
+    valores, por lo que `math.fsum` de los términos de varios bloques es igual a `math.fsum` de todos sus valores.
+
+    Args:
+        values (list): Los valores (`float`).
+
+    Returns:
+        list: Los términos (normalmente uno o dos).
+    """
+    terms = []
+    while True:
+        term = math.fsum(values + [-t for t in terms])
+        if term != 0:
+            terms.append(term)
+        if term == 0 or not math.isfinite(term):
+            return terms
+
+
+def compute_column_means(chunks):
+    """
+    Calcula la media de cada columna numérica a partir de un conjunto de bloques de datos, sin tenerlos todos en
+    memoria a la vez. Se usa en la transformación por bloques para imputar los nulos con la media de todo el archivo.
+    Las sumas de los bloques se guardan sin redondear (ver `exact_sum_terms`), por lo que cada media es idéntica a
+    la de `column_mean` sobre el archivo completo.
+
+    Args:
+        chunks (iterable): Los bloques de datos (DataFrames) del archivo.
+
+    Returns:
+        dict: La media de cada columna numérica (`NaN` si la columna no tiene valores).
+    """
+    terms = {}
+    counts = {}
+    for chunk in chunks:
+        for col in chunk.select_dtypes(include=[np.number]).columns:
+            values = number_values(chunk[col])
+            terms.setdefault(col, []).extend(exact_sum_terms(values))
+            counts[col] = counts.get(col, 0) + len(values)
+
+    return {col: math.fsum(terms[col]) / counts[col] if counts[col] else np.nan for col in terms}
+
+
+def clean_data(df: pd.DataFrame, means: dict = None):
     """
     Limpia los datos de un DataFrame, eliminando filas con todos los valores nulos,
     imputando valores nulos en columnas numéricas con la media y limpiando espacios
@@ -17,11 +103,15 @@ def clean_data(df: pd.DataFrame):
 
     Esta función realiza una serie de operaciones de limpieza de datos sobre un DataFrame:
     1. Elimina las filas que contienen únicamente valores nulos.
-    2. Elimina los espacios en blanco al inicio y al final en las columnas de tipo cadena.
-    3. Imputa los valores nulos en las columnas numéricas con la media de la columna.
+    2. Elimina los espacios en blanco al inicio y al final en las columnas de tipo cadena y en las categorías
+       de las columnas categóricas.
+    3. Imputa los valores nulos en las columnas numéricas con la media de la columna (ver `column_mean`),
+       redondeada en las columnas enteras.
 
     Args:
         df (pd.DataFrame): El DataFrame que contiene los datos a limpiar.
+        means (dict, optional): Medias precalculadas por columna (ver `compute_column_means`). Si no se indican,
+                                se usa la media de cada columna del propio DataFrame.
 
     Returns:
         pd.DataFrame: El DataFrame después de haber sido limpiado.
@@ -32,14 +122,22 @@ def clean_data(df: pd.DataFrame):
     # Eliminar filas con todos los valores nulos
     df = df.dropna(axis=0, how='all')
 
-    str_cols = df.select_dtypes(include=[object]).columns
+    str_cols = df.select_dtypes(include=[object, 'string']).columns
     for col in str_cols:
         df[col] = df[col].str.strip()
 
-    # Imputación de valores nulos numéricos con la media
+    # En las columnas categóricas se limpian las categorías, no cada fila
+    cat_cols = df.select_dtypes(include=['category']).columns
+    for col in cat_cols:
+        df[col] = strip_categories(df[col])
+
+    # Imputación de valores nulos numéricos con la media (redondeada en las columnas enteras)
     num_cols = df.select_dtypes(include=[np.number]).columns
     for col in num_cols:
-        df[col] = df[col].fillna(df[col].mean())
+        mean = means[col] if means is not None and col in means else column_mean(df[col])
+        if pd.api.types.is_integer_dtype(df[col]) and pd.notna(mean):
+            mean = round(mean)
+        df[col] = df[col].fillna(mean)
 
     # Mostrar los valores nulos por columna después de la limpieza
     log_error("\nValores nulos por columna después de la limpieza:")
@@ -1,6 +1,14 @@
+import os.path
+from functools import lru_cache
+import numpy as np
 import pandas as pd
+from dotenv import load_dotenv
 from utils.utils import log_error
 
+load_dotenv()
+# CSV opcional con el histórico de tasas de cambio a EUR (columnas CurrencyCode, EffectiveDate y Rate)
+CURRENCY_RATES_PATH = os.getenv("CURRENCY_RATES_PATH")
+
 currency_exchange_rate = {
     "GBP": 0.85,
     "CHF": 0.92,
@@ -13,15 +21,130 @@ currency_exchange_rate = {
 }
 
 
-def convert_currency(df: pd.DataFrame, amount_column: str, currency_column: str, currency_exchange_rate: dict):
+@lru_cache(maxsize=None)
+def load_currency_rates(path=CURRENCY_RATES_PATH):
+    """
+    Carga el histórico de tasas de cambio a EUR, ordenado por fecha de entrada en vigor.
+
+    Cada fila indica la tasa (`Rate`) de una moneda (`CurrencyCode`) a partir de una fecha (`EffectiveDate`). El
+    resultado se cachea por ruta, de modo que el archivo se lee una sola vez por proceso.
+
+    Args:
+        path (str, optional): Ruta del CSV de tasas. Por defecto, `CURRENCY_RATES_PATH`.
+
+    Returns:
+        pd.DataFrame or None: Las tasas ordenadas por `EffectiveDate`, o None si no hay histórico configurado
+                              o no se puede leer.
+    """
+    if not path:
+        return None
+
+    try:
+        rates = pd.read_csv(path, usecols=['CurrencyCode', 'EffectiveDate', 'Rate'])
+        rates['CurrencyCode'] = rates['CurrencyCode'].astype(object)
+        rates['EffectiveDate'] = pd.to_datetime(rates['EffectiveDate'], errors='coerce').astype('datetime64[ns]')
+        rates['Rate'] = pd.to_numeric(rates['Rate'], errors='coerce')
+
+        rates = rates.dropna().sort_values('EffectiveDate', kind='stable').reset_index(drop=True)
+        log_error(f"Histórico de tasas de cambio cargado desde {path}: {len(rates)} tasas.")
+        return rates
+
+    except (OSError, ValueError) as e:
+        log_error(f"Error al leer el histórico de tasas de cambio {path}: {e}")
+        return None
+
+
+def use_dated_rates(currency_rates, date_column, columns):
+    """
+    Indica si los importes se convierten con el histórico de tasas: hace falta el histórico y la columna con la
+    fecha de cada importe. Si hay histórico pero falta la columna, se registra en el log, ya que todas las filas se
+    convierten con las tasas fijas de `currency_exchange_rate`.
+
+    Args:
+        currency_rates (pd.DataFrame): Histórico de tasas devuelto por `load_currency_rates`, o None.
+        date_column (str): El nombre de la columna con la fecha de cada importe.
+        columns: Las columnas de los datos.
+
+    Returns:
+        bool: True si se aplica el histórico de tasas.
+    """
+    if currency_rates is None:
+        return False
+    if date_column not in columns:
+        log_error(f"Error: Hay histórico de tasas de cambio ({CURRENCY_RATES_PATH}) pero falta la columna de fecha "
+                  f"{date_column}: los importes se convierten con las tasas fijas.")
+        return False
+    return True
+
+
+def round_amounts(amounts: pd.Series, decimals: int = 2):
+    """
+    Redondea una serie de importes con el mismo resultado que `round()` de Python, de forma vectorizada.
+
+    `Series.round` multiplica por 10**decimals antes de redondear, lo que puede desplazar un céntimo los importes
+    que quedan muy cerca de la mitad (por ejemplo, 33.235). Solo esas filas se redondean con `round()`.
+
+    Args:
+        amounts (pd.Series): Los importes a redondear.
+        decimals (int, optional): Número de decimales. Por defecto, 2.
+
+    Returns:
+        pd.Series: Los importes redondeados.
+    """
+    rounded = amounts.round(decimals)
+    scaled = amounts * 10 ** decimals
+    near_half = (scaled - np.floor(scaled) - 0.5).abs() < 1e-6
+
+    if near_half.any():
+        rounded[near_half] = [round(amount, decimals) for amount in amounts[near_half]]
+
+    return rounded
+
+
+def lookup_asof_rates(df: pd.DataFrame, currency_column: str, date_column: str, currency_rates: pd.DataFrame):
+    """
+    Obtiene, para cada fila, la tasa de cambio vigente en su fecha mediante un `merge_asof` ordenado por moneda.
+
+    Se toma la última tasa cuya `EffectiveDate` sea anterior o igual a la fecha de la fila. Las filas sin fecha,
+    sin moneda o anteriores a la primera tasa de su moneda devuelven `NaN`.
+
+    Args:
+        df (pd.DataFrame): El DataFrame con los importes a convertir.
+        currency_column (str): El nombre de la columna con la moneda de cada importe.
+        date_column (str): El nombre de la columna con la fecha de cada importe (por ejemplo, `ChargeDateTime`).
+        currency_rates (pd.DataFrame): El histórico de tasas devuelto por `load_currency_rates`.
+
+    Returns:
+        pd.Series: La tasa de cambio de cada fila, alineada con el índice de `df`.
+    """
+    left = pd.DataFrame({
+        'row': np.arange(len(df)),
+        'currency': df[currency_column].astype(object).to_numpy(),
+        'date': pd.to_datetime(df[date_column], errors='coerce').astype('datetime64[ns]').to_numpy(),
+    })
+    left = left[left['date'].notna() & left['currency'].notna()].sort_values('date', kind='stable')
+
+    merged = pd.merge_asof(left, currency_rates, left_on='date', right_on='EffectiveDate',
+                           left_by='currency', right_by='CurrencyCode', direction='backward')
+
+    rates = np.full(len(df), np.nan)
+    rates[merged['row'].to_numpy()] = merged['Rate'].to_numpy()
+    return pd.Series(rates, index=df.index)
+
+
+def convert_currency(df: pd.DataFrame, amount_column: str, currency_column: str, currency_exchange_rate: dict,
+                     currency_rates: pd.DataFrame = None, date_column: str = None):
     """
     Convierte los valores monetarios en un DataFrame a EUR utilizando las tasas de cambio proporcionadas
     y actualiza la columna de moneda a 'EUR'.
 
     Esta función realiza las siguientes acciones:
     1. Verifica que las tasas de cambio para las monedas soportadas (GBP, CHF, CAD, DKK, EUR, SEK, NOK, USD) estén presentes en el diccionario `currency_exchange_rate`.
-    2. Convierte los valores en la columna de monto (`amount_column`) a EUR utilizando las tasas de cambio correspondientes.
-    3. Actualiza la columna de moneda (`currency_column`) a 'EUR' para todas las filas procesadas.
+    2. Obtiene en bloque la tasa de cada fila: la vigente en `date_column` según el histórico `currency_rates`, si se
+       proporciona, o la de `currency_exchange_rate` si no hay tasa histórica para esa moneda y fecha.
+    3. Convierte los valores en la columna de monto (`amount_column`) a EUR, redondeando a 2 decimales. Los importes
+       en EUR o en monedas sin tasa se mantienen sin cambios.
+    4. Actualiza la columna de moneda (`currency_column`) a 'EUR' para todas las filas procesadas.
 
     Args:
         df (pd.DataFrame): El DataFrame que contiene los datos monetarios a convertir.
@@ -29,6 +152,9 @@ def convert_currency(df: pd.DataFrame, amount_column: str, currency_column: str,
         currency_column (str): El nombre de la columna que contiene las monedas de los valores monetarios.
         currency_exchange_rate (dict): Un diccionario con las tasas de cambio de las monedas soportadas hacia EUR.
             Ejemplo: {'USD': 0.85, 'GBP': 1.1, ...}
+        currency_rates (pd.DataFrame, optional): Histórico de tasas devuelto por `load_currency_rates`.
+        date_column (str, optional): El nombre de la columna con la fecha de cada importe, necesaria para aplicar
+                                     el histórico de tasas.
 
     Returns:
         pd.DataFrame: El DataFrame con los valores convertidos a EUR y la columna de moneda actualizada.
@@ -43,38 +169,20 @@ def convert_currency(df: pd.DataFrame, amount_column: str, currency_column: str,
 
     # Realizar la conversión en las columnas ForeignAmount y ForeignCurrencyCode
     if amount_column in df.columns and currency_column in df.columns:
-        # Convertir los valores de ForeignAmount según la tasa de cambio
-        df[amount_column] = df.apply(
-            lambda row: convert_amount_to_eur(row, amount_column, currency_column, currency_exchange_rate), axis=1)
+        currencies = df[currency_column].astype(object)
+        rates = currencies.map(currency_exchange_rate).astype(float)
 
-        # Cambiar el valor en la columna ForeignCurrencyCode a EUR después de la conversión
-        df[currency_column] = 'EUR'
+        if use_dated_rates(currency_rates, date_column, df.columns):
+            rates = lookup_asof_rates(df, currency_column, date_column, currency_rates).fillna(rates)
 
-    return df
-
-
-def convert_amount_to_eur(row, amount_column, currency_column, currency_exchange_rate):
-    """
-    Convierte una cantidad de una moneda a EUR utilizando la tasa de cambio proporcionada.
+        # Los importes en EUR no se convierten
+        rates = rates.where(~currencies.isin(['EUR']))
 
-    Esta función toma una fila del DataFrame, obtiene la cantidad de dinero en la moneda indicada y la convierte a EUR
-    utilizando la tasa de cambio correspondiente del diccionario `currency_exchange_rate`.
+        # Convertir los valores de ForeignAmount según la tasa de cambio
+        amounts = df[amount_column]
+        df[amount_column] = amounts.where(rates.isna(), round_amounts(amounts * rates))
 
-    Args:
-        row (pd.Series): Una fila del DataFrame.
-        amount_column (str): El nombre de la columna que contiene el monto a convertir.
-        currency_column (str): El nombre de la columna que contiene la moneda del monto.
-        currency_exchange_rate (dict): Un diccionario con las tasas de cambio de las monedas soportadas hacia EUR.
+        # Cambiar el valor en la columna ForeignCurrencyCode a EUR después de la conversión
+        df[currency_column] = pd.Series('EUR', index=df.index, dtype='category')
 
-    Returns:
-        float: El monto convertido a EUR si la moneda no es EUR; el valor original si ya está en EUR o no tiene tasa de cambio disponible.
-    """
-    from_currency = row[currency_column]
-    amount = row[amount_column]
-
-    # Si la moneda no es EUR y está en el diccionario de tasas de cambio, conviértela
-    if from_currency != 'EUR' and from_currency in currency_exchange_rate:
-        conversion_rate = currency_exchange_rate[from_currency]
-        return round(amount * conversion_rate, 2)
-    else:
-        return amount
\ No newline at end of file
+    return df
@@ -0,0 +1,295 @@
+import os.path
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from etl.transform_methods.generate_business_key import join_key_columns
+from query.PostgreSQL.CREATE.schema_registry import get_primary_keys
+from utils.utils import (log_error, read_layer, iter_layer, write_layer, get_storage_format, LayerWriter,
+                         LAYER_EXTENSIONS)
+
+load_dotenv()
+
+# Si es 'true', de cada clave primaria de la tabla destino solo se conserva su última versión antes de escribir la
+# capa silver
+TRANSFORM_DEDUP = os.getenv("TRANSFORM_DEDUP", "true").lower() == "true"
+# Directorio del índice de la última versión de cada clave entre ejecuciones (vacío: sin índice persistente)
+TRANSFORM_DEDUP_INDEX_PATH = os.getenv("TRANSFORM_DEDUP_INDEX_PATH")
+
+# Columnas que deciden la versión más reciente de un registro, por orden de prioridad
+VERSION_COLUMNS = ['ModifiedDate', 'extract_dt']
+
+
+def version_columns(df: pd.DataFrame):
+    return [column for column in VERSION_COLUMNS if column in df.columns]
+
+
+def dedup_key(df: pd.DataFrame, source: str):
+    """
+    Calcula la clave de deduplicación de cada fila: las columnas de la clave primaria de la tabla de la fuente (ver
+    `get_primary_keys`), unidas con '_' (ver `join_key_columns`). Es la clave con la que la carga detecta las filas
+    repetidas, por lo que dos filas con la misma clave nunca llegan a la base de datos y las filas distintas de la
+    tabla (por ejemplo, varios cargos de un mismo segmento) nunca se eliminan.
+
+    Args:
+        df (pd.DataFrame): Los datos transformados.
+        source (str): El nombre de la fuente (y de su tabla).
+
+    Returns:
+        pd.Series or None: La clave de cada fila, o None si la tabla no tiene clave primaria o faltan sus columnas.
+    """
+    columns = get_primary_keys().get(source)
+    if not columns:
+        log_error(f"No se puede deduplicar {source}: su tabla no tiene clave primaria.")
+        return None
+    missing = [column for column in columns if column not in df.columns]
+    if missing:
+        log_error(f"No se puede deduplicar {source}: faltan las columnas de la clave primaria {', '.join(missing)}.")
+        return None
+
+    return join_key_columns(df, columns)
+
+
+def row_versions(df: pd.DataFrame, key: pd.Series, first_row: int = 0):
+    """
+    Calcula la versión de cada fila: su clave (ver `dedup_key`), sus columnas de `VERSION_COLUMNS` como enteros
+    (los nulos, como el valor más antiguo) y su posición (`row`), que desempata a favor de la última fila.
+
+    Args:
+        df (pd.DataFrame): Los datos transformados.
+        key (pd.Series): La clave de cada fila.
+        first_row (int, optional): La posición de la primera fila de `df` (para los bloques de un archivo).
+
+    Returns:
+        pd.DataFrame: Las columnas `key`, las de versión y `row`.
+    """
+    versions = pd.DataFrame({'key': key.astype(object).to_numpy()})
+    for column in version_columns(df):
+        dates = pd.to_datetime(df[column], format='ISO8601', errors='coerce').astype('datetime64[ns]')
+        # NaT es el entero más pequeño, por lo que las filas sin fecha pierden frente a cualquier fecha
+        versions[column] = dates.to_numpy().view('int64')
+    versions['row'] = np.arange(first_row, first_row + len(df))
+    return versions
+
+
+def latest_versions(versions: pd.DataFrame):
+    """
+    Elige la última versión de cada clave: la de fecha de modificación más reciente, después la de fecha
+    de extracción más reciente y, si empatan, la última fila.
+
+    Args:
+        versions (pd.DataFrame): Las versiones de las filas (ver `row_versions`).
+
+    Returns:
+        pd.DataFrame: Una fila por clave, con su última versión, en el orden de `row`.
+    """
+    columns = [column for column in VERSION_COLUMNS if column in versions.columns]
+    order = np.lexsort([versions['row'].to_numpy()] + [versions[column].to_numpy() for column in reversed(columns)])
+    ordered = versions.iloc[order]
+    # Con las filas ordenadas de más antigua a más reciente, la última de cada clave (índice hash) es la que gana
+    latest = ordered[~ordered['key'].duplicated(keep='last').to_numpy()]
+    return latest.sort_values('row', kind='stable')
+
+
+class DedupIndex:
+    """
+    Índice hash de la última versión vista de cada clave (ver `row_versions`), que se guarda entre
+    ejecuciones en `TRANSFORM_DEDUP_INDEX_PATH` para descartar las filas que llegan en una extracción posterior con
+    una versión más antigua que la ya cargada.
+    """
+
+    def __init__(self, versions: pd.DataFrame = None):
+        if versions is None:
+            versions = pd.DataFrame({'key': pd.Series(dtype=object)})
+        self.versions = versions.set_index('key', drop=False)
+
+    @staticmethod
+    def path(source: str):
+        return os.path.join(TRANSFORM_DEDUP_INDEX_PATH, f"{source}_dedup{LAYER_EXTENSIONS[get_storage_format()]}")
+
+    @classmethod
+    def load(cls, source: str):
+        """Carga el índice de una fuente (vacío si no existe o no se puede leer)."""
+        path = cls.path(source)
+        if not os.path.exists(path):
+            return cls()
+        try:
+            versions = read_layer(path, dtype={'key': str}, keep_default_na=False, na_values=[])
+            return cls(versions.drop(columns=['row'], errors='ignore'))
+        except (OSError, ValueError, KeyError) as e:
+            log_error(f"Error al leer el índice de deduplicación de {source}: {e}")
+            return cls()
+
+    def save(self, source: str):
+        """Guarda el índice de una fuente con un nombre temporal que se renombra al terminar."""
+        path = self.path(source)
+        root, extension = os.path.splitext(path)
+        tmp_path = f"{root}.tmp{extension}"
+        try:
+            os.makedirs(TRANSFORM_DEDUP_INDEX_PATH, exist_ok=True)
+            write_layer(self.versions.reset_index(drop=True), tmp_path)
+            os.replace(tmp_path, path)
+        except (OSError, ValueError) as e:
+            log_error(f"Error al guardar el índice de deduplicación de {source}: {e}")
+
+    def stale(self, versions: pd.DataFrame):
+        """
+        Indica las filas cuya versión es más antigua que la del índice para su clave.
+
+        Args:
+            versions (pd.DataFrame): Las versiones de las filas (ver `row_versions`).
+
+        Returns:
+            np.ndarray: True en las filas más antiguas que las ya vistas.
+        """
+        positions = self.versions.index.get_indexer(versions['key'])
+        found = positions >= 0
+        stale = np.zeros(len(versions), dtype=bool)
+        undecided = found.copy()
+        for column in [column for column in VERSION_COLUMNS if column in versions.columns]:
+            if column not in self.versions.columns:
+                break
+            seen = self.versions[column].to_numpy()[np.maximum(positions, 0)]
+            current = versions[column].to_numpy()
+            stale |= undecided & (current < seen)
+            undecided &= current == seen
+        return stale
+
+    def update(self, latest: pd.DataFrame):
+        """Añade al índice las últimas versiones de un lote (ver `latest_versions`), si son más recientes."""
+        if self.versions.empty:
+            self.versions = DedupIndex(latest.drop(columns=['row'])).versions
+            return
+        # Las columnas de versión que no estaban en el índice se toman como la versión más antigua
+        previous = self.versions.reset_index(drop=True).reindex(columns=latest.columns,
+                                                                 fill_value=np.iinfo(np.int64).min)
+        combined = pd.concat([previous.assign(row=-1), latest], ignore_index=True)
+        self.versions = DedupIndex(latest_versions(combined).drop(columns=['row'])).versions
+
+
+def deduplicate(df: pd.DataFrame, source: str = None, index: DedupIndex = None):
+    """
+    Elimina las filas repetidas de cada clave primaria (reextracciones, páginas de la API solapadas) y conserva su
+    última versión (ver `dedup_key` y `latest_versions`), de modo que la carga en la base de datos nunca recibe dos
+    filas con la misma clave. Si se indica un índice (ver `DedupIndex`), también se eliminan las filas más antiguas que la última
+    versión vista en ejecuciones anteriores, y el índice se actualiza con las conservadas.
+
+    Args:
+        df (pd.DataFrame): Los datos transformados.
+        source (str): El nombre de la fuente (y de su tabla).
+        index (DedupIndex, optional): El índice de las versiones vistas en ejecuciones anteriores.
+
+    Returns:
+        pd.DataFrame: Las filas de `df` que son la última versión de su clave, en su orden original.
+    """
+    key = dedup_key(df, source)
+    if key is None:
+        return df
+
+    versions = row_versions(df, key)
+    if index is not None:
+        versions = versions[~index.stale(versions)]
+    latest = latest_versions(versions)
+    if index is not None:
+        index.update(latest)
+
+    if len(latest) == len(df):
+        return df
+    log_error(f"Deduplicación de {source}: {len(df) - len(latest)} filas repetidas o antiguas eliminadas")
+    return df.iloc[latest['row'].to_numpy()]
+
+
+def deduplicate_source(source: str, df: pd.DataFrame):
+    """
+    Deduplica los datos transformados de una fuente (ver `deduplicate`) si `TRANSFORM_DEDUP` está activo, con el
+    índice persistente de la fuente si se ha configurado `TRANSFORM_DEDUP_INDEX_PATH`.
+
+    Args:
+        source (str): El nombre de la fuente.
+        df (pd.DataFrame): Los datos transformados, antes de las columnas de auditoría.
+
+    Returns:
+        pd.DataFrame: Los datos sin filas repetidas por clave primaria.
+    """
+    if not TRANSFORM_DEDUP:
+        return df
+
+    index = DedupIndex.load(source) if TRANSFORM_DEDUP_INDEX_PATH else None
+    df = deduplicate(df, source, index)
+    if index is not None:
+        index.save(source)
+    return df
+
+
+def filter_layer_rows(file_path: str, keep: np.ndarray, chunksize: int):
+    """
+    Reescribe por bloques un archivo de la capa silver conservando solo las filas indicadas, para deduplicar los
+    archivos escritos por bloques (en los que una versión más reciente puede llegar después de escribir la
+    anterior). Los CSV se leen como texto, de modo que las filas conservadas no cambian.
+
+    Args:
+        file_path (str): La ruta del archivo.
+        keep (np.ndarray): True en las filas a conservar, por posición en el archivo.
+        chunksize (int): Número de filas de cada bloque.
+    """
+    root, extension = os.path.splitext(file_path)
+    tmp_path = f"{root}.dedup{extension}"
+    kwargs = {} if extension == '.parquet' else {'dtype': str, 'keep_default_na': False}
+    start = 0
+    with LayerWriter(tmp_path) as writer:
+        for chunk in iter_layer(file_path, chunksize, **kwargs):
+            writer.write(chunk[keep[start:start + len(chunk)]])
+            start += len(chunk)
+    os.replace(tmp_path, file_path)
+
+
+class StreamDeduplicator:
+    """
+    Deduplicación de un archivo de la capa silver escrito por bloques (ver `deduplicate`): cada bloque se filtra
+    con el índice persistente antes de escribirse (`filter`) y se guarda la versión de sus filas; al terminar
+    (`finish`), si alguna clave primaria tiene varias filas, el archivo se reescribe con solo su última versión.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.index = DedupIndex.load(source) if TRANSFORM_DEDUP and TRANSFORM_DEDUP_INDEX_PATH else None
+        self.versions = []
+        self.rows = 0
+
+    def filter(self, df: pd.DataFrame):
+        """Devuelve las filas de un bloque que se escriben (sin las más antiguas que el índice)."""
+        key = dedup_key(df, self.source) if TRANSFORM_DEDUP else None
+        if key is None:
+            self.rows += len(df)
+            return df
+
+        versions = row_versions(df, key, first_row=self.rows)
+        if self.index is not None:
+            fresh = ~self.index.stale(versions)
+            df, versions = df[fresh], versions[fresh]
+            versions['row'] = np.arange(self.rows, self.rows + len(df))
+        self.versions.append(versions)
+        self.rows += len(df)
+        return df
+
+    def finish(self, file_path: str, chunksize: int):
+        """
+        Deja en el archivo solo la última versión de cada clave y actualiza el índice persistente.
+
+        Returns:
+            int: El número de filas del archivo.
+        """
+        if not self.versions:
+            return self.rows
+
+        latest = latest_versions(pd.concat(self.versions, ignore_index=True))
+        if len(latest) < self.rows:
+            keep = np.zeros(self.rows, dtype=bool)
+            keep[latest['row'].to_numpy()] = True
+            filter_layer_rows(file_path, keep, chunksize)
+            log_error(f"Deduplicación de {self.source}: {self.rows - len(latest)} filas repetidas eliminadas")
+
+        if self.index is not None:
+            self.index.update(latest)
+            self.index.save(self.source)
+        return len(latest)
@@ -1,6 +1,8 @@
 import pandas as pd
 import os.path
 from utils.utils import log_error
+from etl.transform_methods.parse_datetime import parse_datetime
+from query.PostgreSQL.CREATE.schema_registry import is_low_cardinality
 import json
 from dotenv import load_dotenv
 
@@ -63,10 +65,11 @@ def filter_data(df: pd.DataFrame, file_type: str):
 
     Esta función realiza las siguientes acciones:
     1. Convierte las columnas de fechas en el DataFrame a formato `datetime64[ns]`, según el tipo de archivo,
-       y las redondea a la precisión de segundos.
+       y las redondea a la precisión de segundos, con `parse_datetime` (una sola vez por columna).
     2. Convierte las columnas especificadas a los tipos de datos deseados, como `float`, `int`, `string`, etc.
     3. Para las columnas que no se especifican en los diccionarios de conversiones, se verifican si son de tipo
-       adecuado y se ajustan, si es necesario, a `string` o se mantienen en su tipo original.
+       adecuado y se ajustan, si es necesario, a `category` (si tienen pocos valores distintos) o `string`, o se
+       mantienen en su tipo original (las categóricas se conservan).
     4. Si una columna no puede ser convertida a su tipo correspondiente, se registra un error y se retorna el DataFrame sin cambios.
 
     Args:
@@ -87,8 +90,7 @@ def filter_data(df: pd.DataFrame, file_type: str):
     for column, dtype in date_columns.items():
         if column in df.columns:
             try:
-                df[column] = pd.to_datetime(df[column], errors='coerce').dt.strftime('%Y-%m-%d %H:%M:%S')
-                df[column] = df[column].dt.floor('s')  # Elimina milisegundos
+                df[column] = parse_datetime(df[column])  # Elimina milisegundos
 
                 if df[column].isnull().any():
                     log_error(f"Error: La columna {column} no se pudo convertir a datetime.")
@@ -116,8 +118,9 @@ def filter_data(df: pd.DataFrame, file_type: str):
             df[column] = df[column].astype('datetime64[ns]')
         elif column not in conversion_types and column not in date_columns:
             if df[column].dtype == 'object':
-                df[column] = df[column].astype('string')
-            elif df[column].dtype in ['float64', 'int64', 'bool']:
+                df[column] = df[column].astype('category' if is_low_cardinality(df[column]) else 'string')
+            elif (pd.api.types.is_numeric_dtype(df[column]) or pd.api.types.is_bool_dtype(df[column])
+                  or pd.api.types.is_string_dtype(df[column]) or isinstance(df[column].dtype, pd.CategoricalDtype)):
                 pass
             else:
                 log_error(f"Error: La columna {column} no es de tipo numérico ni objeto.")
@@ -1,6 +1,13 @@
+import os.path
+import numpy as np
 import pandas as pd
+from dotenv import load_dotenv
 from utils.utils import log_error
 
+load_dotenv()
+# Si es 'true', se añade la columna `business_key_id` con una huella entera de 64 bits del `business_key`
+BUSINESS_KEY_ID = os.getenv("BUSINESS_KEY_ID", "false").lower() == "true"
+
 
 key_attributes = {
     'booking_new': ['BookingID', 'BookingParentID', 'Status', 'RecordLocator'],
@@ -11,6 +18,62 @@ key_attributes = {
 }
 
 
+def key_column_to_str(column: pd.Series):
+    """
+    Convierte una columna clave a texto con el mismo formato que `str()` de cada valor, sustituyendo los nulos
+    por 'NULL'.
+
+    La conversión se hace una sola vez por valor distinto (`pd.factorize`) y el resultado se expande al resto de
+    filas, de modo que el coste depende del número de valores únicos y no del número de filas.
+
+    Args:
+        column (pd.Series): La columna clave.
+
+    Returns:
+        pd.Series: La columna como texto (dtype object), alineada con el índice de `column`.
+    """
+    codes, uniques = pd.factorize(column, use_na_sentinel=True)
+    labels = np.array([str(value) for value in uniques] + ['NULL'], dtype=object)
+
+    # El código -1 corresponde a los nulos y toma la última etiqueta ('NULL')
+    return pd.Series(labels[codes], index=column.index)
+
+
+def join_key_columns(df: pd.DataFrame, columns: list):
+    """
+    Une con '_' el texto de las columnas clave (ver `key_column_to_str`), como en el `business_key`, pero sin
+    convertirlas antes a un tipo común.
+
+    Args:
+        df (pd.DataFrame): Los datos.
+        columns (list): Las columnas clave, en orden.
+
+    Returns:
+        pd.Series: La clave de cada fila (dtype object).
+    """
+    key = key_column_to_str(df[columns[0]])
+    for column in columns[1:]:
+        key = key + '_' + key_column_to_str(df[column])
+    return key
+
+
+def business_key_fingerprint(business_key: pd.Series):
+    """
+    Calcula una huella entera de 64 bits de cada `business_key`, apta para joins e índices.
+
+    Se usa `pd.util.hash_array` (SipHash con clave fija), por lo que el valor es estable entre ejecuciones y
+    procesos. Se devuelve como entero con signo para que encaje en una columna BIGINT.
+
+    Args:
+        business_key (pd.Series): La columna `business_key`.
+
+    Returns:
+        pd.Series: La huella de cada fila como `int64`.
+    """
+    hashed = pd.util.hash_array(business_key.to_numpy(dtype=object))
+    return pd.Series(hashed.view(np.int64), index=business_key.index)
+
+
 def generate_business_key(df: pd.DataFrame, file_type: str):
     """
     Genera una columna `business_key` en el DataFrame concatenando los valores de las columnas clave
@@ -20,6 +83,11 @@ def generate_business_key(df: pd.DataFrame, file_type: str):
     `key_attributes` correspondiente al tipo de archivo proporcionado. Los valores se unen con un guion bajo ('_'),
     y los valores nulos en las columnas clave son reemplazados por el string 'NULL'.
 
+    La concatenación se hace por columnas. Si todas las columnas clave comparten un tipo común (por ejemplo, todas
+    numéricas), se convierten a ese tipo antes de pasarlas a texto, igual que ocurre al tratar la fila como una
+    única serie. Si `BUSINESS_KEY_ID` está activo, se añade además la columna `business_key_id` con una huella
+    entera de 64 bits de la clave.
+
     Args:
         df (pd.DataFrame): El DataFrame en el que se generará la columna `business_key`.
         file_type (str): El tipo de archivo que determina qué columnas deben ser usadas para generar el `business_key`.
@@ -39,8 +107,21 @@ def generate_business_key(df: pd.DataFrame, file_type: str):
         log_error(f"Error: Las siguientes columnas faltan en el DataFrame: {', '.join(missing_columns)}")
         return df
 
+    # Tipo común de las columnas clave, el mismo que tendría la fila completa
+    common_dtype = pd.concat([df[col].iloc[:0] for col in attributes], ignore_index=True).dtype
+
+    key_parts = []
+    for col in attributes:
+        column = df[col] if common_dtype == object else df[col].astype(common_dtype)
+        key_parts.append(key_column_to_str(column))
+
     # Crear la columna 'business_key' concatenando los valores de las columnas especificadas
-    # Usando .agg() para eficiencia y manejar nulos
-    df['business_key'] = df[attributes].agg(lambda x: '_'.join(x.fillna('NULL').astype(str)), axis=1)
+    business_key = key_parts[0]
+    for part in key_parts[1:]:
+        business_key = business_key + '_' + part
+    df['business_key'] = business_key
+
+    if BUSINESS_KEY_ID:
+        df['business_key_id'] = business_key_fingerprint(df['business_key'])
 
-    return df
\ No newline at end of file
+    return df
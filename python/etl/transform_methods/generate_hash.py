@@ -1,12 +1,28 @@
 import os.path
+import importlib.util
+import numpy as np
 import pandas as pd
 import hashlib
-from utils.utils import log_error, set_audit_columns
+from etl.transform_methods.transform_all_sources import DERIVED_COLUMNS
+from utils.utils import log_error
 from dotenv import load_dotenv
 
 load_dotenv()
 
 EXTRACT_PATH = os.getenv("DESTINATION_PATH")
+# Columnas sobre las que se calcula el hash: 'row' (todas salvo las de auditoría y las derivadas) o 'key' (key_attributes)
+HASH_COLUMNS = os.getenv("HASH_COLUMNS", "row").lower()
+# Algoritmo de hash: 'md5', 'sha1', 'siphash' (pd.util.hash_array) o 'xxhash' (requiere el paquete xxhash)
+HASH_ALGORITHM = os.getenv("HASH_ALGORITHM", "md5").lower()
+# Número de filas que se serializan y se hashean en cada lote
+HASH_BATCH_SIZE = int(os.getenv("HASH_BATCH_SIZE", 100000))
+XXHASH_AVAILABLE = importlib.util.find_spec("xxhash") is not None
+
+# Columnas que cambian en cada ejecución o que se derivan de la fila, y que no forman parte del hash
+AUDIT_COLUMNS = ['extract_dt', 'source', 'proc_status', 'business_key', 'business_key_id', 'hash']
+
+# Separador entre valores (carácter de control "unit separator"), que no aparece en los datos de origen
+FIELD_SEPARATOR = '\x1f'
 
 
 key_attributes = {
@@ -17,35 +33,144 @@ key_attributes = {
     'segment': ['PassengerID', 'SegmentID']
 }
 
+
+def canonical_value(value):
+    """
+    Devuelve la representación de texto estable de un valor para el cálculo del hash.
+
+    Los números decimales enteros se escriben sin decimales ('5' y no '5.0'), de modo que una columna que pasa de
+    entera a decimal entre ejecuciones (por ejemplo, al aparecer un nulo) no cambia el hash de sus filas.
+    """
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def canonical_column(column: pd.Series):
+    """
+    Convierte una columna a su representación de texto canónica, con 'NULL' para los valores nulos.
+
+    La conversión se hace una sola vez por valor distinto (`pd.factorize`) y el resultado se expande al resto de filas.
+
+    Args:
+        column (pd.Series): La columna a convertir.
+
+    Returns:
+        np.ndarray: Los valores de la columna como texto (dtype object).
+    """
+    codes, uniques = pd.factorize(column, use_na_sentinel=True)
+    labels = np.array([canonical_value(value) for value in uniques] + ['NULL'], dtype=object)
+
+    # El código -1 corresponde a los nulos y toma la última etiqueta ('NULL')
+    return labels[codes]
+
+
+def hash_strings(values: np.ndarray, algorithm: str):
+    """
+    Calcula el hash hexadecimal de cada texto con el algoritmo indicado.
+
+    Args:
+        values (np.ndarray): Los textos a hashear (dtype object).
+        algorithm (str): 'md5', 'sha1', 'siphash' o 'xxhash'.
+
+    Returns:
+        np.ndarray: El hash hexadecimal de cada texto.
+    """
+    if algorithm == 'siphash':
+        hashed = pd.util.hash_array(values)
+        return np.array([f"{value:016x}" for value in hashed.tolist()], dtype=object)
+
+    if algorithm == 'xxhash':
+        import xxhash
+        return np.array([xxhash.xxh3_128_hexdigest(value.encode('utf-8')) for value in values], dtype=object)
+
+    hash_function = getattr(hashlib, algorithm)
+    return np.array([hash_function(value.encode('utf-8')).hexdigest() for value in values], dtype=object)
+
+
+def get_hash_algorithm():
+    """
+    Devuelve el algoritmo de hash configurado en `HASH_ALGORITHM`, con 'md5' si no es válido o no está disponible.
+
+    Returns:
+        str: El algoritmo de hash a utilizar.
+    """
+    if HASH_ALGORITHM not in ('md5', 'sha1', 'siphash', 'xxhash'):
+        log_error(f"Error: Algoritmo de hash {HASH_ALGORITHM} no soportado. Se utiliza md5.")
+        return 'md5'
+
+    if HASH_ALGORITHM == 'xxhash' and not XXHASH_AVAILABLE:
+        log_error("Error: HASH_ALGORITHM=xxhash requiere el paquete xxhash. Se utiliza md5.")
+        return 'md5'
+
+    return HASH_ALGORITHM
+
+
+def get_hash_columns(df: pd.DataFrame, file_type: str):
+    """
+    Devuelve las columnas sobre las que se calcula el hash según `HASH_COLUMNS`.
+
+    Args:
+        df (pd.DataFrame): El DataFrame a hashear.
+        file_type (str): El tipo de archivo, usado para buscar las columnas clave en `key_attributes`.
+
+    Returns:
+        list or None: Las columnas a hashear, o None si faltan columnas clave o el tipo de archivo no existe.
+    """
+    if HASH_COLUMNS == 'key':
+        if file_type not in key_attributes:
+            log_error(f"Error: El tipo de archivo {file_type} no está en el diccionario key_attributes.")
+            return None
+
+        attributes = key_attributes[file_type]
+        missing_columns = [col for col in attributes if col not in df.columns]
+        if missing_columns:
+            log_error(f"Error: Las siguientes columnas faltan en el DataFrame: {', '.join(missing_columns)}")
+            return None
+        return attributes
+
+    return [col for col in df.columns if col not in AUDIT_COLUMNS and col not in DERIVED_COLUMNS]
+
+
 def generate_hash(df: pd.DataFrame, file_type: str):
     """
-    Genera una columna `hash` en el DataFrame basada en un conjunto de columnas clave,
-    concatenando los valores de esas columnas y calculando un hash MD5 para cada fila.
+    Genera una columna `hash` en el DataFrame basada en un conjunto de columnas, para detectar cambios en las filas.
 
-    La función utiliza las columnas clave definidas en el diccionario `key_attributes` para el tipo de archivo
-    proporcionado. Los valores de estas columnas se concatenan en un solo string y se calcula un hash MD5 para cada fila.
-    La columna `hash` resultante contiene los valores de hash generados para cada fila del DataFrame.
+    Las columnas se eligen con `HASH_COLUMNS`: todas las columnas salvo las de auditoría y las derivadas por
+    `transform_all_sources` ('row', por defecto; ver `DERIVED_COLUMNS`), de modo que el hash solo cambia cuando
+    cambian los datos de origen, o las columnas clave definidas en `key_attributes` para el tipo de archivo ('key'). Los valores se serializan por
+    columnas con un formato canónico (nulos como 'NULL', decimales enteros sin decimales) y se unen con un
+    separador de control, de modo que el hash es estable entre ejecuciones. Las filas se procesan en lotes de
+    `HASH_BATCH_SIZE` y se hashean con el algoritmo de `HASH_ALGORITHM`.
 
     Args:
         df (pd.DataFrame): El DataFrame en el que se generará la columna `hash`.
-        file_type (str): El tipo de archivo que determina qué columnas deben ser usadas para calcular el hash.
-                         Este tipo se utiliza para buscar en el diccionario `key_attributes` las columnas que se deben
-                         usar para la concatenación y el cálculo del hash.
+        file_type (str): El tipo de archivo que determina qué columnas deben ser usadas para calcular el hash
+                         cuando `HASH_COLUMNS` es 'key'.
 
     Returns:
         pd.DataFrame: El DataFrame con una nueva columna `hash` generada.
     """
-    if file_type not in key_attributes:
-        log_error(f"Error: El tipo de archivo {file_type} no está en el diccionario key_attributes.")
+    columns = get_hash_columns(df, file_type)
+    if columns is None:
         return df
 
-    attributes = key_attributes[file_type]
-    missing_columns = [col for col in attributes if col not in df.columns]
+    algorithm = get_hash_algorithm()
+    hashes = np.empty(len(df), dtype=object)
+
+    for start in range(0, len(df), HASH_BATCH_SIZE):
+        batch = df.iloc[start:start + HASH_BATCH_SIZE]
+
+        rows = None
+        for col in columns:
+            values = canonical_column(batch[col])
+            rows = values if rows is None else rows + FIELD_SEPARATOR + values
+
+        if rows is None:
+            rows = np.full(len(batch), '', dtype=object)
 
-    def generate_row_hash(row):
-        concatenated_values = '_'.join(str(row[missing_columns].fillna('NULL')))
-        return hashlib.md5(concatenated_values.encode('utf-8')).hexdigest()
+        hashes[start:start + len(batch)] = hash_strings(rows, algorithm)
 
-    df['hash'] = df.apply(generate_row_hash, axis=1)
+    df['hash'] = hashes
 
     return df
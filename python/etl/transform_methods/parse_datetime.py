@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+# Formatos de fecha de origen, en el orden en que se prueban
+DATETIME_FORMATS = ['%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d']
+
+# Prefijo de las fechas centinela usadas en origen para "sin fecha" (9999-12-31 00:00:00.000)
+DATETIME_SENTINEL = '9999-12-31'
+
+
+def parse_datetime_values(values: pd.Series, formats=DATETIME_FORMATS):
+    """
+    Convierte una serie de valores de fecha (normalmente sin repetidos) a `datetime64[ns]`.
+
+    Los centinelas `9999-12-31` se convierten en nulos sin intentar parsearlos. El resto se parsea con cada formato
+    de `formats` en orden, solo sobre los valores que aún no se han podido convertir, y lo que no encaja en ningún
+    formato se parsea en último lugar con la detección automática de pandas.
+
+    Args:
+        values (pd.Series): Los valores a convertir.
+        formats (list, optional): Los formatos explícitos a probar. Por defecto, `DATETIME_FORMATS`.
+
+    Returns:
+        pd.Series: Los valores convertidos, con `NaT` para los centinelas y los valores no válidos.
+    """
+    values = values.astype(object)
+    is_text = values.map(type) == str
+    is_sentinel = is_text & values.where(is_text, '').str.startswith(DATETIME_SENTINEL)
+
+    parsed = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    pending = values.notna() & ~is_sentinel
+
+    for date_format in formats:
+        candidates = pending & is_text
+        if not candidates.any():
+            break
+        converted = pd.to_datetime(values[candidates], format=date_format, errors='coerce')
+        converted = converted[converted.notna()]
+        parsed[converted.index] = converted
+        pending[converted.index] = False
+
+    if pending.any():
+        parsed[pending] = pd.to_datetime(values[pending], errors='coerce', format='mixed')
+
+    return parsed
+
+
+def parse_datetime(column: pd.Series, formats=DATETIME_FORMATS):
+    """
+    Convierte una columna de fechas a `datetime64[ns]` con precisión de segundos.
+
+    El parseo se hace una sola vez por valor distinto (`pd.factorize`) y el resultado se expande al resto de filas,
+    ya que las fechas se repiten mucho (centinelas, fechas de creación de una misma reserva...). Si la columna ya es
+    de tipo fecha, solo se eliminan los milisegundos.
+
+    Args:
+        column (pd.Series): La columna a convertir.
+        formats (list, optional): Los formatos explícitos a probar. Por defecto, `DATETIME_FORMATS`.
+
+    Returns:
+        pd.Series: La columna convertida, con `NaT` para los centinelas y los valores no válidos.
+    """
+    if pd.api.types.is_datetime64_any_dtype(column):
+        return column.astype('datetime64[ns]').dt.floor('s')
+
+    codes, uniques = pd.factorize(column, use_na_sentinel=True)
+    parsed = parse_datetime_values(pd.Series(uniques, dtype=object), formats).dt.floor('s')
+
+    # El código -1 corresponde a los nulos y toma el último valor (NaT)
+    values = np.append(parsed.to_numpy(), np.datetime64('NaT', 'ns'))[codes]
+    return pd.Series(values, index=column.index, dtype='datetime64[ns]')
@@ -2,37 +2,103 @@ import os.path
 import pandas as pd
 from dotenv import load_dotenv
 
-from utils.utils import log_error
+from utils.utils import log_error, read_layer, resolve_layer_path, iter_layer
+from query.PostgreSQL.CREATE.schema_registry import apply_schema, FILE_TYPE_TABLES
 
 load_dotenv()
 
 EXTRACT_PATH = os.getenv("DESTINATION_PATH")
 
-def read_data(filename:str):
+def read_data(filename:str, file_type:str=None):
     """
-    Lee los datos de un archivo CSV o Excel desde una ruta predefinida y devuelve un DataFrame.
+    Lee los datos de un archivo parquet, CSV o Excel desde una ruta predefinida y devuelve un DataFrame.
 
     La función intenta leer el archivo especificado por el parámetro `filename`. Si el archivo tiene la extensión
-    `.csv`, se asume que es un archivo CSV y se lee utilizando el separador de pipe (`'|'`). Si el archivo tiene la
-    extensión `.xlsx`, se asume que es un archivo Excel y se lee con el encabezado en la primera fila. Si el archivo
-    no tiene una extensión válida, se genera una excepción.
+    `.parquet`, se lee con su esquema (tipos de fechas, intervalos y enteros con nulos incluidos). Si tiene la
+    extensión `.csv`, se asume que es un archivo CSV y se lee utilizando el separador de pipe (`'|'`). Si el archivo
+    tiene la extensión `.xlsx`, se asume que es un archivo Excel y se lee con el encabezado en la primera fila. Si el
+    archivo no existe con la extensión indicada, se busca con la del otro formato de capa (ver `resolve_layer_path`).
+    Si el archivo no tiene una extensión válida, se genera una excepción.
+
+    Si se indica `file_type`, las columnas se convierten a los tipos compactos de su tabla destino (enteros del
+    tamaño de la columna, códigos como `category`...), derivados del DDL (ver `apply_schema`).
 
     Args:
         filename (str): El nombre del archivo a leer. El archivo debe estar ubicado en el directorio definido por
                          `EXTRACT_PATH`.
+        file_type (str, optional): El tipo de archivo, usado para buscar su tabla en `FILE_TYPE_TABLES`.
 
     Returns:
         pd.DataFrame: El DataFrame que contiene los datos leídos desde el archivo.
     """
-    file_path = os.path.join(EXTRACT_PATH, filename)
-    if filename.endswith('.csv'):
-        df = pd.read_csv(file_path, sep='|', header=0)
+    file_path = resolve_layer_path(os.path.join(EXTRACT_PATH, filename))
+    if file_path.endswith('.parquet') or file_path.endswith('.csv'):
+        df = read_layer(file_path)
         log_error(df.dtypes)
-    elif filename.endswith('.xlsx'):
+    elif file_path.endswith('.xlsx'):
         df = pd.read_excel(file_path, sep='|', header=0)
         log_error(df.dtypes)
     else:
-        raise ValueError(f"Error: El archivo {filename} no es un archivo CSV o Excel.")
+        raise ValueError(f"Error: El archivo {filename} no es un archivo parquet, CSV o Excel.")
+
+    if file_type is not None:
+        df = apply_schema(df, FILE_TYPE_TABLES.get(file_type))
 
     log_error(f"Datos leídos correctamente desde {file_path}")
-    return df
\ No newline at end of file
+    return df
+
+
+def unify_chunk_dtypes(column_dtypes:dict):
+    """
+    Calcula el tipo común de las columnas numéricas de un CSV cuyo tipo inferido cambia entre bloques.
+
+    Al leer un CSV por bloques, pandas infiere el tipo de cada bloque por separado: una columna de enteros se lee
+    como decimal solo en los bloques con nulos, y una columna de texto con valores numéricos se lee como número en
+    los bloques donde todos sus valores lo son. Leyendo esas columnas con el tipo común se obtiene lo mismo que al
+    leer el archivo entero.
+
+    Args:
+        column_dtypes (dict): Para cada columna, el conjunto de tipos que ha tenido en los bloques.
+
+    Returns:
+        dict: Un diccionario `{columna: tipo}` para `pd.read_csv`, solo con las columnas numéricas cuyo tipo cambia
+              entre bloques: `float64` si en todos los bloques es numérica y `str` si en alguno es texto.
+    """
+    def is_number(dtype):
+        return pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+
+    dtypes = {}
+    for column, found in column_dtypes.items():
+        if len(found) < 2 or not any(is_number(dtype) for dtype in found):
+            continue
+        dtypes[column] = 'float64' if all(is_number(dtype) for dtype in found) else str
+
+    return dtypes
+
+
+def iter_data(filename:str, chunksize:int, file_type:str=None, dtype:dict=None):
+    """
+    Lee por bloques de `chunksize` filas un archivo parquet o CSV desde la ruta predefinida, sin cargarlo entero.
+
+    Cada bloque se convierte a los tipos de su tabla destino igual que en `read_data`. Los archivos Excel no se
+    pueden leer por bloques, por lo que se devuelven en un único bloque.
+
+    Args:
+        filename (str): El nombre del archivo a leer, ubicado en el directorio definido por `EXTRACT_PATH`.
+        chunksize (int): Número de filas de cada bloque.
+        file_type (str, optional): El tipo de archivo, usado para buscar su tabla en `FILE_TYPE_TABLES`.
+        dtype (dict, optional): Tipos con los que leer columnas de un CSV (ver `unify_chunk_dtypes`).
+
+    Yields:
+        pd.DataFrame: Cada bloque de filas del archivo.
+    """
+    file_path = resolve_layer_path(os.path.join(EXTRACT_PATH, filename))
+    if not (file_path.endswith('.parquet') or file_path.endswith('.csv')):
+        yield read_data(filename, file_type)
+        return
+
+    kwargs = {'dtype': dtype} if dtype and file_path.endswith('.csv') else {}
+    for chunk in iter_layer(file_path, chunksize, **kwargs):
+        if file_type is not None:
+            chunk = apply_schema(chunk, FILE_TYPE_TABLES.get(file_type))
+        yield chunk
@@ -1,24 +1,120 @@
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
 import pandas as pd
 from etl.transform_methods.convert_currency import convert_currency
 from etl.transform_methods.calculate_age import calculate_age
 from etl.transform_methods.calculate_time_to_modify import calculate_time_to_modify
 from etl.transform_methods.assign_passenger_journey_charge import assign_passenger_journey_charge
-from etl.transform_methods.convert_currency import currency_exchange_rate
+from etl.transform_methods.convert_currency import currency_exchange_rate, load_currency_rates
 from etl.transform_methods.categorize_channel_type import categorize_channel_type
 
 load_dotenv()
 
 
+# Etapas de `transform_all_sources`, en el orden en que se aplican. Para cada etapa se indican los tipos de archivo
+# en los que se aplica (None: todos), las columnas que necesita (`reads`; si falta alguna, la etapa no se aplica),
+# las columnas opcionales que usa si existen (`uses`), las columnas que escribe (`writes`) y la función que la aplica.
+transform_stages = {
+    'convert_currency': {
+        'file_types': ['charge'],
+        'reads': ['ForeignAmount', 'ForeignCurrencyCode', 'CurrencyCode', 'ChargeAmount'],
+        'uses': ['ChargeDateTime'],
+        'writes': ['ForeignAmount', 'ForeignCurrencyCode'],
+        'apply': lambda df: convert_currency(df, 'ForeignAmount', 'ForeignCurrencyCode', currency_exchange_rate,
+                                             load_currency_rates(), 'ChargeDateTime'),
+    },
+    'calculate_age': {
+        'file_types': ['passenger', 'passenger_new'],
+        'reads': ['DOB'],
+        'uses': [],
+        'writes': ['age', 'IsAdult'],
+        'apply': lambda df: calculate_age(df, 'DOB'),
+    },
+    'calculate_time_to_modify': {
+        'file_types': None,
+        'reads': ['CreatedDate', 'ModifiedDate'],
+        'uses': [],
+        'writes': ['CreatedDate', 'ModifiedDate', 'TimeToModify'],
+        'apply': lambda df: calculate_time_to_modify(df, 'CreatedDate', 'ModifiedDate'),
+    },
+    'assign_passenger_journey_charge': {
+        'file_types': ['charge'],
+        'reads': ['ChargeAmount'],
+        'uses': [],
+        'writes': ['PassengerJourneyCharge'],
+        'apply': lambda df: assign_passenger_journey_charge(df, 'ChargeAmount'),
+    },
+    'categorize_channel_type': {
+        'file_types': ['segment'],
+        'reads': ['ChannelType'],
+        'uses': [],
+        'writes': ['ChannelType'],
+        'apply': lambda df: categorize_channel_type(df, 'ChannelType'),
+    },
+}
+
+
+# Columnas nuevas que calculan las etapas (las que escriben sin leerlas), como la edad, que cambia con la fecha de
+# la ejecución aunque la fila de origen no cambie
+DERIVED_COLUMNS = list(dict.fromkeys(column for stage in transform_stages.values() for column in stage['writes']
+                                     if column not in stage['reads']))
+
+
+@lru_cache(maxsize=None)
+def plan_stages(file_type: str, columns: tuple):
+    """
+    Planifica las etapas de `transform_stages` para un tipo de archivo y sus columnas: solo se incluyen las etapas
+    de ese tipo de archivo cuyas columnas necesarias están disponibles (en los datos o escritas por una etapa
+    anterior). El plan se cachea por tipo de archivo y columnas.
+
+    Args:
+        file_type (str): El tipo de archivo de los datos.
+        columns (tuple): Las columnas de los datos.
+
+    Returns:
+        tuple: Los nombres de las etapas a aplicar, en orden.
+    """
+    available = set(columns)
+    stages = []
+    for name, stage in transform_stages.items():
+        if stage['file_types'] is not None and file_type not in stage['file_types']:
+            continue
+        if not all(column in available for column in stage['reads']):
+            continue
+        stages.append(name)
+        available.update(stage['writes'])
+
+    return tuple(stages)
+
+
+def stage_columns(stages: tuple, columns: tuple):
+    """
+    Devuelve las columnas de los datos que leen las etapas de un plan: las únicas que se pasan a las etapas.
+
+    Args:
+        stages (tuple): Las etapas del plan (ver `plan_stages`).
+        columns (tuple): Las columnas de los datos.
+
+    Returns:
+        list: Las columnas leídas por alguna etapa, en el orden de los datos.
+    """
+    reads = {column for name in stages
+             for column in transform_stages[name]['reads'] + transform_stages[name]['uses']}
+    return [column for column in columns if column in reads]
+
+
 def transform_all_sources(df: pd.DataFrame, file_type: str):
     """
     Aplica una serie de transformaciones a un DataFrame según el tipo de archivo especificado.
 
-    Esta función evalúa el tipo de archivo y, en función de ello, aplica las transformaciones necesarias
-    sobre las columnas del DataFrame. Las transformaciones incluyen conversión de divisas, cálculo de la
-    edad de los pasajeros, cálculo del tiempo de modificación de los registros, categorización de tipos
-    de canales y asignación de cargos a los pasajeros.
+    Las transformaciones (conversión de divisas, cálculo de la edad de los pasajeros, cálculo del tiempo de
+    modificación de los registros, asignación de cargos a los pasajeros y categorización de tipos de canales) se
+    declaran en `transform_stages`, con los tipos de archivo en los que se aplican y las columnas que leen y
+    escriben. `plan_stages` elige las etapas que corresponden a los datos, que se aplican en bloque sobre un
+    DataFrame de trabajo con solo las columnas que leen; al final, las columnas escritas se copian una sola vez
+    al DataFrame (las nuevas, al final y en el orden de las etapas). Para añadir una fuente o una derivación basta
+    con añadir su entrada en `transform_stages`.
 
     Args:
         df (pd.DataFrame): El DataFrame que contiene los datos a transformar.
@@ -29,19 +125,18 @@ def transform_all_sources(df: pd.DataFrame, file_type: str):
     Returns:
         pd.DataFrame: El DataFrame transformado con las modificaciones correspondientes.
     """
-    if file_type == 'charge' and 'ForeignAmount' in df.columns and 'ForeignCurrencyCode' in df.columns and 'CurrencyCode' in df.columns and 'ChargeAmount' in df.columns:
-        df = convert_currency(df, 'ForeignAmount', 'ForeignCurrencyCode', currency_exchange_rate)
-
-    if file_type == 'passenger' or file_type == 'passenger_new' and 'DOB' in df.columns:
-        df = calculate_age(df, 'DOB')
-
-    if 'CreatedDate' in df.columns and 'ModifiedDate' in df.columns:
-        df = calculate_time_to_modify(df, 'CreatedDate', 'ModifiedDate')
+    columns = tuple(df.columns)
+    stages = plan_stages(file_type, columns)
+    if not stages:
+        return df
 
-    if file_type == 'charge' and 'ChargeAmount' in df.columns:
-        df = assign_passenger_journey_charge(df, 'ChargeAmount')
+    work = df[stage_columns(stages, columns)].copy(deep=False)
+    for name in stages:
+        work = transform_stages[name]['apply'](work)
 
-    if file_type == 'segment' and 'ChannelType' in df.columns:
-        df = categorize_channel_type(df, 'ChannelType')
+    for name in stages:
+        for column in transform_stages[name]['writes']:
+            if column in work.columns:
+                df[column] = work[column]
 
-    return df
\ No newline at end of file
+    return df
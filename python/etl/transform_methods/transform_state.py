@@ -0,0 +1,244 @@
+import os.path
+import hashlib
+import json
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from etl.transform_methods.clean_data import column_mean
+from etl.transform_methods.convert_currency import CURRENCY_RATES_PATH
+from etl.transform_methods.transform_all_sources import transform_stages, DERIVED_COLUMNS
+from etl.transform_methods.generate_business_key import BUSINESS_KEY_ID
+from etl.transform_methods.generate_hash import AUDIT_COLUMNS, HASH_COLUMNS, get_hash_algorithm
+from utils.utils import log_error, read_layer, write_layer, get_storage_format, LAYER_EXTENSIONS
+
+load_dotenv()
+
+TRANSFORM_PATH = os.getenv("TRANSFORMED_PATH")
+# Directorio con el estado de la transformación incremental de cada fuente (hashes de las filas bronze)
+TRANSFORM_STATE_PATH = os.getenv("TRANSFORM_STATE_PATH") or os.path.join(TRANSFORM_PATH or '.', "_transform_state")
+
+
+def bronze_row_hashes(df: pd.DataFrame):
+    """
+    Calcula una huella de 64 bits del contenido de cada fila de un archivo bronze, para detectar las filas nuevas
+    o modificadas respecto a la última transformación. Las columnas de auditoría (`extract_dt`, `source`...) no
+    forman parte de la huella: cada extracción las renueva, aunque los datos de la fila no cambien.
+
+    Args:
+        df (pd.DataFrame): Los datos leídos de la capa bronze.
+
+    Returns:
+        pd.Series: La huella de cada fila (`uint64`), alineada con el índice de `df`.
+    """
+    return pd.util.hash_pandas_object(df.drop(columns=AUDIT_COLUMNS, errors='ignore'), index=False)
+
+
+def column_means(df: pd.DataFrame):
+    """
+    Calcula la media de cada columna numérica de un archivo completo, igual que `clean_data` (`column_mean`).
+
+    Args:
+        df (pd.DataFrame): Los datos leídos de la capa bronze.
+
+    Returns:
+        dict: La media de cada columna numérica (`NaN` si la columna no tiene valores).
+    """
+    means = {}
+    for column in df.select_dtypes(include=[np.number]).columns:
+        means[column] = column_mean(df[column])
+    return means
+
+
+def changed_means(means: dict, previous_means: dict):
+    """
+    Devuelve las columnas numéricas cuya media ha cambiado desde la última transformación. Las filas con nulos en
+    esas columnas se transforman de nuevo aunque no hayan cambiado, porque su valor imputado depende de la media
+    de todo el archivo (ver `clean_data`).
+
+    Args:
+        means (dict): Las medias del archivo actual (ver `column_means`).
+        previous_means (dict): Las medias de la última transformación.
+
+    Returns:
+        list: Las columnas cuya media es distinta (o no existía).
+    """
+    return [column for column, mean in means.items()
+            if column not in previous_means or not (mean == previous_means[column]
+                                                    or np.isnan(mean) and np.isnan(previous_means[column]))]
+
+
+def rows_with_nulls(df: pd.DataFrame, columns: list):
+    """
+    Indica las filas con algún nulo en las columnas indicadas.
+
+    Args:
+        df (pd.DataFrame): Los datos leídos de la capa bronze.
+        columns (list): Las columnas a revisar.
+
+    Returns:
+        pd.Series: True en las filas con algún nulo en `columns`.
+    """
+    return df[columns].isna().any(axis=1)
+
+
+def file_fingerprint(path: str):
+    """Huella (md5) del contenido de un archivo, o None si no se ha configurado o no existe."""
+    if not path or not os.path.exists(path):
+        return None
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def transform_settings(file_type: str):
+    """
+    Configuración de la que depende el resultado de transformar una fila. Si cambia entre ejecuciones (o cambia el
+    año, del que depende la edad, o el contenido del histórico de tasas de cambio), las filas de la última
+    transformación no se reutilizan.
+    """
+    settings = {
+        'file_type': file_type,
+        'year': datetime.now().year,
+        'hash_algorithm': get_hash_algorithm(),
+        'hash_columns': HASH_COLUMNS,
+        'hash_excluded_columns': DERIVED_COLUMNS,
+        'business_key_id': BUSINESS_KEY_ID,
+    }
+    # El histórico de tasas solo afecta a los tipos de archivo en los que se convierten divisas
+    if file_type in transform_stages['convert_currency']['file_types']:
+        settings['currency_rates'] = CURRENCY_RATES_PATH
+        settings['currency_rates_fingerprint'] = file_fingerprint(CURRENCY_RATES_PATH)
+    return settings
+
+
+def dtype_name(dtype):
+    """Nombre de un tipo de pandas que se puede volver a pasar a `astype` (incluido el almacenamiento de `string`)."""
+    if isinstance(dtype, pd.StringDtype):
+        return f"string[{dtype.storage}]"
+    return str(dtype)
+
+
+def is_number_dtype_name(dtype: str):
+    return dtype not in ('bool', 'boolean') and pd.api.types.is_numeric_dtype(pd.api.types.pandas_dtype(dtype))
+
+
+def restore_dtypes(df: pd.DataFrame, dtypes: dict):
+    """
+    Devuelve a las columnas de un archivo de la capa silver leído de nuevo los tipos con los que se escribió (un CSV
+    no conserva las fechas, duraciones, booleanos ni enteros con nulos).
+
+    Args:
+        df (pd.DataFrame): Los datos de la capa silver.
+        dtypes (dict): El nombre del tipo de cada columna (ver `dtype_name`).
+
+    Returns:
+        pd.DataFrame: Los datos con sus tipos originales.
+    """
+    for column, dtype in dtypes.items():
+        if column not in df.columns or dtype_name(df[column].dtype) == dtype:
+            continue
+        if dtype.startswith('datetime64'):
+            df[column] = pd.to_datetime(df[column], format='ISO8601').astype(dtype)
+        elif dtype.startswith('timedelta64'):
+            df[column] = pd.to_timedelta(df[column]).astype(dtype)
+        elif dtype in ('bool', 'boolean') and not pd.api.types.is_bool_dtype(df[column]):
+            df[column] = df[column].map({'True': True, 'False': False}).astype(dtype)
+        else:
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+def state_paths(source: str):
+    """Rutas del estado de una fuente: el resumen (JSON) y los hashes de las filas bronze."""
+    hashes_path = os.path.join(TRANSFORM_STATE_PATH, f"{source}_hashes{LAYER_EXTENSIONS[get_storage_format()]}")
+    return os.path.join(TRANSFORM_STATE_PATH, f"{source}.json"), hashes_path
+
+
+def load_transform_state(source: str, file_type: str):
+    """
+    Carga el resultado de la última transformación de una fuente: su archivo de la capa silver y la huella bronze
+    de cada una de sus filas (ver `save_transform_state`).
+
+    Args:
+        source (str): El nombre de la fuente de datos.
+        file_type (str): El tipo de archivo de los datos.
+
+    Returns:
+        tuple or None: El DataFrame de la capa silver (con sus tipos), las huellas de sus filas y las medias usadas
+                       para imputar los nulos, o None si la fuente no tiene estado, su configuración ha cambiado o
+                       los archivos no se pueden leer.
+    """
+    state_path, _ = state_paths(source)
+    if not os.path.exists(state_path):
+        return None
+
+    try:
+        with open(state_path, "r") as f:
+            state = json.load(f)
+
+        if state['settings'] != transform_settings(file_type):
+            log_error(f"La configuración de la transformación de {source} ha cambiado: se transforman todas las filas.")
+            return None
+
+        columns = [column for column, dtype in state['dtypes'].items() if not is_number_dtype_name(dtype)]
+        # Los decimales se leen con `round_trip` para recuperar exactamente los valores escritos
+        silver = read_layer(state['silver_path'], dtype={column: str for column in columns},
+                            float_precision='round_trip')
+        silver = restore_dtypes(silver, state['dtypes'])
+        hashes = read_layer(state['hashes_path'])['bronze_hash'].astype('uint64')
+        if len(silver) != len(hashes):
+            log_error(f"El estado de la transformación de {source} no coincide con {state['silver_path']}.")
+            return None
+        return silver, hashes, state['means']
+
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        log_error(f"Error al leer el estado de la transformación de {source}: {e}")
+        return None
+
+
+def save_transform_state(source: str, file_type: str, silver_path: str, df: pd.DataFrame, hashes: pd.Series,
+                         means: dict):
+    """
+    Guarda el estado de la transformación de una fuente: la ruta y los tipos de su archivo de la capa silver, las
+    medias usadas para imputar los nulos y, para cada fila, la huella de su fila bronze de origen y su
+    `business_key`. Los archivos se escriben con un nombre
+    temporal y se renombran, de modo que una ejecución interrumpida nunca deja el estado a medias.
+
+    Args:
+        source (str): El nombre de la fuente de datos.
+        file_type (str): El tipo de archivo de los datos.
+        silver_path (str): La ruta del archivo de la capa silver.
+        df (pd.DataFrame): Los datos escritos en la capa silver.
+        hashes (pd.Series): La huella bronze de cada fila de `df`.
+        means (dict): Las medias de las columnas numéricas del archivo bronze.
+    """
+    state_path, hashes_path = state_paths(source)
+    try:
+        os.makedirs(TRANSFORM_STATE_PATH, exist_ok=True)
+        rows = pd.DataFrame({'bronze_hash': hashes.to_numpy()})
+        if 'business_key' in df.columns:
+            rows['business_key'] = df['business_key'].to_numpy()
+
+        root, extension = os.path.splitext(hashes_path)
+        tmp_hashes_path = f"{root}.tmp{extension}"
+        write_layer(rows, tmp_hashes_path)
+        os.replace(tmp_hashes_path, hashes_path)
+
+        state = {
+            'silver_path': silver_path,
+            'hashes_path': hashes_path,
+            'settings': transform_settings(file_type),
+            'dtypes': {column: dtype_name(dtype) for column, dtype in df.dtypes.items()},
+            'means': means,
+        }
+        tmp_path = f"{state_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, indent=4)
+        os.replace(tmp_path, state_path)
+
+    except (OSError, ValueError) as e:
+        log_error(f"Error al guardar el estado de la transformación de {source}: {e}")
@@ -8,25 +8,29 @@ load_dotenv()
 
 from etl.extract import extract
 from etl.transform import transform
+from etl.gold import gold
 from etl.load import load
 
 
 if __name__ == "__main__":
 
-    TASK_CHOICES = ['extract','transform','load']
+    TASK_CHOICES = ['extract','transform','gold','load']
     parser = argparse.ArgumentParser()
-    parser.add_argument('--stage', type=str, choices=TASK_CHOICES, help="Elige la etapa a ejecutar: extract, transform o load")
+    parser.add_argument('--stage', type=str, choices=TASK_CHOICES, help="Elige la etapa a ejecutar: extract, transform, gold o load")
 
     args = parser.parse_args()
 
     if args.stage is None:
         extract()
         transform()
+        gold()
         load()
     else:
         if args.stage == 'extract':
             extract()
         elif args.stage == 'transform':
             transform()
+        elif args.stage == 'gold':
+            gold()
         elif args.stage == 'load':
             load()
\ No newline at end of file
@@ -41,6 +41,7 @@ CREATE TABLE IF NOT EXISTS public.Booking (
     proc_status VARCHAR(32),
     TimeToModify INTERVAL,
     business_key VARCHAR(50),
+    business_key_id BIGINT,
     hash VARCHAR(50)
 );
 
@@ -89,6 +90,7 @@ CREATE TABLE IF NOT EXISTS public.BookingNew (
     proc_status VARCHAR(32),
     TimeToModify INTERVAL,
     business_key VARCHAR(50),
+    business_key_id BIGINT,
     hash VARCHAR(50)
 );
 
@@ -127,6 +129,7 @@ CREATE TABLE IF NOT EXISTS public.BookingPassenger (
     IsAdult BOOLEAN,
     TimeToModify INTERVAL,
     business_key VARCHAR(50),
+    business_key_id BIGINT,
     hash VARCHAR(50)
 );
 """
@@ -165,6 +168,7 @@ CREATE TABLE IF NOT EXISTS public.BookingPassengerNew (
     IsAdult BOOLEAN,
     TimeToModify INTERVAL,
     business_key VARCHAR(50),
+    business_key_id BIGINT,
     hash VARCHAR(50)
 );
 
@@ -192,6 +196,7 @@ CREATE TABLE IF NOT EXISTS public.PassengerJourneyCharge (
     proc_status VARCHAR(32),
     PassengerJourneyCharge VARCHAR(32),
     business_key VARCHAR(50),
+    business_key_id BIGINT,
     hash VARCHAR(50),
     PRIMARY KEY (PassengerID, SegmentID, ChargeNumber)
 );
@@ -226,6 +231,7 @@ CREATE TABLE IF NOT EXISTS public.PassengerJourneyLeg (
     proc_status VARCHAR(32),
     TimeToModify INTERVAL,
     business_key VARCHAR(50),
+    business_key_id BIGINT,
     hash VARCHAR(50),
     PRIMARY KEY (PassengerID, SegmentID, LegNumber)
 );
@@ -294,6 +300,7 @@ CREATE TABLE IF NOT EXISTS public.PassengerJourneySegment (
     proc_status VARCHAR(32),
     TimeToModify INTERVAL,
     business_key VARCHAR(50),
+    business_key_id BIGINT,
     hash VARCHAR(50),
     PRIMARY KEY (PassengerID, SegmentID)
 );
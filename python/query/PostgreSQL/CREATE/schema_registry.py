@@ -0,0 +1,186 @@
+import os
+import re
+from functools import lru_cache
+import importlib.util
+import pandas as pd
+from dotenv import load_dotenv
+
+from query.PostgreSQL.CREATE import create_tables_sql
+from utils.utils import log_error
+
+load_dotenv()
+# Si es 'false', no se aplican los tipos de las tablas al leer los datos
+SCHEMA_DTYPES = os.getenv("SCHEMA_DTYPES", "true").lower() == "true"
+# Si es 'true', las columnas CHAR(n) (códigos de baja cardinalidad) se cargan como `category`
+SCHEMA_CATEGORICAL = os.getenv("SCHEMA_CATEGORICAL", "true").lower() == "true"
+# Proporción máxima de valores distintos sobre el total de filas para guardar una columna como `category`
+SCHEMA_CATEGORY_MAX_RATIO = float(os.getenv("SCHEMA_CATEGORY_MAX_RATIO", 0.5))
+# Tipo de pandas para las columnas de texto: 'string[pyarrow]' si pyarrow está instalado (más compacto)
+SCHEMA_STRING_DTYPE = os.getenv("SCHEMA_STRING_DTYPE") or (
+    "string[pyarrow]" if importlib.util.find_spec("pyarrow") is not None else "string")
+
+# Tipo de pandas de cada tipo SQL. Las fechas e intervalos no se incluyen: se convierten en `filter_data`.
+SQL_TYPE_DTYPES = {
+    'SMALLINT': 'Int16',
+    'INTEGER': 'Int32',
+    'INT': 'Int32',
+    'BIGINT': 'Int64',
+    'BOOLEAN': 'boolean',
+    'MONEY': 'float64',
+    'DECIMAL': 'float64',
+    'NUMERIC': 'float64',
+    'REAL': 'float32',
+    'DOUBLE PRECISION': 'float64',
+    'CHAR': 'category',
+    'VARCHAR': 'string',
+}
+
+# Tabla de cada tipo de archivo de la transformación (las tablas a las que se cargan)
+FILE_TYPE_TABLES = {
+    'booking_new': 'Booking',
+    'passenger_new': 'BookingPassenger',
+    'leg': 'PassengerJourneyLeg',
+    'charge': 'PassengerJourneyCharge',
+    'segment': 'PassengerJourneySegment',
+}
+
+TABLE_PATTERN = re.compile(r'CREATE TABLE IF NOT EXISTS public\.(\w+)\s*\((.*?)\n\);', re.S)
+COLUMN_PATTERN = re.compile(r'^\s*(\w+)\s+(DOUBLE PRECISION|[A-Z]+)\s*(?:\(\s*(\d+)(?:\s*,\s*\d+)?\s*\))?', re.M)
+CONSTRAINT_KEYWORDS = {'PRIMARY', 'CONSTRAINT', 'UNIQUE', 'FOREIGN', 'CHECK'}
+# Clave primaria declarada en la columna (`BookingID BIGINT NOT NULL PRIMARY KEY`) o como restricción de la tabla
+INLINE_KEY_PATTERN = re.compile(r'^\s*(\w+)\s+[^,\n]*\bPRIMARY KEY\b', re.M)
+TABLE_KEY_PATTERN = re.compile(r'^\s*PRIMARY KEY\s*\(([^)]*)\)', re.M)
+
+
+@lru_cache(maxsize=None)
+def get_table_schemas():
+    """
+    Obtiene las columnas y tipos SQL de todas las tablas definidas en `create_tables_sql`.
+
+    Returns:
+        dict: Para cada tabla, un diccionario `{columna: (tipo SQL, longitud)}` en el orden del DDL.
+    """
+    schemas = {}
+    for name, statement in vars(create_tables_sql).items():
+        if not name.startswith('create_') or not isinstance(statement, str):
+            continue
+
+        for table, body in TABLE_PATTERN.findall(statement):
+            columns = {}
+            for column, sql_type, length in COLUMN_PATTERN.findall(body):
+                if column.upper() in CONSTRAINT_KEYWORDS:
+                    continue
+                columns[column] = (sql_type, int(length) if length else None)
+            schemas[table] = columns
+
+    return schemas
+
+
+@lru_cache(maxsize=None)
+def get_primary_keys():
+    """
+    Obtiene las columnas de la clave primaria de todas las tablas definidas en `create_tables_sql`.
+
+    Returns:
+        dict: Para cada tabla con clave primaria, la lista de sus columnas en el orden del DDL.
+    """
+    keys = {}
+    for name, statement in vars(create_tables_sql).items():
+        if not name.startswith('create_') or not isinstance(statement, str):
+            continue
+
+        for table, body in TABLE_PATTERN.findall(statement):
+            constraint = TABLE_KEY_PATTERN.search(body)
+            if constraint:
+                keys[table] = [column.strip() for column in constraint.group(1).split(',')]
+            elif INLINE_KEY_PATTERN.search(body):
+                keys[table] = INLINE_KEY_PATTERN.findall(body)
+
+    return keys
+
+
+def get_table_dtypes(table: str, categories: bool = SCHEMA_CATEGORICAL):
+    """
+    Devuelve los tipos de pandas de las columnas de una tabla, derivados de su definición SQL.
+
+    Los enteros se cargan como enteros con nulos del tamaño de la columna (SMALLINT como `Int16`, INTEGER como
+    `Int32` y BIGINT como `Int64`), los importes como `float64`, los códigos CHAR(n) como `category` y el resto de
+    textos como `SCHEMA_STRING_DTYPE`. Las columnas de fecha o intervalo no se incluyen.
+
+    Args:
+        table (str): El nombre de la tabla (sin esquema), por ejemplo 'Booking'.
+        categories (bool, optional): Si es False, las columnas CHAR(n) se cargan como texto.
+
+    Returns:
+        dict: Un diccionario `{columna: tipo de pandas}`, vacío si la tabla no existe.
+    """
+    dtypes = {}
+    for column, (sql_type, _) in get_table_schemas().get(table, {}).items():
+        dtype = SQL_TYPE_DTYPES.get(sql_type)
+        if dtype == 'category' and not categories:
+            dtype = 'string'
+        if dtype == 'string':
+            dtype = SCHEMA_STRING_DTYPE
+        if dtype is not None:
+            dtypes[column] = dtype
+
+    return dtypes
+
+
+def is_low_cardinality(values: pd.Series, max_ratio: float = SCHEMA_CATEGORY_MAX_RATIO):
+    """
+    Indica si una columna tiene pocos valores distintos en proporción a sus filas, y compensa guardarla como
+    `category` (un diccionario de valores y un código entero por fila).
+
+    Args:
+        values (pd.Series): La columna a evaluar.
+        max_ratio (float, optional): Proporción máxima de valores distintos. Por defecto, `SCHEMA_CATEGORY_MAX_RATIO`.
+
+    Returns:
+        bool: True si la columna tiene como mucho `max_ratio` valores distintos por fila.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return True
+    return values.nunique(dropna=True) <= max_ratio * max(len(values), 1)
+
+
+def apply_schema(df: pd.DataFrame, table: str, categories: bool = SCHEMA_CATEGORICAL):
+    """
+    Convierte las columnas de un DataFrame a los tipos de pandas de su tabla (ver `get_table_dtypes`).
+
+    Las columnas que no están en la tabla, y las columnas numéricas cuyo tipo en la tabla es de texto (códigos que
+    se transforman después), se mantienen sin cambios. Los CHAR(n) solo se guardan como `category` si tienen pocos
+    valores distintos (ver `is_low_cardinality`). Si una columna no se puede convertir (por
+    ejemplo, un SMALLINT con valores decimales o fuera de rango), se registra el error y se mantiene su tipo.
+
+    Args:
+        df (pd.DataFrame): El DataFrame a convertir.
+        table (str): El nombre de la tabla (sin esquema), por ejemplo 'Booking'.
+        categories (bool, optional): Si es False, las columnas CHAR(n) se cargan como texto.
+
+    Returns:
+        pd.DataFrame: El DataFrame con los tipos de la tabla.
+    """
+    if not SCHEMA_DTYPES or table is None:
+        return df
+
+    for column, dtype in get_table_dtypes(table, categories).items():
+        if column not in df.columns or df[column].dtype == dtype:
+            continue
+        # Las columnas numéricas con tipo de texto en la tabla son códigos que se transforman después (ChannelType)
+        if dtype in ('category', SCHEMA_STRING_DTYPE) and pd.api.types.is_numeric_dtype(df[column]):
+            continue
+        # Los CHAR(n) con muchos valores distintos (p. ej. RecordLocator) no compensan como categoría
+        if dtype == 'category' and not is_low_cardinality(df[column]):
+            dtype = SCHEMA_STRING_DTYPE
+            if df[column].dtype == dtype:
+                continue
+        try:
+            values = df[column]
+            if dtype.startswith('Int') and values.dtype == object:
+                values = pd.to_numeric(values)
+            df[column] = values.astype(dtype)
+        except (TypeError, ValueError, OverflowError) as e:
+            log_error(f"Error: No se pudo convertir la columna {column} de {table} a {dtype}: {e}")
+
+    return df
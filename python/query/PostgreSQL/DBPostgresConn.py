@@ -1,11 +1,64 @@
 import psycopg2
 from dotenv import load_dotenv
 import os
+import re
 import threading
 from query.PostgreSQL.CREATE.create_tables_sql import create_Booking, create_BookingPassenger, create_PassengerJourneyCharge, create_PassengerJourneyLeg, create_PassengerJourneySegment
 import pandas as pd
 
-from utils.utils import log_error
+from utils.utils import log_error, read_layer
+from query.PostgreSQL.CREATE.schema_registry import apply_schema
+
+load_dotenv()
+# Si es 'true', la capa silver tiene la columna `business_key_id` (ver `generate_business_key`)
+BUSINESS_KEY_ID = os.getenv("BUSINESS_KEY_ID", "false").lower() == "true"
+# Columna `business_key_id` de las sentencias de `create_tables_sql`
+BUSINESS_KEY_ID_DDL = re.compile(r'^\s*business_key_id BIGINT,\n', re.M)
+
+
+def dataframe_to_rows(df: pd.DataFrame):
+    """
+    Convierte un DataFrame en tuplas de valores de Python aptos para psycopg2.
+
+    Los nulos (`NaN`, `NaT`, `pd.NA`) se convierten en `None` y los tipos de pandas/numpy en sus equivalentes de
+    Python, de modo que los archivos parquet (con fechas, intervalos y enteros con nulos tipados) y los CSV se
+    insertan igual.
+
+    Args:
+        df (pd.DataFrame): El DataFrame a convertir.
+
+    Returns:
+        iterator: Un iterador de tuplas, una por fila.
+    """
+    values = df.astype(object).where(df.notna(), None)
+    return values.itertuples(index=False, name=None)
+
+
+def table_ddl(statement: str):
+    """
+    Devuelve la sentencia de creación de una tabla, sin la columna `business_key_id` si `BUSINESS_KEY_ID` no está
+    activo (la capa silver no la tiene).
+    """
+    return statement if BUSINESS_KEY_ID else BUSINESS_KEY_ID_DDL.sub('', statement)
+
+
+def table_load_columns(columns: str):
+    """
+    Convierte las columnas de una variable `TABLES_COLUMNS_*` en la tupla de columnas de la carga. Si
+    `BUSINESS_KEY_ID` está activo, la capa silver tiene además la columna `business_key_id`, justo después de
+    `business_key`, y se añade en esa posición si la variable no la incluye; si no está activo, se quita.
+
+    Args:
+        columns (str): Las columnas de la tabla, separadas por ', '.
+
+    Returns:
+        tuple: Las columnas de la tabla, en el orden de la capa silver.
+    """
+    columns = tuple(column for column in columns.split(', ') if column != 'business_key_id')
+    if BUSINESS_KEY_ID:
+        position = columns.index('business_key') + 1 if 'business_key' in columns else len(columns)
+        columns = columns[:position] + ('business_key_id',) + columns[position:]
+    return columns
 
 
 class dbpostgresconn:
@@ -74,11 +127,11 @@ class dbpostgresconn:
             log_error("Creando las tablas concurrentemente...")
 
             threads = [
-                threading.Thread(target=self.create_table_thread, args=(create_Booking,)),
-                threading.Thread(target=self.create_table_thread, args=(create_BookingPassenger,)),
-                threading.Thread(target=self.create_table_thread, args=(create_PassengerJourneyCharge,)),
-                threading.Thread(target=self.create_table_thread, args=(create_PassengerJourneyLeg,)),
-                threading.Thread(target=self.create_table_thread, args=(create_PassengerJourneySegment,))
+                threading.Thread(target=self.create_table_thread, args=(table_ddl(create_Booking),)),
+                threading.Thread(target=self.create_table_thread, args=(table_ddl(create_BookingPassenger),)),
+                threading.Thread(target=self.create_table_thread, args=(table_ddl(create_PassengerJourneyCharge),)),
+                threading.Thread(target=self.create_table_thread, args=(table_ddl(create_PassengerJourneyLeg),)),
+                threading.Thread(target=self.create_table_thread, args=(table_ddl(create_PassengerJourneySegment),))
             ]
 
             # Iniciar todos los hilos
@@ -103,7 +156,7 @@ class dbpostgresconn:
 
         Args:
             table_name (str): El nombre de la tabla en la base de datos donde se insertarán los datos.
-            csv_file (str): La ruta al archivo CSV que contiene los nuevos datos.
+            csv_file (str): La ruta al archivo CSV o parquet que contiene los nuevos datos.
             columns (tuple): Una tupla con los nombres de las columnas de la tabla.
 
         Returns:
@@ -111,8 +164,8 @@ class dbpostgresconn:
             de lo contrario, se imprime un mensaje de error.
         """
         try:
-            # Leer el archivo CSV en un DataFrame
-            df = pd.read_csv(csv_file, sep='|', header=0, na_values=None)
+            # Leer el archivo de silver (CSV o parquet) en un DataFrame, con los tipos de la tabla
+            df = apply_schema(read_layer(csv_file, na_values=None), table_name.split('.')[-1])
 
             # Asegurarse de que el número de columnas coincida
             if len(df.columns) != len(columns):
@@ -132,8 +185,8 @@ class dbpostgresconn:
             cursor = conn.cursor()
 
             # Insertar los nuevos datos en la tabla
-            for _, row in df.iterrows():
-                cursor.execute(insert_query, tuple(row))
+            for row in dataframe_to_rows(df):
+                cursor.execute(insert_query, row)
 
             conn.commit()
             log_error(f"Datos insertados correctamente en la tabla {table_name}")
@@ -153,7 +206,7 @@ class dbpostgresconn:
 
         Args:
             table_name (str): El nombre de la tabla en la base de datos donde se insertarán los datos.
-            csv_file (str): La ruta al archivo CSV que contiene los nuevos datos.
+            csv_file (str): La ruta al archivo CSV o parquet que contiene los nuevos datos.
             columns (tuple): Una tupla con los nombres de las columnas de la tabla.
             key_column (str): El nombre de la columna que actúa como clave primaria o identificador único para la carga incremental.
 
@@ -162,8 +215,8 @@ class dbpostgresconn:
             de lo contrario, se imprime un mensaje de error.
         """
         try:
-            # Leer el archivo CSV en un DataFrame
-            df = pd.read_csv(csv_file, sep='|', header=0, na_values=None)
+            # Leer el archivo de silver (CSV o parquet) en un DataFrame, con los tipos de la tabla
+            df = apply_schema(read_layer(csv_file, na_values=None), table_name.split('.')[-1])
 
             # Asegurarse de que el número de columnas coincida
             if len(df.columns) != len(columns):
@@ -192,14 +245,14 @@ class dbpostgresconn:
             cursor = conn.cursor()
 
             # Insertar los datos en la tabla, con la opción de actualización en caso de conflicto en la business_key
-            for _, row in df.iterrows():
+            for row in dataframe_to_rows(df):
                 # Usamos ON CONFLICT para manejar las actualizaciones de registros existentes
                 cursor.execute(f"""
                 INSERT INTO {table_name} ({', '.join(columns)})
                 VALUES ({', '.join(['%s'] * len(columns))})
                 ON CONFLICT ({key_column})
                 DO UPDATE SET {', '.join([f"{col} = EXCLUDED.{col}" for col in columns if col != key_column])}
-                """, tuple(row))
+                """, row)
 
             # Commit para confirmar la transacción
             conn.commit()
@@ -260,15 +313,12 @@ class dbpostgresconn:
         # Definir las tablas y sus columnas
         load_type = self.ask_user_for_load_type()
 
-        def string_to_tuple(string):
-            return tuple(string.split(', '))
-
         tables_columns = {
-            'public.Booking': string_to_tuple(os.getenv('TABLES_COLUMNS_BOOKING_NEW')),
-            'public.BookingPassenger': string_to_tuple(os.getenv('TABLES_COLUMNS_BOOKINGPASSENGER_NEW')),
-            'public.PassengerJourneyCharge': string_to_tuple(os.getenv('TABLES_COLUMNS_PASSENGERJOURNEYCHARGE')),
-            'public.PassengerJourneyLeg': string_to_tuple(os.getenv('TABLES_COLUMNS_PASSENGERJOURNEYLEG')),
-            'public.PassengerJourneySegment': string_to_tuple(os.getenv('TABLES_COLUMNS_PASSENGERJOURNEYSEGMENT'))
+            'public.Booking': table_load_columns(os.getenv('TABLES_COLUMNS_BOOKING_NEW')),
+            'public.BookingPassenger': table_load_columns(os.getenv('TABLES_COLUMNS_BOOKINGPASSENGER_NEW')),
+            'public.PassengerJourneyCharge': table_load_columns(os.getenv('TABLES_COLUMNS_PASSENGERJOURNEYCHARGE')),
+            'public.PassengerJourneyLeg': table_load_columns(os.getenv('TABLES_COLUMNS_PASSENGERJOURNEYLEG')),
+            'public.PassengerJourneySegment': table_load_columns(os.getenv('TABLES_COLUMNS_PASSENGERJOURNEYSEGMENT'))
         }
 
         # Definir las rutas de los archivos CSV
@@ -1,10 +1,15 @@
 from datetime import datetime
 from dotenv import load_dotenv
+import importlib.util
 import pandas as pd
 import logging
 import os.path
 FILE_NAME = os.getenv("LOG_FILE_NAME")
 DESTINATION_PATH = os.path.join(os.getenv('DESTINATION_PATH'))
+# Formato de almacenamiento de las capas bronze y silver: 'csv' (separado por '|') o 'parquet'
+STORAGE_FORMAT = os.getenv("STORAGE_FORMAT", "csv").lower()
+PARQUET_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+LAYER_EXTENSIONS = {"csv": ".csv", "parquet": ".parquet"}
 
 logging.basicConfig(
     filename=FILE_NAME,
@@ -27,6 +32,212 @@ def log_error(message:str):
             f.write(message)
 
 
+def add_audit_columns(df:pd.DataFrame, source:str, extract_date, proc_type:str):
+    """
+    Función para agregar las columnas de auditoría (`extract_dt`, `source` y `proc_status`) al DataFrame.
+
+    Parameters:
+    - df: DataFrame con los datos procesados.
+    - source: Fuente de los datos.
+    - extract_date: Fecha de extracción de los datos.
+    - proc_type: Tipo de procesamiento (ej. 'extracted' o 'transformed').
+
+    Returns:
+    - df: El DataFrame con las columnas de auditoría.
+    """
+    df['extract_dt'] = pd.to_datetime(extract_date, format="%Y-%m-%d %H:%M:%S")
+    # Valores constantes: se guardan como categoría (un único valor codificado)
+    df['source'] = pd.Series(str(source), index=df.index, dtype='category')
+    df['proc_status'] = pd.Series(str(proc_type), index=df.index, dtype='category')
+    return df
+
+
+def get_storage_format():
+    """
+    Función para obtener el formato de almacenamiento de las capas, volviendo a CSV si se ha configurado
+    parquet pero pyarrow no está instalado.
+
+    Returns:
+    - str: 'csv' o 'parquet'.
+    """
+    if STORAGE_FORMAT == "parquet" and not PARQUET_AVAILABLE:
+        log_error("STORAGE_FORMAT=parquet requiere pyarrow, que no está instalado. Se usará CSV.")
+        return "csv"
+    if STORAGE_FORMAT not in LAYER_EXTENSIONS:
+        log_error(f"Formato de almacenamiento {STORAGE_FORMAT} no soportado. Se usará CSV.")
+        return "csv"
+    return STORAGE_FORMAT
+
+
+def build_output_path(source:str, proc_type:str, path:str):
+    """
+    Función para construir la ruta del archivo de salida de una fuente para la fecha actual.
+
+    Parameters:
+    - source: Fuente de los datos.
+    - proc_type: Tipo de procesamiento (ej. 'extracted' o 'transformed').
+    - path: Directorio donde se guardará el archivo.
+
+    Returns:
+    - str: La ruta del archivo con el formato `{source}_{YYYYMMDD}_{proc_type}.{csv|parquet}`.
+    """
+    timestamp = datetime.now().strftime("%Y%m%d")
+    extension = LAYER_EXTENSIONS[get_storage_format()]
+    new_file_name = f'{source}_{timestamp}_{proc_type}{extension}'
+    return os.path.join(path, new_file_name)
+
+
+def resolve_layer_path(file_path:str):
+    """
+    Función para localizar el archivo de una capa. Si el archivo no existe, se busca el mismo archivo con la
+    extensión del otro formato (por ejemplo, `.parquet` en lugar de `.csv`), de modo que las rutas configuradas
+    siguen funcionando al cambiar `STORAGE_FORMAT`.
+
+    Parameters:
+    - file_path: Ruta del archivo.
+
+    Returns:
+    - str: La ruta del archivo existente, o `file_path` si no existe en ningún formato.
+    """
+    if os.path.exists(file_path):
+        return file_path
+
+    root, extension = os.path.splitext(file_path)
+    for candidate_extension in LAYER_EXTENSIONS.values():
+        candidate = root + candidate_extension
+        if candidate_extension != extension and os.path.exists(candidate):
+            log_error(f"No existe {file_path}, se usará {candidate}")
+            return candidate
+
+    return file_path
+
+
+def read_layer(file_path:str, **kwargs):
+    """
+    Función para leer un archivo de las capas bronze o silver en el formato indicado por su extensión.
+
+    Los archivos parquet conservan el esquema (fechas, intervalos, enteros con nulos), mientras que los CSV
+    se leen con el separador '|'.
+
+    Parameters:
+    - file_path: Ruta del archivo.
+    - kwargs: Argumentos adicionales para `pd.read_csv` (solo para CSV).
+
+    Returns:
+    - pd.DataFrame: Los datos del archivo.
+    """
+    file_path = resolve_layer_path(file_path)
+    if file_path.endswith('.parquet'):
+        return pd.read_parquet(file_path)
+    return pd.read_csv(file_path, sep='|', header=0, **kwargs)
+
+
+def iter_layer(file_path:str, chunksize:int, **kwargs):
+    """
+    Función para leer por bloques un archivo de las capas bronze o silver, sin cargarlo entero en memoria.
+
+    Los archivos parquet se recorren por lotes de filas conservando su esquema, y los CSV con `chunksize`.
+
+    Parameters:
+    - file_path: Ruta del archivo.
+    - chunksize: Número de filas de cada bloque.
+    - kwargs: Argumentos adicionales para `pd.read_csv` (solo para CSV).
+
+    Yields:
+    - pd.DataFrame: Cada bloque de filas del archivo.
+    """
+    file_path = resolve_layer_path(file_path)
+    if file_path.endswith('.parquet'):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(file_path)
+        for batch in parquet_file.iter_batches(batch_size=chunksize):
+            # Con el esquema del archivo se recuperan los tipos de pandas (enteros con nulos, categorías...)
+            yield pa.Table.from_batches([batch], schema=parquet_file.schema_arrow).to_pandas()
+    else:
+        yield from pd.read_csv(file_path, sep='|', header=0, chunksize=chunksize, **kwargs)
+
+
+def write_layer(df:pd.DataFrame, file_path:str):
+    """
+    Función para escribir un DataFrame en un archivo de las capas bronze o silver según su extensión.
+
+    Parameters:
+    - df: DataFrame a guardar.
+    - file_path: Ruta del archivo (`.parquet` o `.csv`).
+    """
+    if file_path.endswith('.parquet'):
+        # Con el esquema de `LayerWriter`, de modo que el archivo es igual que si se escribiera por bloques
+        with LayerWriter(file_path) as writer:
+            writer.write(df)
+    else:
+        df.to_csv(file_path, sep='|', index=False)
+
+
+class LayerWriter:
+    """
+    Escritor incremental de un archivo de las capas bronze o silver, usado en los modos de streaming para
+    añadir bloques de datos a un mismo archivo sin mantener todo el conjunto en memoria.
+
+    Para CSV cada bloque se añade al final del archivo (la cabecera solo se escribe con el primero). Para
+    parquet se usa un `ParquetWriter` con el esquema del primer bloque, al que se ajustan los siguientes; las
+    columnas sin ningún valor en el primer bloque se guardan como texto y las categóricas como diccionario. El
+    esquema conserva los metadatos de pandas del primer bloque, para que al leer el archivo se recuperen sus tipos
+    (por ejemplo, `string` en lugar de `object`).
+    """
+
+    def __init__(self, file_path:str):
+        self.file_path = file_path
+        self.rows = 0
+        self.schema = None
+        self.writer = None
+
+    @staticmethod
+    def _normalize_field(field):
+        import pyarrow as pa
+
+        if pa.types.is_null(field.type):
+            return field.with_type(pa.string())
+        # Índices de 32 bits, para que los bloques siguientes puedan tener más categorías que el primero
+        # (las categóricas sin ninguna categoría en el primer bloque se guardan como diccionario de textos)
+        if pa.types.is_dictionary(field.type):
+            value_type = pa.string() if pa.types.is_null(field.type.value_type) else field.type.value_type
+            return field.with_type(pa.dictionary(pa.int32(), value_type))
+        return field
+
+    def write(self, df:pd.DataFrame):
+        """Añade un bloque de datos al archivo y devuelve el número de filas escritas."""
+        if self.file_path.endswith('.parquet'):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            if self.writer is None:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                self.schema = pa.schema([self._normalize_field(field) for field in table.schema],
+                                        metadata=table.schema.metadata)
+                self.writer = pq.ParquetWriter(self.file_path, self.schema)
+            self.writer.write_table(pa.Table.from_pandas(df, schema=self.schema, preserve_index=False))
+        else:
+            df.to_csv(self.file_path, sep='|', index=False, mode='w' if self.rows == 0 else 'a',
+                      header=self.rows == 0)
+
+        self.rows += len(df.index)
+        return len(df.index)
+
+    def close(self):
+        """Cierra el archivo."""
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
 def set_audit_columns(df:pd.DataFrame,source:str,extract_date, proc_type:str, path:str):
     """
     Función para agregar columnas de auditoría al DataFrame y guardar el archivo resultante.
@@ -42,15 +253,10 @@ def set_audit_columns(df:pd.DataFrame,source:str,extract_date, proc_type:str, pa
     - df: El DataFrame actualizado con las columnas de auditoría, o None si ocurre un error.
     """
     try:
-        df['extract_dt'] = pd.to_datetime(extract_date, format="%Y-%m-%d %H:%M:%S")
-        df['source'] = str(source)
-        df['proc_status'] = str(proc_type)
+        add_audit_columns(df, source, extract_date, proc_type)
+        new_file_path = build_output_path(source, proc_type, path)
 
-        timestamp = datetime.now().strftime("%Y%m%d")
-        new_file_name = f'{source}_{timestamp}_{proc_type}.csv'
-        new_file_path = os.path.join(path, new_file_name)
-
-        df.to_csv(new_file_path, sep='|', index=False)
+        write_layer(df, new_file_path)
 
         log_error(f"Archivo procesado y guardado en: {new_file_path}")
         log_error(df.dtypes)
@@ -58,4 +264,25 @@ def set_audit_columns(df:pd.DataFrame,source:str,extract_date, proc_type:str, pa
 
     except Exception as e:
         log_error(f"Error al agregar columnas de auditoría o guardar el archivo: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+def append_audit_chunk(df:pd.DataFrame, source:str, extract_date, proc_type:str, writer:LayerWriter):
+    """
+    Función para agregar las columnas de auditoría a un bloque de datos y añadirlo al archivo de un `LayerWriter`.
+
+    Se usa en los modos de streaming, donde cada bloque se escribe en cuanto está disponible en lugar de
+    acumular todos los datos en memoria antes de guardar el archivo.
+
+    Parameters:
+    - df: DataFrame con el bloque de datos.
+    - source: Fuente de los datos.
+    - extract_date: Fecha de extracción de los datos.
+    - proc_type: Tipo de procesamiento (ej. 'extracted' o 'transformed').
+    - writer: Escritor del archivo al que se añade el bloque.
+
+    Returns:
+    - int: El número de filas escritas.
+    """
+    add_audit_columns(df, source, extract_date, proc_type)
+    return writer.write(df)
\ No newline at end of file